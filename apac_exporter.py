@@ -11,7 +11,10 @@ from api.logging import log_export_event, setup_logging
 
 # Importa a classe de conexão e o mapeamento do módulo compartilhado
 from shared.database import Database
-from shared.mapeamento_procedimentos import carregar_tabela_procedimentos_cid
+from shared.extracao_paralela import MAX_TRABALHADORES, OPCOES_PARTICAO, extrair_em_particoes, filtro_particao, particionar_periodo
+from shared.layouts import LAYOUT_APAC_CORPO, LAYOUT_APAC_HEADER, LAYOUT_APAC_PROCEDIMENTO
+from shared.mapeamento_procedimentos import carregar_tabela_procedimentos_cid, mapeamento_procedimentos_da_consulta
+from shared.sql_enderecos import ESTRATEGIA_LATERAL, clausula_with, montar_endereco_paciente
 
 setup_logging()
 logger = logging.getLogger("exporter.apac")
@@ -56,18 +59,22 @@ class APACExporter:
             print(f"Erro ao carregar mapeamento de procedimentos: {str(e)}")
         return mapeamento_proc
 
-    def _build_sql_apac(self, data_inicio, data_fim):
-        """Query completa e robusta (baseada no bpa_exporter) para buscar todos os dados necessários."""
+    def _build_sql_apac(self, data_inicio, data_fim, incluir_codigo_procedimento=False, estrategia_endereco=ESTRATEGIA_LATERAL,
+                        particao=None):
+        """
+        Query completa e robusta (baseada no bpa_exporter) para buscar todos os dados necessários.
+        Com ``incluir_codigo_procedimento`` o código curto vem da própria consulta (JOIN com
+        sigh.procedimentos), dispensando carregar_mapeamento_procedimentos. ``particao``
+        restringe a consulta a um trecho do período (ver shared/extracao_paralela.py).
+        """
         data_inicio_str = data_inicio.isoformat()
         data_fim_str = data_fim.isoformat()
+        coluna_codigo_procedimento = ", proc.codigo_procedimento" if incluir_codigo_procedimento else ""
+        join_procedimentos = "LEFT JOIN sigh.procedimentos proc ON l.cod_proc = proc.id_procedimento" if incluir_codigo_procedimento else ""
+        cte_enderecos, join_enderecos = montar_endereco_paciente(estrategia=estrategia_endereco)
+        filtro_sql_particao = f"AND {filtro_particao('l.data', particao)}" if particao else ""
         return f"""
-        WITH RankedEnderecos AS (
-            SELECT
-                ep.cod_paciente, ep.cod_logradouro, ep.numero,
-                ROW_NUMBER() OVER(PARTITION BY ep.cod_paciente ORDER BY ep.data_hora_atualizacao DESC, ep.data_hora_criacao DESC, ep.id_endereco DESC) as rn
-            FROM sigh.enderecos ep
-            WHERE ep.ativo = 't' AND ep.cod_logradouro IS NOT NULL
-        )
+        {clausula_with(cte_enderecos)}
         SELECT
             p.id_paciente, p.nm_paciente, v_pac.mae AS nm_mae, p.data_nasc, p.cod_sexo,
             v_pac.cartao_sus AS cns_paciente, p.cod_raca_etnia, p.cod_etnia_indigena, p.cod_nacionalidade,
@@ -81,7 +88,7 @@ class APACExporter:
             prestador_lanc.nm_prestador AS nm_medico_responsavel,
             prestador_lanc.cns AS cns_medico_responsavel,
             l.id_lancamento, l.cod_proc, l.quantidade, l.data AS data_atendimento_procedimento,
-            vcpc.codigo_cbo, fi.diagnostico AS cid_principal_procedimento, l.cod_serv AS cod_servico
+            vcpc.codigo_cbo, fi.diagnostico AS cid_principal_procedimento, l.cod_serv AS cod_servico{coluna_codigo_procedimento}
         FROM
             sigh.lancamentos l
         JOIN sigh.contas c ON l.cod_conta = c.id_conta
@@ -90,15 +97,39 @@ class APACExporter:
         LEFT JOIN sigh.v_cons_pacientes_laboratorios v_pac ON p.id_paciente = v_pac.registro
         LEFT JOIN sigh.v_cons_prestadores_cbos_scola vcpc ON l.cod_prestador = vcpc.id_prestador
         LEFT JOIN sigh.prestadores prestador_lanc ON l.cod_prestador = prestador_lanc.id_prestador
-        LEFT JOIN RankedEnderecos AS enderecos_pac ON p.id_paciente = enderecos_pac.cod_paciente AND enderecos_pac.rn = 1
+        {join_procedimentos}
+        {join_enderecos}
         LEFT JOIN endereco_sigh.logradouros AS logradouros_pac ON enderecos_pac.cod_logradouro = logradouros_pac.id_logradouro
         LEFT JOIN aihu.ceps_municipios_ibges AS aihu_cep_ibge ON logradouros_pac.cep = aihu_cep_ibge.cep
         WHERE
-            l.data BETWEEN '{data_inicio_str}' AND '{data_fim_str}'
+            l.data BETWEEN '{data_inicio_str}' AND '{data_fim_str}' {filtro_sql_particao}
         ORDER BY
             p.id_paciente, l.data;
         """
 
+    def _consultar_lancamentos(self, params_execucao):
+        """
+        Lançamentos do período. Com ``params_execucao['particao']`` ("dia" ou "semana") o
+        período é consultado em partições paralelas, intercaladas na ordem do ORDER BY
+        (paciente, data do atendimento).
+        """
+        data_inicio, data_fim = params_execucao['data_inicio'], params_execucao['data_fim']
+        particao = params_execucao.get('particao')
+        if not particao:
+            sql = self._build_sql_apac(data_inicio, data_fim, incluir_codigo_procedimento=True)
+            return [dict(row._mapping) for row in self.conn.execute(text(sql)).fetchall()]
+
+        particoes = particionar_periodo(data_inicio, data_fim, particao)
+        self._log_message_gui(f"Consultando o período em {len(particoes)} partições por {particao}...")
+        consultas = [
+            (self._build_sql_apac(data_inicio, data_fim, incluir_codigo_procedimento=True, particao=p), None)
+            for p in particoes
+        ]
+        return extrair_em_particoes(
+            self.conn.engine, consultas, lambda reg: (reg['id_paciente'], reg['data_atendimento_procedimento']),
+            params_execucao.get('max_trabalhadores', MAX_TRABALHADORES),
+        )
+
     def deduplicate_por_id_lancamento_original(self, registros_filtrados):
         """Deduplica mantendo apenas um registro por 'id_lancamento' único."""
         self._log_message_gui(f"Iniciando deduplicação de {len(registros_filtrados)} registros...")
@@ -119,9 +150,7 @@ class APACExporter:
         try:
             self._log_message_gui("Iniciando consulta de dados...")
             log_export_event(logger, "consulta_apac_inicio", status="started")
-            sql = self._build_sql_apac(params_execucao['data_inicio'], params_execucao['data_fim'])
-            result = self.conn.execute(text(sql))
-            registros_brutos = [dict(row._mapping) for row in result.fetchall()]
+            registros_brutos = self._consultar_lancamentos(params_execucao)
             self._log_message_gui(f"{len(registros_brutos)} lançamentos brutos encontrados no período.")
 
             if not registros_brutos:
@@ -129,8 +158,11 @@ class APACExporter:
 
             self._log_message_gui("Filtrando e validando procedimentos de APAC...")
             tabela_proc_cid = carregar_tabela_procedimentos_cid()
-            cod_procs_unicos = {reg.get('cod_proc') for reg in registros_brutos if reg.get('cod_proc')}
-            mapeamento_curto = self.carregar_mapeamento_procedimentos(cod_procs_unicos)
+            if 'codigo_procedimento' in registros_brutos[0]:
+                mapeamento_curto = mapeamento_procedimentos_da_consulta(registros_brutos)
+            else:
+                cod_procs_unicos = {reg.get('cod_proc') for reg in registros_brutos if reg.get('cod_proc')}
+                mapeamento_curto = self.carregar_mapeamento_procedimentos(cod_procs_unicos)
 
             registros_apac_filtrados = []
             erros_mapeamento = set()
@@ -196,27 +228,21 @@ class APACExporter:
             return False, str(e)
 
     def gerar_arquivo_apac_formatado(self, pacientes_dados, params):
-        """Gera o arquivo TXT formatado da APAC com múltiplos tipos de registro."""
-        def formatar(valor, tamanho, tipo='char', pad_char=' '):
-            valor_str = str(valor or '').strip()
-            if tipo == 'num':
-                return ''.join(filter(str.isdigit, valor_str)).zfill(tamanho)[:tamanho]
-            else:
-                return valor_str.ljust(tamanho, pad_char)[:tamanho]
-        
+        """Gera o arquivo TXT formatado da APAC com múltiplos tipos de registro (layouts em shared/layouts.py)."""
         numero_apac_atual = int(params['numero_inicial'])
         data_inicio_validade = params['data_inicio_validade']
         data_fim_validade = data_inicio_validade + datetime.timedelta(days=90)
+        data_geracao = datetime.datetime.now().strftime('%Y%m%d')
+        inicio_validade = data_inicio_validade.strftime('%Y%m%d')
         
         with open(params['caminho_arquivo'], 'w', encoding='latin-1', newline='') as f:
-            header = "".join([
-                formatar('01', 2, 'num'), formatar('#APAC', 5), formatar(params['competencia'], 6, 'num'),
-                formatar(len(pacientes_dados), 6, 'num'), formatar('1111', 4, 'num'),
-                formatar(self.config.get('orgao_responsavel'), 30), formatar(self.config.get('sigla_orgao'), 6),
-                formatar(self.config.get('cgc_cpf'), 14, 'num'), formatar(self.config.get('orgao_destino'), 40),
-                formatar(self.config.get('indicador_destino'), 1), formatar(datetime.datetime.now().strftime('%Y%m%d'), 8, 'num'),
-                formatar(self.config.get('versao_sistema'), 15),
-            ]).ljust(137)
+            header = LAYOUT_APAC_HEADER.formatar_registro({
+                'cbc_mvm': params['competencia'], 'cbc_lin': len(pacientes_dados),
+                'cbc_rsp': self.config.get('orgao_responsavel'), 'cbc_sgl': self.config.get('sigla_orgao'),
+                'cbc_cgccpf': self.config.get('cgc_cpf'), 'cbc_dst': self.config.get('orgao_destino'),
+                'cbc_dst_in': self.config.get('indicador_destino'), 'cbc_dt_geracao': data_geracao,
+                'cbc_versao': self.config.get('versao_sistema'),
+            })
             f.write(header + '\r\n')
 
             for id_paciente, dados_paciente in pacientes_dados.items():
@@ -225,52 +251,41 @@ class APACExporter:
                 proc_principal_sigtap = proc_principal_info.get('codigo_sigtap', '0000000000')
                 num_apac_com_dv = str(numero_apac_atual).zfill(12) + '1'
 
-                corpo_str = "".join([
-                    formatar('14', 2, 'num'), formatar(params['competencia'], 6, 'num'),
-                    formatar(num_apac_com_dv, 13, 'num'), formatar('27', 2, 'num'), # UF
-                    formatar(self.config.get('cnes'), 7, 'num'), formatar(datetime.datetime.now().strftime('%Y%m%d'), 8, 'num'),
-                    formatar(data_inicio_validade.strftime('%Y%m%d'), 8, 'num'), formatar(data_fim_validade.strftime('%Y%m%d'), 8, 'num'),
-                    formatar('01', 2, 'num'), formatar('1', 1, 'num'),
-                    formatar(principal.get('nm_paciente'), 30), formatar(principal.get('nm_mae'), 30),
-                    formatar(principal.get('logradouro'), 30), formatar(principal.get('numero_endereco'), 5),
-                    formatar('', 10), formatar(principal.get('cep'), 8, 'num'),
-                    formatar(principal.get('ibge_municipio_paciente'), 7, 'num'),
-                    formatar(principal.get('data_nasc').strftime('%Y%m%d') if principal.get('data_nasc') else '', 8, 'num'),
-                    formatar('M' if str(principal.get('cod_sexo')) == '1' else 'F', 1),
-                    formatar(principal.get('nm_medico_responsavel'), 30),
-                    formatar(proc_principal_sigtap, 10, 'num'),
-                    formatar('01', 2, 'num'), formatar('', 8),
-                    formatar(principal.get('nm_medico_responsavel'), 30), # Nome Autorizador
-                    formatar(principal.get('cns_paciente'), 15, 'num'),
-                    formatar(principal.get('cns_medico_responsavel'), 15, 'num'),
-                    formatar(principal.get('cns_medico_responsavel'), 15, 'num'), # CNS Autorizador
-                    formatar('', 4), formatar('', 10), formatar('', 7),
-                    formatar(data_inicio_validade.strftime('%Y%m%d'), 8, 'num'),
-                    formatar(data_inicio_validade.strftime('%Y%m%d'), 8, 'num'),
-                    formatar('010101', 10), formatar('01', 2, 'num'), formatar('', 13),
-                    formatar(principal.get('cod_raca_etnia'), 2, 'num'),
-                    formatar(principal.get('nome_responsavel_paciente'), 30),
-                    formatar(principal.get('cod_nacionalidade'), 3, 'num'),
-                    formatar(principal.get('cod_etnia_indigena'), 4, 'num'),
-                    formatar('', 3), formatar(principal.get('bairro'), 30),
-                    formatar('', 2), formatar('', 9), formatar('', 40),
-                    formatar(principal.get('cns_medico_responsavel'), 15, 'num'), # CNS Executante
-                    formatar('', 11), formatar('', 10), formatar('N', 1),
-                ]).ljust(533)
+                corpo_str = LAYOUT_APAC_CORPO.formatar_registro({
+                    'apa_cmp': params['competencia'], 'apa_num': num_apac_com_dv,
+                    'apa_cnes': self.config.get('cnes'), 'apa_dt_processamento': data_geracao,
+                    'apa_dt_inicio_validade': inicio_validade,
+                    'apa_dt_fim_validade': data_fim_validade.strftime('%Y%m%d'),
+                    'apa_nm_paciente': principal.get('nm_paciente'), 'apa_nm_mae': principal.get('nm_mae'),
+                    'apa_logradouro': principal.get('logradouro'), 'apa_numero': principal.get('numero_endereco'),
+                    'apa_cep': principal.get('cep'), 'apa_municipio': principal.get('ibge_municipio_paciente'),
+                    'apa_dt_nascimento': principal.get('data_nasc').strftime('%Y%m%d') if principal.get('data_nasc') else '',
+                    'apa_sexo': 'M' if str(principal.get('cod_sexo')) == '1' else 'F',
+                    'apa_nm_responsavel': principal.get('nm_medico_responsavel'),
+                    'apa_proc_principal': proc_principal_sigtap,
+                    'apa_nm_autorizador': principal.get('nm_medico_responsavel'),
+                    'apa_cns_paciente': principal.get('cns_paciente'),
+                    'apa_cns_responsavel': principal.get('cns_medico_responsavel'),
+                    'apa_cns_autorizador': principal.get('cns_medico_responsavel'),
+                    'apa_dt_solicitacao': inicio_validade, 'apa_dt_autorizacao': inicio_validade,
+                    'apa_raca': principal.get('cod_raca_etnia'),
+                    'apa_nm_resp_paciente': principal.get('nome_responsavel_paciente'),
+                    'apa_nacionalidade': principal.get('cod_nacionalidade'),
+                    'apa_etnia': principal.get('cod_etnia_indigena'),
+                    'apa_bairro': principal.get('bairro'),
+                    'apa_cns_executante': principal.get('cns_medico_responsavel'),
+                })
                 f.write(corpo_str + '\r\n')
 
                 for proc in dados_paciente['procedimentos']:
                     proc_info = proc['proc_info']
-                    linha_proc_str = "".join([
-                        formatar('13', 2, 'num'), formatar(params['competencia'], 6, 'num'),
-                        formatar(num_apac_com_dv, 13, 'num'), formatar(proc_info.get('codigo_sigtap'), 10, 'num'),
-                        formatar(proc.get('codigo_cbo'), 6, 'num'), formatar(proc.get('quantidade'), 7, 'num'),
-                        formatar('', 14), formatar('', 6),
-                        formatar(proc.get('cid_principal_procedimento'), 4), formatar('', 4),
-                        formatar(proc_info.get('servico'), 3, 'num'),
-                        formatar(proc_info.get('classificacao'), 3, 'num'),
-                        formatar('', 8), formatar('', 4), formatar('', 7),
-                    ]).ljust(97)
+                    linha_proc_str = LAYOUT_APAC_PROCEDIMENTO.formatar_registro({
+                        'prc_cmp': params['competencia'], 'prc_num_apac': num_apac_com_dv,
+                        'prc_pa': proc_info.get('codigo_sigtap'), 'prc_cbo': proc.get('codigo_cbo'),
+                        'prc_qt': proc.get('quantidade'),
+                        'prc_cid_principal': proc.get('cid_principal_procedimento'),
+                        'prc_srv': proc_info.get('servico'), 'prc_clf': proc_info.get('classificacao'),
+                    })
                     f.write(linha_proc_str + '\r\n')
                 
                 numero_apac_atual += 1
@@ -334,6 +349,10 @@ class APACExporterGUI:
         self.competencia_entry = ttk.Entry(frame_datas, width=10)
         self.competencia_entry.insert(0, datetime.datetime.now().strftime("%Y%m"))
         self.competencia_entry.grid(row=0, column=5, padx=5)
+        ttk.Label(frame_datas, text="Extração Paralela:").grid(row=1, column=0, sticky="w", pady=(5, 0))
+        self.particao_combo = ttk.Combobox(frame_datas, values=list(OPCOES_PARTICAO), width=12, state="readonly")
+        self.particao_combo.current(0)
+        self.particao_combo.grid(row=1, column=1, padx=(5,10), pady=(5, 0))
         ttk.Separator(self.frame_filtros, orient='horizontal').pack(fill='x', expand=True, pady=10)
         frame_dados_apac = ttk.Frame(self.frame_filtros)
         frame_dados_apac.pack(fill='x', expand=True, padx=5, pady=5)
@@ -414,7 +433,8 @@ class APACExporterGUI:
             'competencia': competencia_val,
             'caminho_arquivo': caminho_arquivo,
             'data_inicio_validade': data_inicio_validade_val,
-            'numero_inicial': numero_inicial_val
+            'numero_inicial': numero_inicial_val,
+            'particao': OPCOES_PARTICAO.get(self.particao_combo.get()),
         }
 
         self._log_message(f"Iniciando geração de arquivo APAC para {caminho_arquivo}...")
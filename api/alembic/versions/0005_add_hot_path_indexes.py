@@ -0,0 +1,65 @@
+"""Add covering/partial indexes for exporter and dashboard hot paths"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0005_add_hot_path_indexes"
+down_revision = "0004_add_territorio_and_cbos"
+branch_labels = None
+depends_on = None
+
+
+# (nome, tabela, colunas, include, where)
+# Todas as consultas filtram lancamentos por data e sobem para contas/ficha/paciente.
+INDICES = [
+    # Filtro por periodo dos routers e exportadores; INCLUDE evita ir ao heap para os joins/agregacoes
+    (
+        "ix_lancamentos_data_cobertura",
+        "sigh.lancamentos",
+        "data",
+        "cod_conta, cod_proc, cod_prestador, cod_cid, quantidade",
+        None,
+    ),
+    # Filtro por competencia (BPA) entra por contas e volta para lancamentos
+    ("ix_lancamentos_cod_conta", "sigh.lancamentos", "cod_conta", None, None),
+    # Apenas contas ativas/abertas participam dos indicadores e exportacoes
+    ("ix_contas_ativas", "sigh.contas", "id_conta", "cod_fia", "ativo AND status_conta = 'A'"),
+    ("ix_contas_competencia_ativas", "sigh.contas", "competencia", "cod_fia", "ativo AND status_conta = 'A'"),
+    ("ix_contas_cod_fia", "sigh.contas", "cod_fia", None, None),
+    ("ix_ficha_amb_int_cod_paciente", "sigh.ficha_amb_int", "cod_paciente", None, None),
+    # Mesma ordenacao do LEFT JOIN LATERAL de shared/sql_enderecos.py: LIMIT 1 vira um index scan
+    (
+        "ix_enderecos_paciente_recente",
+        "sigh.enderecos",
+        "cod_paciente, data_hora_atualizacao DESC, data_hora_criacao DESC, id_endereco DESC",
+        "cod_logradouro, numero",
+        "ativo",
+    ),
+    # CID principal da ficha (CidPrincipalFia)
+    ("ix_cids_fia_fia_ordem", "sigh.cids_fia", "cod_fia, ordem, id_cid_fia", "cod_cid_fia", "ativo"),
+]
+
+
+def ddl_create_index(nome, tabela, colunas, include=None, where=None, concurrently=True):
+    sql = f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS {nome} ON {tabela} ({colunas})"
+    if include:
+        sql += f" INCLUDE ({include})"
+    if where:
+        sql += f" WHERE {where}"
+    return sql
+
+
+def upgrade():
+    # CONCURRENTLY nao pode rodar dentro de transacao; evita travar escrita em lancamentos
+    with op.get_context().autocommit_block():
+        for indice in INDICES:
+            op.execute(ddl_create_index(*indice))
+        for tabela in sorted({indice[1] for indice in INDICES}):
+            op.execute(f"ANALYZE {tabela}")
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for nome, tabela, *_ in reversed(INDICES):
+            schema = tabela.split(".")[0]
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {schema}.{nome}")
@@ -0,0 +1,74 @@
+"""Create daily fact table for dashboard aggregates"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0006_create_fato_atendimentos_dia"
+down_revision = "0005_add_hot_path_indexes"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "fato_atendimentos_dia",
+        sa.Column("id", sa.BigInteger(), primary_key=True, autoincrement=True),
+        sa.Column("dia", sa.Date(), nullable=False),
+        sa.Column("cod_prestador", sa.BigInteger(), nullable=True),
+        sa.Column("cod_proc", sa.BigInteger(), nullable=True),
+        sa.Column("cod_cid", sa.String(length=10), nullable=True),
+        sa.Column("cod_paciente", sa.BigInteger(), nullable=False),
+        sa.Column("conta_ativa", sa.Boolean(), nullable=False),
+        sa.Column("total_lancamentos", sa.Integer(), nullable=False),
+        sa.Column("quantidade", sa.Integer(), nullable=False),
+        schema="sigh",
+        comment="Agregado diario de lancamentos para os indicadores",
+    )
+    op.create_index("ix_fato_atendimentos_dia_dia", "fato_atendimentos_dia", ["dia"], schema="sigh")
+    op.create_index(
+        "ix_fato_atendimentos_dia_prestador",
+        "fato_atendimentos_dia",
+        ["dia", "cod_prestador"],
+        schema="sigh",
+        postgresql_where=sa.text("conta_ativa"),
+    )
+
+    op.create_table(
+        "fato_atendimentos_refresh",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("atualizado_ate", sa.DateTime(timezone=True), nullable=False),
+        schema="sigh",
+        comment="Controle da atualizacao incremental de fato_atendimentos_dia",
+    )
+
+    # Localiza rapidamente os dias alterados desde a ultima atualizacao incremental
+    op.create_index("ix_lancamentos_updated_at", "lancamentos", ["updated_at"], schema="sigh")
+    op.create_index("ix_contas_updated_at", "contas", ["updated_at"], schema="sigh")
+    op.create_index("ix_ficha_amb_int_updated_at", "ficha_amb_int", ["updated_at"], schema="sigh")
+
+    # Carga inicial completa; depois disso, python -m api.fato_atendimentos faz o incremental
+    op.execute(
+        """
+        INSERT INTO sigh.fato_atendimentos_refresh (id, atualizado_ate) VALUES (1, clock_timestamp());
+        INSERT INTO sigh.fato_atendimentos_dia
+            (dia, cod_prestador, cod_proc, cod_cid, cod_paciente, conta_ativa, total_lancamentos, quantidade)
+        SELECT
+            l.data, l.cod_prestador, l.cod_proc, l.cod_cid, fi.cod_paciente,
+            (c.ativo = 't' AND c.status_conta = 'A'),
+            COUNT(l.id_lancamento), COALESCE(SUM(l.quantidade), 0)
+        FROM sigh.lancamentos l
+        JOIN sigh.contas c ON l.cod_conta = c.id_conta
+        JOIN sigh.ficha_amb_int fi ON c.cod_fia = fi.id_fia
+        GROUP BY 1, 2, 3, 4, 5, 6;
+        ANALYZE sigh.fato_atendimentos_dia;
+        """
+    )
+
+
+def downgrade():
+    op.drop_index("ix_ficha_amb_int_updated_at", table_name="ficha_amb_int", schema="sigh")
+    op.drop_index("ix_contas_updated_at", table_name="contas", schema="sigh")
+    op.drop_index("ix_lancamentos_updated_at", table_name="lancamentos", schema="sigh")
+    op.drop_table("fato_atendimentos_refresh", schema="sigh")
+    op.drop_table("fato_atendimentos_dia", schema="sigh")
@@ -0,0 +1,108 @@
+"""Stamp updated_at in the database and record deleted/moved days for fato_atendimentos"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0007_updated_at_triggers"
+down_revision = "0006_create_fato_atendimentos_dia"
+branch_labels = None
+depends_on = None
+
+
+# Tabelas cujo updated_at decide quais dias o refresh incremental recalcula
+TABELAS = ["lancamentos", "contas", "ficha_amb_int"]
+
+
+def upgrade():
+    # O onupdate do TimestampMixin usa o relogio da aplicacao e so vale para quem escreve pelo ORM;
+    # o trigger carimba updated_at com now() do banco em qualquer INSERT/UPDATE
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION sigh.carimbar_updated_at() RETURNS trigger AS $$
+        BEGIN
+            NEW.updated_at := now();
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    for tabela in TABELAS:
+        op.execute(
+            f"""
+            CREATE TRIGGER trg_{tabela}_updated_at
+            BEFORE INSERT OR UPDATE ON sigh.{tabela}
+            FOR EACH ROW EXECUTE FUNCTION sigh.carimbar_updated_at();
+            """
+        )
+
+    # Um lancamento apagado ou movido de dia nao deixa linha com updated_at no dia antigo;
+    # os triggers abaixo guardam esses dias para o proximo refresh incremental
+    op.create_table(
+        "fato_atendimentos_dias_pendentes",
+        sa.Column("dia", sa.Date(), primary_key=True),
+        schema="sigh",
+        comment="Dias de fato_atendimentos_dia a recalcular no proximo refresh",
+    )
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION sigh.pendente_lancamento() RETURNS trigger AS $$
+        BEGIN
+            IF OLD.data IS NOT NULL THEN
+                INSERT INTO sigh.fato_atendimentos_dias_pendentes (dia) VALUES (OLD.data) ON CONFLICT DO NOTHING;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE TRIGGER trg_lancamentos_dia_pendente
+        AFTER UPDATE OF data, cod_conta OR DELETE ON sigh.lancamentos
+        FOR EACH ROW EXECUTE FUNCTION sigh.pendente_lancamento();
+
+        CREATE OR REPLACE FUNCTION sigh.pendente_conta() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO sigh.fato_atendimentos_dias_pendentes (dia)
+            SELECT DISTINCT l.data FROM sigh.lancamentos l
+            WHERE l.cod_conta = OLD.id_conta AND l.data IS NOT NULL
+            ON CONFLICT DO NOTHING;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE TRIGGER trg_contas_dia_pendente
+        AFTER DELETE ON sigh.contas
+        FOR EACH ROW EXECUTE FUNCTION sigh.pendente_conta();
+
+        CREATE OR REPLACE FUNCTION sigh.pendente_ficha() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO sigh.fato_atendimentos_dias_pendentes (dia)
+            SELECT DISTINCT l.data FROM sigh.lancamentos l
+            JOIN sigh.contas c ON l.cod_conta = c.id_conta
+            WHERE c.cod_fia = OLD.id_fia AND l.data IS NOT NULL
+            ON CONFLICT DO NOTHING;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE TRIGGER trg_ficha_amb_int_dia_pendente
+        AFTER DELETE ON sigh.ficha_amb_int
+        FOR EACH ROW EXECUTE FUNCTION sigh.pendente_ficha();
+        """
+    )
+
+
+def downgrade():
+    op.execute(
+        """
+        DROP TRIGGER IF EXISTS trg_ficha_amb_int_dia_pendente ON sigh.ficha_amb_int;
+        DROP TRIGGER IF EXISTS trg_contas_dia_pendente ON sigh.contas;
+        DROP TRIGGER IF EXISTS trg_lancamentos_dia_pendente ON sigh.lancamentos;
+        DROP FUNCTION IF EXISTS sigh.pendente_ficha();
+        DROP FUNCTION IF EXISTS sigh.pendente_conta();
+        DROP FUNCTION IF EXISTS sigh.pendente_lancamento();
+        """
+    )
+    op.drop_table("fato_atendimentos_dias_pendentes", schema="sigh")
+    for tabela in TABELAS:
+        op.execute(f"DROP TRIGGER IF EXISTS trg_{tabela}_updated_at ON sigh.{tabela};")
+    op.execute("DROP FUNCTION IF EXISTS sigh.carimbar_updated_at();")
@@ -1,8 +1,10 @@
-from typing import AsyncGenerator
+import asyncio
+from typing import Any, AsyncGenerator, Mapping, Sequence
 
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
-from .config import get_db_settings
+from .config import get_db_pool_settings, get_db_settings
+from .logging import set_pool_metrics
 
 _engine = None
 _SessionLocal = None
@@ -16,17 +18,70 @@ def _get_engine():
             f"postgresql+asyncpg://{settings['db_user']}:{settings['db_password']}"
             f"@{settings['db_host']}:{settings['db_port']}/{settings['db_name']}"
         )
-        _engine = create_async_engine(url, future=True, echo=False)
+        _engine = create_async_engine(url, future=True, echo=False, pool_pre_ping=True, **get_db_pool_settings())
         _SessionLocal = async_sessionmaker(_engine, expire_on_commit=False, class_=AsyncSession)
     return _engine, _SessionLocal
 
 
+def init_engine():
+    """Create the process-wide async engine, called at FastAPI startup so bad settings fail early."""
+    engine, _ = _get_engine()
+    return engine
+
+
 async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
     _, session_factory = _get_engine()
     async with session_factory() as session:
         yield session
 
 
+async def fetch_all(session: AsyncSession, statement: Any, params: Mapping[str, Any] | None = None) -> Sequence[Any]:
+    result = await session.execute(statement, params)
+    return result.fetchall()
+
+
+def as_mappings(rows: Sequence[Any]) -> list[dict[str, Any]]:
+    """Detach fetched rows from the result objects as plain dicts (safe to cache or serialise)."""
+    return [dict(row._mapping) for row in rows]
+
+
+async def fetch_mappings(
+    session: AsyncSession, statement: Any, params: Mapping[str, Any] | None = None
+) -> list[dict[str, Any]]:
+    return as_mappings(await fetch_all(session, statement, params))
+
+
+def get_session_factory() -> async_sessionmaker:
+    """FastAPI dependency for endpoints that open several sessions (see fetch_concurrently)."""
+    _, session_factory = _get_engine()
+    return session_factory
+
+
+async def fetch_concurrently(
+    session_factory: async_sessionmaker, *queries: tuple[Any, Mapping[str, Any] | None]
+) -> list[Sequence[Any]]:
+    """
+    Run independent (statement, params) queries at the same time, each on its own session
+    and pooled connection, and return the fetched rows of each one in the given order.
+    Latency becomes the slowest query instead of the sum of all of them.
+    """
+
+    async def _fetch(statement, params):
+        async with session_factory() as session:
+            return await fetch_all(session, statement, params)
+
+    return list(await asyncio.gather(*(_fetch(statement, params) for statement, params in queries)))
+
+
 async def dispose_engine():
+    global _engine, _SessionLocal
     if _engine:
         await _engine.dispose()
+        _engine = None
+        _SessionLocal = None
+
+
+def update_pool_metrics():
+    """Copy the asyncpg pool statistics into the Prometheus gauges."""
+    if _engine is not None:
+        set_pool_metrics("async", _engine.pool)
@@ -0,0 +1,131 @@
+"""
+Response cache for the /api/indicadores/* endpoints.
+
+Keys combine the endpoint name with its normalised parameters (dates already resolved to
+their defaults). Periods that ended before the current month never change, so they get a
+long TTL; periods that reach into the current month get a short one.
+"""
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Awaitable, Callable, Mapping, Optional, TypeVar
+
+from .config import get_cache_settings
+from .logging import CACHE_HITS, CACHE_MISSES
+
+T = TypeVar("T")
+
+
+class CacheBackend(ABC):
+    """Interface for cache stores. ``get`` returns None on a miss or an expired entry."""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: Any, ttl: int) -> None:
+        ...
+
+    @abstractmethod
+    def clear(self) -> None:
+        ...
+
+
+class InMemoryLRUCache(CacheBackend):
+    """Per-process store with a TTL per entry and LRU eviction beyond ``max_entries``."""
+
+    def __init__(self, max_entries: int = 512, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= self._clock():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: int) -> None:
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (self._clock() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_backend: Optional[CacheBackend] = None
+
+
+def get_cache_backend() -> CacheBackend:
+    global _backend
+    if _backend is None:
+        _backend = InMemoryLRUCache(max_entries=get_cache_settings()["max_entries"])
+    return _backend
+
+
+def set_cache_backend(backend: Optional[CacheBackend]) -> None:
+    """Swap the store (e.g. for a shared backend); None goes back to the in-process default."""
+    global _backend
+    _backend = backend
+
+
+def clear_cache() -> None:
+    if _backend is not None:
+        _backend.clear()
+
+
+def build_cache_key(endpoint: str, params: Mapping[str, Any]) -> str:
+    normalised = "&".join(
+        f"{name}={value.isoformat() if isinstance(value, date) else value}" for name, value in sorted(params.items())
+    )
+    return f"{endpoint}?{normalised}"
+
+
+def ttl_for_period(data_fim: Optional[date], today: Optional[date] = None) -> int:
+    """Long TTL when the period ended before the current month, short TTL otherwise."""
+    settings = get_cache_settings()
+    first_day_current_month = (today or date.today()).replace(day=1)
+    if data_fim is not None and data_fim < first_day_current_month:
+        return settings["ttl_closed"]
+    return settings["ttl_current"]
+
+
+async def get_or_load(endpoint: str, params: Mapping[str, Any], loader: Callable[[], Awaitable[T]]) -> T:
+    """
+    Return the cached value for ``endpoint`` + ``params`` or run ``loader`` and cache its result.
+    Loaders must return plain data (lists of dicts, see async_db.fetch_mappings), never live
+    result rows, so that any backend can store and serialise them. Exceptions are not cached.
+    """
+    if not get_cache_settings()["enabled"]:
+        return await loader()
+
+    backend = get_cache_backend()
+    key = build_cache_key(endpoint, params)
+    value = backend.get(key)
+    if value is not None:
+        CACHE_HITS.labels(endpoint=endpoint).inc()
+        return value
+
+    CACHE_MISSES.labels(endpoint=endpoint).inc()
+    value = await loader()
+    backend.set(key, value, ttl_for_period(params.get("data_fim")))
+    return value
@@ -24,6 +24,16 @@ def _load_from_ini() -> Dict[str, str]:
     }
 
 
+def _int_env(name: str, default: int) -> int:
+    raw = os.getenv(f"{ENV_PREFIX}{name}")
+    if not raw:
+        return default
+    try:
+        return int(raw)
+    except ValueError:
+        raise RuntimeError(f"{ENV_PREFIX}{name} must be an integer, got {raw!r}")
+
+
 @lru_cache(maxsize=1)
 def get_db_settings() -> Dict[str, str]:
     """
@@ -44,6 +54,36 @@ def get_db_settings() -> Dict[str, str]:
     return env_values
 
 
+@lru_cache(maxsize=1)
+def get_db_pool_settings() -> Dict[str, int]:
+    """
+    Pool settings for the process-wide engine used by the API.
+    Read from APP_DB_POOL_SIZE, APP_DB_MAX_OVERFLOW, APP_DB_POOL_TIMEOUT and APP_DB_POOL_RECYCLE.
+    """
+    return {
+        "pool_size": _int_env("DB_POOL_SIZE", 5),
+        "max_overflow": _int_env("DB_MAX_OVERFLOW", 5),
+        "pool_timeout": _int_env("DB_POOL_TIMEOUT", 30),
+        "pool_recycle": _int_env("DB_POOL_RECYCLE", 1800),
+    }
+
+
+@lru_cache(maxsize=1)
+def get_cache_settings() -> Dict[str, int | bool]:
+    """
+    Response cache settings for /api/indicadores/*.
+    APP_CACHE_ENABLED (default true), APP_CACHE_MAX_ENTRIES, and the TTLs in seconds for periods
+    that end in the current month (APP_CACHE_TTL_CURRENT) and for closed months (APP_CACHE_TTL_CLOSED).
+    """
+    enabled = os.getenv(f"{ENV_PREFIX}CACHE_ENABLED", "true").strip().lower() not in ("0", "false", "no", "off")
+    return {
+        "enabled": enabled,
+        "max_entries": _int_env("CACHE_MAX_ENTRIES", 512),
+        "ttl_current": _int_env("CACHE_TTL_CURRENT", 300),
+        "ttl_closed": _int_env("CACHE_TTL_CLOSED", 86400),
+    }
+
+
 @lru_cache(maxsize=1)
 def get_api_key() -> str | None:
     """
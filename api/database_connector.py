@@ -1,36 +1,37 @@
 import logging
-from fastapi import HTTPException
 
-from shared.database import Database
-from .config import get_db_settings
+from shared.database import criar_engine
+from .config import get_db_pool_settings, get_db_settings
 
 logger = logging.getLogger(__name__)
 
+_engine = None
 
-def get_db_connection():
+
+def init_engine():
     """
-    FastAPI dependency that opens and closes one database connection per request.
+    Create the process-wide sync engine used by the CLI jobs (api.fato_atendimentos); the API
+    itself only uses the asyncpg pool of api.async_db.
     Prefers environment variables (APP_DB_*) and falls back to config.ini.
     """
-    db = Database()
-    try:
+    global _engine
+    if _engine is None:
         settings = get_db_settings()
-    except RuntimeError as exc:
-        logger.error("Database settings missing: %s", exc)
-        raise HTTPException(status_code=500, detail="Database configuration is missing")
+        _engine = criar_engine(
+            db_name=settings["db_name"],
+            user=settings["db_user"],
+            password=settings["db_password"],
+            host=settings["db_host"],
+            port=settings["db_port"],
+            **get_db_pool_settings(),
+        )
+        logger.info("Database engine created", extra=get_db_pool_settings())
+    return _engine
 
-    sucesso, mensagem = db.conectar(
-        db_name=settings["db_name"],
-        user=settings["db_user"],
-        password=settings["db_password"],
-        host=settings["db_host"],
-        port=settings["db_port"],
-    )
-    if not sucesso:
-        raise HTTPException(status_code=503, detail=f"Falha ao conectar ao banco de dados: {mensagem}")
 
-    try:
-        yield db.conn
-    finally:
-        if db.conn:
-            db.conn.close()
+def dispose_engine():
+    """Close every pooled connection, called when the CLI job finishes."""
+    global _engine
+    if _engine is not None:
+        _engine.dispose()
+        _engine = None
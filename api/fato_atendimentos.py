@@ -0,0 +1,152 @@
+"""
+Incremental refresh of sigh.fato_atendimentos_dia, the daily aggregate read by the dashboards.
+
+Only days touched since the last run are recomputed: a day is "changed" when any of its
+lancamentos, or the conta/ficha they hang from, has ``updated_at`` after the watermark stored
+in sigh.fato_atendimentos_refresh, minus ``WATERMARK_OVERLAP``.
+
+``updated_at`` is stamped by a database trigger (revision 0007) with ``now()``, the start of
+the writing transaction, so writers outside the ORM are seen too. A transaction that started
+before a scan and commits after it carries an ``updated_at`` older than the saved watermark;
+the overlap re-scans that window, so it must be longer than the longest writing transaction
+(recomputing a day twice is harmless).
+
+Deleted lancamentos (directly or with their conta/ficha) and lancamentos moved to another day
+leave no row behind in the old day; revision 0007 also has triggers that record those days in
+sigh.fato_atendimentos_dias_pendentes, which each run consumes in the same transaction.
+
+Run periodically (cron/systemd timer), from the project root:
+    python -m api.fato_atendimentos                                  # incremental
+    python -m api.fato_atendimentos --inicio 2024-01-01 --fim 2024-12-31
+"""
+import argparse
+import logging
+from datetime import date, datetime, timedelta
+from typing import Iterable, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+logger = logging.getLogger(__name__)
+
+# Re-scanned on every run: must exceed the longest transaction writing the watched tables
+WATERMARK_OVERLAP = timedelta(minutes=30)
+
+CHANGED_DAYS_QUERY = text(
+    """
+    SELECT l.data FROM sigh.lancamentos l
+    WHERE l.updated_at > :desde
+    UNION
+    SELECT l.data FROM sigh.lancamentos l
+    JOIN sigh.contas c ON l.cod_conta = c.id_conta
+    WHERE c.updated_at > :desde
+    UNION
+    SELECT l.data FROM sigh.lancamentos l
+    JOIN sigh.contas c ON l.cod_conta = c.id_conta
+    JOIN sigh.ficha_amb_int fi ON c.cod_fia = fi.id_fia
+    WHERE fi.updated_at > :desde;
+    """
+)
+
+# Claims and clears the days recorded by the delete/move triggers in a single statement
+PENDING_DAYS_QUERY = text("DELETE FROM sigh.fato_atendimentos_dias_pendentes RETURNING dia;")
+
+DELETE_DAYS_QUERY = text("DELETE FROM sigh.fato_atendimentos_dia WHERE dia = ANY(:dias);")
+
+INSERT_DAYS_QUERY = text(
+    """
+    INSERT INTO sigh.fato_atendimentos_dia
+        (dia, cod_prestador, cod_proc, cod_cid, cod_paciente, conta_ativa, total_lancamentos, quantidade)
+    SELECT
+        l.data,
+        l.cod_prestador,
+        l.cod_proc,
+        l.cod_cid,
+        fi.cod_paciente,
+        (c.ativo = 't' AND c.status_conta = 'A'),
+        COUNT(l.id_lancamento),
+        COALESCE(SUM(l.quantidade), 0)
+    FROM sigh.lancamentos l
+    JOIN sigh.contas c ON l.cod_conta = c.id_conta
+    JOIN sigh.ficha_amb_int fi ON c.cod_fia = fi.id_fia
+    WHERE l.data = ANY(:dias)
+    GROUP BY 1, 2, 3, 4, 5, 6;
+    """
+)
+
+WATERMARK_QUERY = text("SELECT atualizado_ate FROM sigh.fato_atendimentos_refresh WHERE id = 1;")
+
+SAVE_WATERMARK_QUERY = text(
+    """
+    INSERT INTO sigh.fato_atendimentos_refresh (id, atualizado_ate) VALUES (1, :atualizado_ate)
+    ON CONFLICT (id) DO UPDATE SET atualizado_ate = EXCLUDED.atualizado_ate;
+    """
+)
+
+
+def refresh_days(conn: Connection, dias: Iterable[date]) -> int:
+    """Recompute the aggregate for the given days (delete + insert). Returns the number of days."""
+    dias = sorted(set(dias))
+    if not dias:
+        return 0
+    conn.execute(DELETE_DAYS_QUERY, {"dias": dias})
+    conn.execute(INSERT_DAYS_QUERY, {"dias": dias})
+    return len(dias)
+
+
+def refresh_range(conn: Connection, inicio: date, fim: date) -> int:
+    if inicio > fim:
+        raise ValueError("inicio cannot be after fim")
+    return refresh_days(conn, (inicio + timedelta(days=n) for n in range((fim - inicio).days + 1)))
+
+
+def changed_days(conn: Connection, desde: datetime) -> List[date]:
+    return [row[0] for row in conn.execute(CHANGED_DAYS_QUERY, {"desde": desde}).fetchall()]
+
+
+def pending_days(conn: Connection) -> List[date]:
+    return [row[0] for row in conn.execute(PENDING_DAYS_QUERY).fetchall()]
+
+
+def refresh_incremental(conn: Connection) -> int:
+    """
+    Recompute only the days changed since the stored watermark (minus ``WATERMARK_OVERLAP``),
+    plus the pending days left by deleted or moved lancamentos, and advance the watermark.
+    The new watermark is taken before looking for changes, so rows written during the run are
+    picked up again next time instead of being skipped. Must run in one transaction: the
+    pending days are only cleared if the recomputation commits.
+    """
+    novo_watermark = conn.execute(text("SELECT clock_timestamp();")).scalar_one()
+    watermark: Optional[datetime] = conn.execute(WATERMARK_QUERY).scalar_one_or_none()
+    if watermark is None:
+        raise RuntimeError("fato_atendimentos_refresh has no watermark; run a range refresh first")
+
+    dias = set(changed_days(conn, watermark - WATERMARK_OVERLAP)) | set(pending_days(conn))
+    total = refresh_days(conn, dias)
+    conn.execute(SAVE_WATERMARK_QUERY, {"atualizado_ate": novo_watermark})
+    return total
+
+
+def main():
+    from .database_connector import dispose_engine, init_engine
+
+    parser = argparse.ArgumentParser(description="Atualiza sigh.fato_atendimentos_dia.")
+    parser.add_argument("--inicio", type=date.fromisoformat, help="Recalcula o periodo inteiro a partir desta data.")
+    parser.add_argument("--fim", type=date.fromisoformat, help="Fim do periodo recalculado (padrao: hoje).")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    engine = init_engine()
+    try:
+        with engine.begin() as conn:
+            if args.inicio:
+                total = refresh_range(conn, args.inicio, args.fim or date.today())
+            else:
+                total = refresh_incremental(conn)
+        logger.info("fato_atendimentos_dia atualizado", extra={"dias": total})
+    finally:
+        dispose_engine()
+
+
+if __name__ == "__main__":
+    main()
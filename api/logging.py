@@ -7,7 +7,7 @@ from typing import Awaitable, Callable
 
 from fastapi import Request, Response
 from pythonjsonlogger import jsonlogger
-from prometheus_client import Counter, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import Counter, Gauge, generate_latest, CONTENT_TYPE_LATEST
 
 # Contexto global para request_id e endpoint corrente
 _request_id_ctx: ContextVar[str | None] = ContextVar("request_id", default=None)
@@ -20,6 +20,16 @@ REQUEST_COUNTER = Counter(
     ["endpoint", "method", "status"],
 )
 
+# Cache de respostas dos indicadores
+CACHE_HITS = Counter("api_cache_hits_total", "Respostas de indicadores servidas pelo cache", ["endpoint"])
+CACHE_MISSES = Counter("api_cache_misses_total", "Respostas de indicadores calculadas no banco", ["endpoint"])
+
+# Estado dos pools de conexoes da API, por engine sync/async (atualizado a cada leitura de /metrics)
+DB_POOL_SIZE = Gauge("api_db_pool_size", "Tamanho configurado do pool de conexoes", ["engine"])
+DB_POOL_CHECKED_OUT = Gauge("api_db_pool_checked_out", "Conexoes emprestadas a requisicoes", ["engine"])
+DB_POOL_CHECKED_IN = Gauge("api_db_pool_checked_in", "Conexoes ociosas no pool", ["engine"])
+DB_POOL_OVERFLOW = Gauge("api_db_pool_overflow", "Conexoes abertas alem de pool_size (negativo enquanto o pool nao enche)", ["engine"])
+
 
 class ContextFilter(logging.Filter):
     """Inclui request_id e endpoint no registro mesmo quando não fornecidos via extra."""
@@ -105,6 +115,14 @@ def create_request_id_middleware() -> Callable[[Request, Callable[[Request], Awa
     return middleware
 
 
+def set_pool_metrics(engine: str, pool) -> None:
+    """Atualiza os gauges de pool a partir de um QueuePool do SQLAlchemy."""
+    DB_POOL_SIZE.labels(engine=engine).set(pool.size())
+    DB_POOL_CHECKED_OUT.labels(engine=engine).set(pool.checkedout())
+    DB_POOL_CHECKED_IN.labels(engine=engine).set(pool.checkedin())
+    DB_POOL_OVERFLOW.labels(engine=engine).set(pool.overflow())
+
+
 def metrics_response() -> Response:
     """Retorna métricas do Prometheus."""
     return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -1,11 +1,14 @@
 import logging
+from contextlib import asynccontextmanager
+
 from fastapi import Depends, FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy import text
-from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from . import async_db
+from .async_db import get_async_session
 from .config import get_allowed_origins
-from .database_connector import get_db_connection
 from .logging import create_request_id_middleware, metrics_response, setup_logging
 from .routers import (
     indicadores_assistencial,
@@ -19,10 +22,23 @@ from .security import verify_api_key
 setup_logging()
 logger = logging.getLogger(__name__)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Cria o engine asyncpg unico do processo no startup e fecha o pool no shutdown."""
+    try:
+        async_db.init_engine()
+    except RuntimeError as exc:
+        logger.error("Database settings missing at startup: %s", exc)
+    yield
+    await async_db.dispose_engine()
+
+
 app = FastAPI(
     title="API de Indicadores de Saude",
     description="Fornece dados para o dashboard de gestao da clinica.",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -56,9 +72,9 @@ def health():
 
 
 @app.get("/ready", tags=["Health"])
-def ready(conn: Connection = Depends(get_db_connection)):
+async def ready(session: AsyncSession = Depends(get_async_session)):
     try:
-        conn.execute(text("SELECT 1"))
+        await session.execute(text("SELECT 1"))
         return {"status": "ready"}
     except Exception as exc:
         logger.exception("Readiness check failed")
@@ -67,4 +83,5 @@ def ready(conn: Connection = Depends(get_db_connection)):
 
 @app.get("/metrics", include_in_schema=False)
 def metrics():
+    async_db.update_pool_metrics()
     return metrics_response()
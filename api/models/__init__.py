@@ -17,6 +17,7 @@ from .core import (
     PacienteLaboratorio,
 )
 from .auditoria import AuditoriaExportacao
+from .fato import FatoAtendimentoDia, FatoAtendimentoDiaPendente, FatoAtendimentoRefresh
 
 __all__ = [
     "Base",
@@ -36,4 +37,7 @@ __all__ = [
     "CepMunicipio",
     "PacienteLaboratorio",
     "AuditoriaExportacao",
+    "FatoAtendimentoDia",
+    "FatoAtendimentoRefresh",
+    "FatoAtendimentoDiaPendente",
 ]
@@ -0,0 +1,39 @@
+import sqlalchemy as sa
+
+from .base import Base
+
+
+class FatoAtendimentoDia(Base):
+    """Agregado diario de lancamentos (dia x prestador x procedimento x cid x paciente) lido pelos dashboards."""
+
+    __tablename__ = "fato_atendimentos_dia"
+    __table_args__ = {"schema": "sigh", "comment": "Agregado diario de lancamentos para os indicadores"}
+
+    id = sa.Column(sa.BigInteger, primary_key=True, autoincrement=True)
+    dia = sa.Column(sa.Date, nullable=False)
+    cod_prestador = sa.Column(sa.BigInteger, nullable=True)
+    cod_proc = sa.Column(sa.BigInteger, nullable=True)
+    cod_cid = sa.Column(sa.String(10), nullable=True)
+    cod_paciente = sa.Column(sa.BigInteger, nullable=False)
+    conta_ativa = sa.Column(sa.Boolean, nullable=False)
+    total_lancamentos = sa.Column(sa.Integer, nullable=False)
+    quantidade = sa.Column(sa.Integer, nullable=False)
+
+
+class FatoAtendimentoRefresh(Base):
+    """Marca d'agua (updated_at) da ultima atualizacao incremental do agregado."""
+
+    __tablename__ = "fato_atendimentos_refresh"
+    __table_args__ = {"schema": "sigh", "comment": "Controle da atualizacao incremental de fato_atendimentos_dia"}
+
+    id = sa.Column(sa.Integer, primary_key=True)
+    atualizado_ate = sa.Column(sa.DateTime(timezone=True), nullable=False)
+
+
+class FatoAtendimentoDiaPendente(Base):
+    """Dias a recalcular registrados por trigger (lancamento apagado ou movido de dia), consumidos pelo refresh."""
+
+    __tablename__ = "fato_atendimentos_dias_pendentes"
+    __table_args__ = {"schema": "sigh", "comment": "Dias de fato_atendimentos_dia a recalcular no proximo refresh"}
+
+    dia = sa.Column(sa.Date, primary_key=True)
@@ -5,10 +5,11 @@ import logging
 from dateutil.relativedelta import relativedelta
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy import text
-from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
+from ..async_db import as_mappings, fetch_concurrently, fetch_mappings, get_async_session, get_session_factory
+from ..cache import get_or_load
 from ..date_utils import last_n_months, resolve_or_default
-from ..database_connector import get_db_connection
 from ..schemas.kpi import AtendimentoPeriodo, KpiExecutivo
 from ..security import verify_api_key
 
@@ -16,6 +17,45 @@ router = APIRouter(prefix="/api/indicadores/executivo", tags=["Dashboard Executi
 
 logger = logging.getLogger(__name__)
 
+KPIS_PRINCIPAIS_QUERY = text(
+    """
+    SELECT 
+        COUNT(l.id_lancamento) as total_atendimentos,
+        COUNT(DISTINCT fi.cod_paciente) as pacientes_unicos,
+        COALESCE(SUM(COALESCE(l.quantidade, 1) * COALESCE(p.valor_procedimento, 0)), 0) as faturamento_total
+    FROM sigh.lancamentos AS l
+    JOIN sigh.contas AS c ON l.cod_conta = c.id_conta
+    JOIN sigh.ficha_amb_int AS fi ON c.cod_fia = fi.id_fia
+    LEFT JOIN sigh.procedimentos AS p ON l.cod_proc = p.id_procedimento
+    WHERE l.data BETWEEN :data_inicio AND :data_fim AND c.ativo = 't' AND c.status_conta = 'A';
+    """
+)
+
+PROCEDIMENTOS_FALTANTES_QUERY = text(
+    """
+    SELECT COUNT(*) as faltantes
+    FROM sigh.lancamentos AS l
+    JOIN sigh.contas AS c ON l.cod_conta = c.id_conta
+    WHERE l.data BETWEEN :data_inicio AND :data_fim
+      AND c.ativo = 't' AND c.status_conta = 'A'
+      AND (l.cod_proc IS NULL OR NOT EXISTS (SELECT 1 FROM sigh.procedimentos p WHERE p.id_procedimento = l.cod_proc));
+    """
+)
+
+ATENDIMENTOS_POR_PERIODO_QUERY = text(
+    """
+    SELECT
+        DATE_TRUNC('month', f.dia)::DATE as periodo,
+        SUM(f.total_lancamentos) as total_atendimentos,
+        COUNT(DISTINCT f.cod_paciente) as pacientes_unicos
+    FROM sigh.fato_atendimentos_dia AS f
+    WHERE f.dia BETWEEN :data_inicio AND :data_fim
+      AND f.conta_ativa
+    GROUP BY 1
+    ORDER BY periodo ASC;
+    """
+)
+
 
 def format_currency_br(valor: float) -> str:
     """Formata numero para moeda pt-BR simples."""
@@ -27,10 +67,11 @@ def format_currency_br(valor: float) -> str:
 async def get_kpis_principais(
     data_inicio: Optional[date] = None,
     data_fim: Optional[date] = None,
-    conn: Connection = Depends(get_db_connection),
+    session_factory: async_sessionmaker = Depends(get_session_factory),
 ):
     """
     KPIs consolidados para o periodo escolhido.
+    As consultas sao independentes e rodam em paralelo, cada uma numa conexao do pool.
     """
     try:
         if not data_inicio or not data_fim:
@@ -40,37 +81,23 @@ async def get_kpis_principais(
             data_fim = proximo_mes - relativedelta(days=1)
         data_inicio, data_fim = resolve_or_default(data_inicio, data_fim, data_inicio, data_fim)
 
-        query = text(
-            """
-            SELECT 
-                COUNT(l.id_lancamento) as total_atendimentos,
-                COUNT(DISTINCT fi.cod_paciente) as pacientes_unicos,
-                COALESCE(SUM(COALESCE(l.quantidade, 1) * COALESCE(p.valor_procedimento, 0)), 0) as faturamento_total
-            FROM sigh.lancamentos AS l
-            JOIN sigh.contas AS c ON l.cod_conta = c.id_conta
-            JOIN sigh.ficha_amb_int AS fi ON c.cod_fia = fi.id_fia
-            LEFT JOIN sigh.procedimentos AS p ON l.cod_proc = p.id_procedimento
-            WHERE l.data BETWEEN :data_inicio AND :data_fim AND c.ativo = 't' AND c.status_conta = 'A';
-        """
-        )
-        result = conn.execute(query, {"data_inicio": data_inicio, "data_fim": data_fim}).fetchone()
-
-        missing_query = text(
-            """
-            SELECT COUNT(*) as faltantes
-            FROM sigh.lancamentos AS l
-            JOIN sigh.contas AS c ON l.cod_conta = c.id_conta
-            WHERE l.data BETWEEN :data_inicio AND :data_fim
-              AND c.ativo = 't' AND c.status_conta = 'A'
-              AND (l.cod_proc IS NULL OR NOT EXISTS (SELECT 1 FROM sigh.procedimentos p WHERE p.id_procedimento = l.cod_proc));
-        """
-        )
-        missing = conn.execute(missing_query, {"data_inicio": data_inicio, "data_fim": data_fim}).fetchone()
-        if missing and missing._mapping.get("faltantes", 0) > 0:
-            logger.warning("Procedimentos sem preco/mapeamento", extra={"faltantes": missing._mapping.get("faltantes", 0)})
-
-        if result:
-            dados = dict(result._mapping)
+        params = {"data_inicio": data_inicio, "data_fim": data_fim}
+
+        async def carregar():
+            resultados = await fetch_concurrently(
+                session_factory,
+                (KPIS_PRINCIPAIS_QUERY, params),
+                (PROCEDIMENTOS_FALTANTES_QUERY, params),
+            )
+            return [as_mappings(rows) for rows in resultados]
+
+        kpi_rows, missing_rows = await get_or_load("executivo/kpis_principais", params, carregar)
+        dados = kpi_rows[0] if kpi_rows else None
+        missing = missing_rows[0] if missing_rows else None
+        if missing and missing.get("faltantes", 0) > 0:
+            logger.warning("Procedimentos sem preco/mapeamento", extra={"faltantes": missing.get("faltantes", 0)})
+
+        if dados:
             faturamento_total = float(dados.get("faturamento_total", 0))
             return KpiExecutivo(
                 total_atendimentos_mes=dados.get("total_atendimentos", 0),
@@ -88,7 +115,7 @@ async def get_kpis_principais(
 async def get_atendimentos_periodo(
     data_inicio: Optional[date] = None,
     data_fim: Optional[date] = None,
-    conn: Connection = Depends(get_db_connection),
+    session: AsyncSession = Depends(get_async_session),
 ):
     """
     Serie historica de atendimentos para o periodo escolhido.
@@ -97,29 +124,14 @@ async def get_atendimentos_periodo(
         default_inicio, default_fim = last_n_months(12)
         data_inicio, data_fim = resolve_or_default(data_inicio, data_fim, default_inicio, default_fim)
 
-        query = text(
-            """
-            SELECT 
-                DATE_TRUNC('month', l.data)::DATE as periodo,
-                COUNT(l.id_lancamento) as total_atendimentos,
-                COUNT(DISTINCT fi.cod_paciente) as pacientes_unicos
-            FROM sigh.lancamentos AS l
-            JOIN sigh.contas AS c ON l.cod_conta = c.id_conta
-            JOIN sigh.ficha_amb_int AS fi ON c.cod_fia = fi.id_fia
-            WHERE l.data BETWEEN :data_inicio AND :data_fim
-              AND c.ativo = 't' AND c.status_conta = 'A'
-            GROUP BY 1
-            ORDER BY periodo ASC;
-        """
-        )
-
-        results = conn.execute(query, {"data_inicio": data_inicio, "data_fim": data_fim}).fetchall()
+        params = {"data_inicio": data_inicio, "data_fim": data_fim}
+        results = await get_or_load("executivo/atendimentos_por_periodo", params, lambda: fetch_mappings(session, ATENDIMENTOS_POR_PERIODO_QUERY, params))
 
         dados_formatados = [
             AtendimentoPeriodo(
-                periodo=row._mapping["periodo"].strftime("%Y-%m"),
-                total_atendimentos=row._mapping["total_atendimentos"],
-                pacientes_unicos=row._mapping["pacientes_unicos"],
+                periodo=row["periodo"].strftime("%Y-%m"),
+                total_atendimentos=row["total_atendimentos"],
+                pacientes_unicos=row["pacientes_unicos"],
             )
             for row in results
         ]
@@ -0,0 +1,11 @@
+import pytest
+
+from api.cache import clear_cache
+
+
+@pytest.fixture(autouse=True)
+def _clear_response_cache():
+    """Cached indicator responses must not leak between tests that reuse the same period."""
+    clear_cache()
+    yield
+    clear_cache()
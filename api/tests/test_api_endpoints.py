@@ -1,3 +1,4 @@
+import asyncio
 import sys
 from pathlib import Path
 import datetime
@@ -8,7 +9,13 @@ ROOT = Path(__file__).resolve().parents[2]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
-from api.routers.indicadores_executivo import get_kpis_principais, get_atendimentos_periodo
+from api.async_db import fetch_concurrently
+from api.routers.indicadores_executivo import (
+    KPIS_PRINCIPAIS_QUERY,
+    PROCEDIMENTOS_FALTANTES_QUERY,
+    get_kpis_principais,
+    get_atendimentos_periodo,
+)
 from api.routers.indicadores_assistencial import (
     get_top_diagnosticos,
     get_perfil_etario,
@@ -42,14 +49,25 @@ class FakeDate:
         return self._datestr[:7]
 
 
-class FakeConn:
-    def __init__(self, mapping=None):
+class FakeSession:
+    def __init__(self, mapping=None, delay=0):
         self.mapping = mapping or {}
         self.calls = 0
+        self.delay = delay
+        # Consultas em andamento ao mesmo tempo (e o maximo observado), sem depender do relogio
+        self.in_flight = 0
+        self.max_in_flight = 0
 
-    def execute(self, query, params=None):
+    async def execute(self, query, params=None):
         sql = str(query)
         self.calls += 1
+        if self.delay:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            try:
+                await asyncio.sleep(self.delay)
+            finally:
+                self.in_flight -= 1
         if "faltantes" in sql:
             return FakeResult([FakeRow({"faltantes": 0})])
         if "COUNT(l.id_lancamento)" in sql and "faturamento_total" in sql:
@@ -102,6 +120,24 @@ class FakeConn:
         return FakeResult([])
 
 
+class FakeSessionFactory:
+    """Imita async_sessionmaker: cada chamada abre uma 'sessao' (aqui, sempre a mesma fake)."""
+
+    def __init__(self, session):
+        self.session = session
+        self.opened = 0
+
+    def __call__(self):
+        self.opened += 1
+        return self
+
+    async def __aenter__(self):
+        return self.session
+
+    async def __aexit__(self, *exc):
+        return False
+
+
 pytestmark = pytest.mark.anyio("asyncio")
 
 
@@ -111,30 +147,54 @@ def anyio_backend():
 
 
 async def test_executivo():
-    conn = FakeConn()
-    kpi = await get_kpis_principais(conn=conn, data_inicio=datetime.date(2025, 1, 1), data_fim=datetime.date(2025, 1, 31))
+    session = FakeSession()
+    kpi = await get_kpis_principais(session_factory=FakeSessionFactory(session), data_inicio=datetime.date(2025, 1, 1), data_fim=datetime.date(2025, 1, 31))
     assert kpi.total_atendimentos_mes == 5
-    serie = await get_atendimentos_periodo(conn=conn, data_inicio=datetime.date(2024, 1, 1), data_fim=datetime.date(2025, 1, 1))
+    serie = await get_atendimentos_periodo(session=session, data_inicio=datetime.date(2024, 1, 1), data_fim=datetime.date(2025, 1, 1))
     assert len(serie) == 2
 
 
 async def test_assistencial():
-    conn = FakeConn()
-    diag = await get_top_diagnosticos(conn=conn, data_inicio=datetime.date(2025, 1, 1), data_fim=datetime.date(2025, 1, 31))
+    session = FakeSession()
+    diag = await get_top_diagnosticos(session=session, data_inicio=datetime.date(2025, 1, 1), data_fim=datetime.date(2025, 1, 31))
     assert diag[0].cid_codigo == "A00"
-    perfil = await get_perfil_etario(conn=conn, data_inicio=datetime.date(2025, 1, 1), data_fim=datetime.date(2025, 1, 31))
+    perfil = await get_perfil_etario(session=session, data_inicio=datetime.date(2025, 1, 1), data_fim=datetime.date(2025, 1, 31))
     assert perfil[0].masculino == 1
-    preval = await get_prevalencia_deficiencias(conn=conn, data_inicio=datetime.date(2025, 1, 1), data_fim=datetime.date(2025, 1, 31))
+    preval = await get_prevalencia_deficiencias(session=session, data_inicio=datetime.date(2025, 1, 1), data_fim=datetime.date(2025, 1, 31))
     assert preval[0].tipo == "Auditiva"
 
 
 async def test_produtividade():
-    conn = FakeConn()
-    prod = await get_ranking_profissionais(conn=conn, data_inicio=datetime.date(2025, 1, 1), data_fim=datetime.date(2025, 1, 31))
+    session = FakeSession()
+    prod = await get_ranking_profissionais(session=session, data_inicio=datetime.date(2025, 1, 1), data_fim=datetime.date(2025, 1, 31))
     assert prod[0].cbo_descricao == "Fisioterapeuta"
 
 
 async def test_territorial():
-    conn = FakeConn()
-    terr = await get_atendimentos_por_municipio(conn=conn, data_inicio=datetime.date(2025, 1, 1), data_fim=datetime.date(2025, 1, 31))
+    session = FakeSession()
+    terr = await get_atendimentos_por_municipio(session=session, data_inicio=datetime.date(2025, 1, 1), data_fim=datetime.date(2025, 1, 31))
     assert terr[0].latitude == -10.18
+
+
+async def test_concurrent_requests_overlap_database_time():
+    session = FakeSession(delay=0.01)
+    inicio, fim = datetime.date(2025, 1, 1), datetime.date(2025, 1, 31)
+    diag, prod, terr = await asyncio.gather(
+        get_top_diagnosticos(session=session, data_inicio=inicio, data_fim=fim),
+        get_ranking_profissionais(session=session, data_inicio=inicio, data_fim=fim),
+        get_atendimentos_por_municipio(session=session, data_inicio=inicio, data_fim=fim),
+    )
+    assert session.max_in_flight == 3
+    assert diag and prod and terr
+
+
+async def test_fetch_concurrently_uses_one_session_per_query():
+    factory = FakeSessionFactory(FakeSession(delay=0.01))
+    params = {"data_inicio": datetime.date(2025, 1, 1), "data_fim": datetime.date(2025, 1, 31)}
+    kpi_rows, missing_rows = await fetch_concurrently(
+        factory, (KPIS_PRINCIPAIS_QUERY, params), (PROCEDIMENTOS_FALTANTES_QUERY, params)
+    )
+    assert factory.session.max_in_flight == 2
+    assert factory.opened == 2
+    assert kpi_rows[0]._mapping["total_atendimentos"] == 5
+    assert missing_rows[0]._mapping["faltantes"] == 0
@@ -0,0 +1,113 @@
+from pathlib import Path
+import sys
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from shared import arquivo_bpa
+from shared.arquivo_bpa import codificar_registros, escrever_arquivo_bpa, ler_linhas_bpa
+from shared.layouts import LAYOUT_BPA_HEADER, LAYOUT_BPA_I
+
+
+def _registros(quantidade):
+    for i in range(quantidade):
+        yield {"prd_ident": "03", "prd_flh": str(i // 3 + 1).zfill(3), "prd_seq": str(i % 3 + 1).zfill(2), "prd_nmpac": f"PACIENTE {i}"}
+
+
+def _cabecalho(num_linhas, num_folhas, controle):
+    return {
+        "cbc_mvm": "202401", "cbc_lin": str(num_linhas).zfill(6), "cbc_flh": str(num_folhas).zfill(6),
+        "cbc_smt_vrf": str(controle).zfill(4), "cbc_rsp": "ORGAO",
+    }
+
+
+def test_escreve_em_fluxo_e_preenche_o_cabecalho(tmp_path, monkeypatch):
+    # Blocos pequenos para atravessar várias escritas
+    monkeypatch.setattr(arquivo_bpa, "LINHAS_POR_ESCRITA", 4)
+    caminho = tmp_path / "bpa.txt"
+
+    totais = escrever_arquivo_bpa(caminho, _cabecalho, codificar_registros(_registros(10)))
+
+    assert totais[:2] == (10, 4)
+    linhas = caminho.read_bytes().decode("latin-1").split("\r\n")
+    assert linhas[-1] == ""
+    assert len(linhas) == 12
+    cabecalho = LAYOUT_BPA_HEADER.fatiar(linhas[0])
+    assert (cabecalho["cbc_lin"], cabecalho["cbc_flh"], cabecalho["cbc_hdr_2"]) == ("000010", "000004", "#BPA#")
+    assert all(len(linha) == LAYOUT_BPA_I.tamanho for linha in linhas[1:-1])
+    assert LAYOUT_BPA_I.fatiar(linhas[10])["prd_nmpac"].rstrip() == "PACIENTE 9"
+
+
+def test_arquivo_sem_registros_tem_so_o_cabecalho(tmp_path):
+    caminho = tmp_path / "bpa.txt"
+
+    assert escrever_arquivo_bpa(caminho, _cabecalho, iter([])) == (0, 0, 1111)
+    assert len(caminho.read_bytes()) == LAYOUT_BPA_HEADER.tamanho + 2
+
+
+def test_campo_de_controle_acumulado_na_escrita_e_conferido_pelo_validador(tmp_path):
+    caminho = tmp_path / "bpa.txt"
+    registros = [
+        {"prd_ident": "03", "prd_flh": "001", "prd_pa": "0301010072", "prd_qt": "000001"},
+        {"prd_ident": "03", "prd_flh": "001", "prd_pa": "0701050020", "prd_qt": "000030"},
+    ]
+
+    _, _, controle = escrever_arquivo_bpa(caminho, _cabecalho, codificar_registros(registros))
+
+    assert controle == (301010072 + 1 + 701050020 + 30) % 1111 + 1111
+    assert LAYOUT_BPA_HEADER.fatiar(caminho.read_text(encoding="latin-1"))["cbc_smt_vrf"] == str(controle)
+
+    pytest.importorskip("colorama")
+    from bpa_validator import BPAValidator
+
+    validador = BPAValidator()
+    validador.validar_arquivo(str(caminho))
+    assert not any("Campo de controle" in erro for erro in validador.stats["erros"])
+
+    inicio, fim = LAYOUT_BPA_HEADER.posicoes["cbc_smt_vrf"]
+    conteudo = caminho.read_bytes()
+    caminho.write_bytes(conteudo[:inicio] + b"1111" + conteudo[fim:])
+    validador.validar_arquivo(str(caminho))
+    assert any("Campo de controle calculado" in erro for erro in validador.stats["erros"])
+
+
+def test_le_em_blocos_as_mesmas_linhas_do_arquivo(tmp_path):
+    caminho = tmp_path / "bpa.txt"
+    escrever_arquivo_bpa(caminho, _cabecalho, codificar_registros(_registros(10)))
+    esperado = caminho.read_bytes().decode("latin-1").split("\r\n")[:-1]
+
+    # Blocos que cortam as linhas (e o CRLF) em pontos variados
+    for tamanho_bloco in (7, 351, 352, 1 << 20):
+        assert list(ler_linhas_bpa(caminho, tamanho_bloco)) == esperado
+
+    caminho.write_bytes(caminho.read_bytes()[:-2])
+    assert list(ler_linhas_bpa(caminho, 100)) == esperado
+
+
+def test_validacao_em_fluxo_conta_por_regra_e_guarda_poucos_exemplos(tmp_path):
+    pytest.importorskip("colorama")
+    from bpa_validator import BPAValidator
+
+    caminho = tmp_path / "bpa.txt"
+    # Registros só com identificação e nome: vários campos obrigatórios vazios em cada um
+    escrever_arquivo_bpa(caminho, _cabecalho, codificar_registros(_registros(30)))
+
+    validador = BPAValidator()
+    assert not validador.validar_arquivo(str(caminho))
+    completo = validador.stats
+
+    validador = BPAValidator()
+    assert not validador.validar_arquivo(str(caminho), streaming=True, max_exemplos=2)
+    fluxo = validador.stats
+
+    assert fluxo["total_erros"] == completo["total_erros"] == len(completo["erros"])
+    assert fluxo["erros_por_regra"] == completo["erros_por_regra"]
+    assert fluxo["erros_por_regra"]["prd_cnes:obrigatorio"] == 30
+    # Exemplos dos registros, mais os erros do arquivo (cabeçalho e totais), que ficam todos
+    exemplos = [erro for erro in fluxo["erros"] if erro.startswith("Linha ")]
+    assert len(exemplos) == sum(min(2, total) for total in fluxo["erros_por_regra"].values())
+    assert set(fluxo["erros"]) <= set(completo["erros"])
+    assert (fluxo["registros_invalidos"], fluxo["registros_validos"]) == (30, 0)
@@ -0,0 +1,179 @@
+from pathlib import Path
+import random
+import sys
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+pytest.importorskip("colorama")
+
+import bpa_validator
+from bpa_validator import BPAValidator
+from shared.arquivo_bpa import codificar_registros, dividir_em_trechos, escrever_arquivo_bpa
+from shared.layouts import LAYOUT_BPA_I
+
+REGISTRO_VALIDO = {
+    "prd_ident": "03", "prd_cnes": "2560372", "prd_cmp": "202401", "prd_cnsmed": "700000000000001",
+    "prd_cbo": "225125", "prd_dtaten": "20240115", "prd_flh": "001", "prd_seq": "01",
+    "prd_pa": "0301010072", "prd_sexo": "F", "prd_cid": "F840", "prd_ldade": "035", "prd_qt": "000001",
+    "prd_org": "BPA", "prd_nmpac": "PACIENTE", "prd_dtnasc": "19890101", "prd_raca": "01",
+    "prd_ine": "0000000000", "prd_situacao_rua": "N",
+}
+
+# Espaços que str.strip() remove (inclusive os de latin-1), dígitos, letras e o resto
+CARACTERES = " \t\x0b\x0c\x1c\x1f\x85\xa0" + "0123456789" + "MFNSBPAx" + "é#\x00"
+
+
+def _linhas(quantidade, semente=11):
+    rnd = random.Random(semente)
+    valida = LAYOUT_BPA_I.formatar_registro(REGISTRO_VALIDO)
+    yield valida
+    for _ in range(quantidade):
+        linha = list(valida)
+        for _ in range(rnd.randint(1, 3)):
+            inicio, fim = LAYOUT_BPA_I.posicoes[rnd.choice(LAYOUT_BPA_I.nomes)]
+            for posicao in rnd.sample(range(inicio, fim), rnd.randint(1, fim - inicio)):
+                linha[posicao] = rnd.choice(CARACTERES)
+        yield ''.join(linha)
+
+
+def test_caminho_rapido_igual_a_verificacao_campo_a_campo():
+    rapido, campo_a_campo = BPAValidator(), BPAValidator(caminho_rapido=False)
+    validas = 0
+    for num_linha, linha in enumerate(_linhas(5000), 2):
+        esperado = campo_a_campo.validar_registro_bpa_i(linha, num_linha)
+        assert rapido.validar_registro_bpa_i(linha, num_linha) == esperado, linha
+        validas += esperado[0]
+
+    # Os dois lados da comparação foram exercitados
+    assert 0 < validas < 5000
+
+
+def test_registro_valido_passa_pelo_caminho_rapido():
+    validador = BPAValidator()
+    linha = LAYOUT_BPA_I.formatar_registro(REGISTRO_VALIDO)
+
+    assert validador._registro_valido(linha)
+    assert validador.validar_registro_bpa_i(linha, 2) == (True, [])
+    assert validador.validar_registro_bpa_i(linha[:349], 2) == (False, ["Linha 2: Tamanho inválido: 349, esperado 350 caracteres"])
+
+
+def _arquivo_com_erros(caminho, quantidade, semente):
+    rnd = random.Random(semente)
+    registros = [dict(REGISTRO_VALIDO, prd_nmpac=f"PACIENTE {i}") for i in range(quantidade)]
+    for registro in rnd.sample(registros, quantidade // 4):
+        registro[rnd.choice(["prd_cnes", "prd_sexo", "prd_cid", "prd_raca"])] = rnd.choice(["", "x"])
+    escrever_arquivo_bpa(caminho, _cabecalho, codificar_registros(registros))
+    return str(caminho)
+
+
+def _cabecalho(num_linhas, num_folhas, controle):
+    # Número de folhas errado de propósito: o total também precisa ser o mesmo do serial
+    return {"cbc_mvm": "202401", "cbc_lin": str(num_linhas).zfill(6), "cbc_flh": str(num_folhas + 1).zfill(6),
+            "cbc_smt_vrf": str(controle).zfill(4), "cbc_rsp": "ORGAO"}
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_validacao_em_trechos_paralelos_igual_a_serial(tmp_path, monkeypatch, capsys, streaming):
+    caminhos = [_arquivo_com_erros(tmp_path / f"bpa{i}.txt", 400, i) for i in range(2)]
+    validador = BPAValidator()
+
+    serial = validador.validar_arquivos(caminhos, streaming=streaming, max_exemplos=3)
+    saida_serial = capsys.readouterr().out
+
+    # Trechos pequenos para dividir cada arquivo em vários
+    monkeypatch.setattr(bpa_validator, "TAMANHO_MINIMO_TRECHO", 10_000)
+    assert len(dividir_em_trechos(caminhos[0], 3, tamanho_minimo=bpa_validator.TAMANHO_MINIMO_TRECHO)) == 3
+    paralelo = validador.validar_arquivos(caminhos, jobs=3, streaming=streaming, max_exemplos=3)
+
+    assert paralelo == serial
+    assert capsys.readouterr().out == saida_serial
+    assert all(not valido and stats["registros_invalidos"] for _, valido, stats in serial)
+
+
+def test_erros_por_linha_impressos_a_cada_trecho(tmp_path, monkeypatch, capsys):
+    caminho = _arquivo_com_erros(tmp_path / "bpa.txt", 400, 3)
+    validador = BPAValidator()
+    validador.validar_arquivo(caminho)
+    um_trecho = (validador.stats, capsys.readouterr().out)
+
+    monkeypatch.setattr(bpa_validator, "TAMANHO_MINIMO_TRECHO", 10_000)
+    impressas_antes = []
+    validar_trecho = validador.validar_trecho
+
+    def validar_trecho_contando(*args, **kwargs):
+        impressas_antes.append(capsys.readouterr().out.count("- Linha "))
+        return validar_trecho(*args, **kwargs)
+
+    monkeypatch.setattr(validador, "validar_trecho", validar_trecho_contando)
+    capsys.readouterr()
+    validador.validar_arquivo(caminho)
+    saida = capsys.readouterr().out
+
+    assert len(impressas_antes) > 1 and impressas_antes[1] > 0
+    assert validador.stats == um_trecho[0]
+    assert saida.count("- Linha ") + sum(impressas_antes) == um_trecho[1].count("- Linha ")
+
+
+def test_leitura_mmap_igual_a_leitura_em_texto(tmp_path, capsys):
+    rnd = random.Random(5)
+    linhas = []
+    for linha in _linhas(2000):
+        sorteio = rnd.random()
+        if sorteio < 0.05: linha = linha[:rnd.randint(0, 360)]
+        elif sorteio < 0.08: linha = "01" + linha[2:]
+        # Espaço não separável na quantidade: int() de bytes recusa, o de str aceita
+        elif sorteio < 0.1: linha = linha[:LAYOUT_BPA_I.posicoes["prd_qt"][0]] + "\xa0" + linha[LAYOUT_BPA_I.posicoes["prd_qt"][0] + 1:]
+        linhas.append(linha + rnd.choice(["\r\n", "\n", "\r\r\n"]))
+    caminho = tmp_path / "bpa.txt"
+    caminho.write_bytes(("01#BPA#202401" + "\r\n" + "".join(linhas) + "sem fim de linha").encode("latin-1"))
+
+    resultados = []
+    for leitura in (bpa_validator.LEITURA_TEXTO, bpa_validator.LEITURA_MMAP):
+        for caminho_rapido in (True, False):
+            validador = BPAValidator(caminho_rapido, leitura)
+            valido = validador.validar_arquivo(str(caminho))
+            resultados.append((valido, validador.stats, capsys.readouterr().out))
+
+    assert all(resultado == resultados[0] for resultado in resultados)
+    assert 0 < resultados[0][1]["registros_validos"] < resultados[0][1]["total_registros"]
+
+
+def test_resultado_em_ndjson_e_relatorio_html_agrupado(tmp_path, monkeypatch):
+    caminho = _arquivo_com_erros(tmp_path / "bpa.txt", 200, 3)
+    # Valor com marcação HTML: precisa sair escapado no relatório
+    with open(caminho, "r+b") as f:
+        f.seek(len(f.readline()) + LAYOUT_BPA_I.posicoes["prd_cnes"][0])
+        f.write(b"<b>&</b")
+
+    validador = BPAValidator()
+    validador.validar_arquivo(caminho, streaming=True, max_exemplos=2)
+    # O relatório e o NDJSON reaproveitam a validação, sem ler o arquivo de novo
+    monkeypatch.setattr(validador, "validar_arquivo", lambda *args, **kwargs: pytest.fail("validou de novo"))
+    assert validador.gerar_ndjson(caminho, tmp_path / "bpa.ndjson")
+    assert validador.gerar_relatorio(caminho, tmp_path / "bpa.html")
+
+    eventos = list(bpa_validator.ler_ndjson(tmp_path / "bpa.ndjson"))
+    assert [evento["tipo"] for evento in eventos[:2]] == ["arquivo", "resumo"]
+    resumo, regras = eventos[1], [evento for evento in eventos if evento["tipo"] == "regra"]
+    erros_arquivo = [evento for evento in eventos if evento["tipo"] == "erro_arquivo"]
+    assert resumo["total_erros"] == len(erros_arquivo) + sum(regra["total"] for regra in regras)
+    assert [regra["total"] for regra in regras] == sorted((regra["total"] for regra in regras), reverse=True)
+    assert {f"{regra['campo']}:{regra['regra']}": regra["total"] for regra in regras} == validador.stats["erros_por_regra"]
+    # Cada erro vem logo depois da regra dele, até o número de exemplos
+    regra = None
+    for evento in eventos:
+        if evento["tipo"] == "regra": regra, vistos = evento, 0
+        elif evento["tipo"] == "erro":
+            vistos += 1
+            assert (evento["campo"], evento["regra"]) == (regra["campo"], regra["regra"]) and vistos <= regra["exemplos"] <= 2
+
+    html = (tmp_path / "bpa.html").read_text(encoding="utf-8")
+    assert "&lt;b&gt;&amp;&lt;/b" in html and "<b>&" not in html
+    assert html.count("<h3>") == len(regras) and html.rstrip().endswith("</html>")
+    # O mesmo relatório a partir do NDJSON gravado
+    bpa_validator.escrever_relatorio_html(bpa_validator.ler_ndjson(tmp_path / "bpa.ndjson"), tmp_path / "de_ndjson.html")
+    assert (tmp_path / "de_ndjson.html").read_text(encoding="utf-8") == html
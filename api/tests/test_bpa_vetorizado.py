@@ -0,0 +1,98 @@
+import datetime
+from pathlib import Path
+import sys
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+# bpa_exporter importa a GUI (tkinter/tkcalendar)
+pytest.importorskip("tkcalendar")
+
+from bpa_exporter import BPAExporter, ContextoExportacaoBPA
+
+
+TABELA_PROC_CID = {
+    "14": {"codigo_sigtap": "0302060014", "servico": "135", "classificacao": "003", "cid_sugestao": "G968", "cid_obrigatorio": True},
+    "15": {"codigo_sigtap": "0301070075", "servico": "", "classificacao": "", "cid_sugestao": "", "cid_obrigatorio": False},
+    "20": {"codigo_sigtap": "0701050020", "servico": 135, "classificacao": 3, "cid_sugestao": "", "cid_obrigatorio": True},
+    "72": {"codigo_sigtap": "0301010072", "servico": "", "classificacao": "", "cid_sugestao": "F84.0", "cid_obrigatorio": False},
+    "44": {"codigo_sigtap": "0301040044", "servico": "", "classificacao": "", "cid_sugestao": "", "cid_obrigatorio": False},
+}
+
+
+def _linha(**campos):
+    linha = {
+        "id_lancamento": 1, "cod_proc": 1, "id_prestador_lancamento": 16,
+        "cns_profissional_lancamento": "700000000000001", "cbo_profissional_view": "2231",
+        "data_atendimento_lancamento": datetime.date(2024, 1, 15), "nm_paciente": " maria da silva ",
+        "data_nasc": datetime.date(2015, 6, 30), "cnspac_paciente_original": "700000000000002",
+        "sexo_paciente": "1", "ibge_por_cep": "1705508", "codigo_raca_etnia_view": "01",
+        "cid_da_fia": None, "lanc_cid": "g80.0", "diagnostico_ficha": None, "vcp_numero": "123456",
+        "nm_prestador_ficha": "DRA B ", "vcp_tp_logradouro": "rua ", "vcp_cep": "77760000",
+        "vcp_logradouro": "RUA DAS FLORES", "vcp_bairro_inicial": "CENTRO",
+    }
+    linha.update(campos)
+    return linha
+
+
+@pytest.fixture
+def exporter_e_contexto():
+    exporter = BPAExporter()
+    contexto = ContextoExportacaoBPA(TABELA_PROC_CID, {"RUA": "081"}, {"16": {"servico": "164", "classificacao": "1"}})
+    contexto.registrar_mapeamento({"1", "2", "3"}, {"1": "14", "2": "15", "3": "20"})
+    return exporter, contexto
+
+
+def test_vetorizado_igual_ao_laco(exporter_e_contexto):
+    exporter, contexto = exporter_e_contexto
+    linhas = [
+        _linha(),
+        _linha(id_lancamento=2, id_prestador_lancamento=35, cod_proc=2, lanc_cid=None),
+        _linha(id_lancamento=3, id_prestador_lancamento=75, cod_proc=99, data_nasc=None, sexo_paciente=2),
+        _linha(id_lancamento=4, id_prestador_lancamento=None, cod_proc=3, codigo_raca_etnia_view="05", cod_etnia_indigena=12),
+        _linha(id_lancamento=5, cod_proc=2, data_atendimento_lancamento=None, cid_da_fia="h919", vcp_numero=None,
+               vcp_tp_logradouro=None, vcp_cep=None, nm_paciente=None, cns_profissional_lancamento="  "),
+        _linha(id_lancamento=6, id_prestador_lancamento="43", codigo_raca_etnia_view="5", lanc_cid="",
+               data_nasc=datetime.datetime(1900, 1, 1, 8, 30), ibge_por_cep=None),
+    ]
+
+    esperado = exporter.processar_registros_bpa_i_completo(linhas, "202401", contexto)
+    obtido = exporter.processar_registros_bpa_i_vetorizado(linhas, "202401", contexto)
+
+    assert obtido == esperado
+    assert [list(r) for r in obtido] == [list(r) for r in esperado]
+
+
+@pytest.mark.parametrize("metodo", ["processar_registros_bpa_i_completo", "processar_registros_bpa_i_vetorizado"])
+def test_mensagens_de_regra_agregadas(exporter_e_contexto, metodo):
+    exporter, contexto = exporter_e_contexto
+    mensagens = []
+    exporter.gui_log_callback = mensagens.append
+    linhas = [_linha(id_lancamento=i, id_prestador_lancamento=35, cod_proc=2) for i in range(3)]
+
+    getattr(exporter, metodo)(linhas, "202401", contexto)
+
+    assert "REGRA: CBO para o prestador ID 35 alterado para '225133' (3 registros)." in mensagens
+    assert "REGRA: Procedimento '0301070075' do prestador ID 35 alterado para '0301010072' (3 registros)." in mensagens
+    assert len(mensagens) == 2
+
+
+def test_vetorizado_sem_registros(exporter_e_contexto):
+    exporter, contexto = exporter_e_contexto
+    assert exporter.processar_registros_bpa_i_vetorizado([], "202401", contexto) == []
+
+
+def test_regras_compiladas_uma_vez_por_execucao(exporter_e_contexto):
+    exporter, contexto = exporter_e_contexto
+    regras = contexto.regras_prestador(exporter.cbo_override_map)
+    linhas = [_linha(id_lancamento=i, id_prestador_lancamento=75, cod_proc=99) for i in range(4)]
+
+    registros = exporter.processar_registros_bpa_i_completo(linhas, "202401", contexto)
+    exporter.processar_registros_bpa_i_vetorizado(linhas, "202401", contexto)
+
+    assert contexto.regras_prestador(exporter.cbo_override_map) is regras
+    assert list(regras._regras) == [("75", None)]
+    assert {r["prd_pa"] for r in registros} == {"0301040044"}
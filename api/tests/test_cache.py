@@ -0,0 +1,120 @@
+import datetime
+import json
+from pathlib import Path
+import sys
+
+import pytest
+from prometheus_client import REGISTRY
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from api import cache
+from api.routers.indicadores_assistencial import get_top_diagnosticos
+from api.tests.test_api_endpoints import FakeSession
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+def test_lru_evicts_least_recently_used():
+    store = cache.InMemoryLRUCache(max_entries=2)
+    store.set("a", 1, ttl=60)
+    store.set("b", 2, ttl=60)
+    assert store.get("a") == 1
+    store.set("c", 3, ttl=60)
+    assert store.get("b") is None
+    assert store.get("a") == 1
+    assert store.get("c") == 3
+
+
+def test_entries_expire_after_ttl():
+    clock = FakeClock()
+    store = cache.InMemoryLRUCache(clock=clock)
+    store.set("a", [], ttl=10)
+    clock.now = 9
+    assert store.get("a") == []
+    clock.now = 10
+    assert store.get("a") is None
+    assert len(store) == 0
+
+
+def test_ttl_for_period_closed_vs_current_month():
+    settings = cache.get_cache_settings()
+    hoje = datetime.date(2025, 3, 15)
+    assert cache.ttl_for_period(datetime.date(2025, 2, 28), today=hoje) == settings["ttl_closed"]
+    assert cache.ttl_for_period(datetime.date(2025, 3, 1), today=hoje) == settings["ttl_current"]
+    assert cache.ttl_for_period(None, today=hoje) == settings["ttl_current"]
+
+
+def test_build_cache_key_is_order_independent():
+    a = cache.build_cache_key("x", {"data_inicio": datetime.date(2025, 1, 1), "limit": 50})
+    b = cache.build_cache_key("x", {"limit": 50, "data_inicio": datetime.date(2025, 1, 1)})
+    assert a == b == "x?data_inicio=2025-01-01&limit=50"
+
+
+@pytest.mark.anyio("asyncio")
+async def test_endpoint_served_from_cache_on_second_call():
+    session = FakeSession()
+    misses_antes = REGISTRY.get_sample_value("api_cache_misses_total", {"endpoint": "assistencial/top_diagnosticos"}) or 0
+    hits_antes = REGISTRY.get_sample_value("api_cache_hits_total", {"endpoint": "assistencial/top_diagnosticos"}) or 0
+    periodo = dict(data_inicio=datetime.date(2024, 1, 1), data_fim=datetime.date(2024, 1, 31))
+
+    primeira = await get_top_diagnosticos(session=session, **periodo)
+    segunda = await get_top_diagnosticos(session=session, **periodo)
+    assert session.calls == 1
+    assert primeira == segunda
+
+    await get_top_diagnosticos(session=session, limit=10, **periodo)
+    assert session.calls == 2
+
+    assert REGISTRY.get_sample_value("api_cache_misses_total", {"endpoint": "assistencial/top_diagnosticos"}) == misses_antes + 2
+    assert REGISTRY.get_sample_value("api_cache_hits_total", {"endpoint": "assistencial/top_diagnosticos"}) == hits_antes + 1
+
+
+@pytest.mark.anyio("asyncio")
+async def test_cached_values_are_plain_data():
+    periodo = dict(data_inicio=datetime.date(2024, 1, 1), data_fim=datetime.date(2024, 1, 31))
+    await get_top_diagnosticos(session=FakeSession(), **periodo)
+
+    (valor,) = [valor for _, valor in cache.get_cache_backend()._entries.values()]
+    assert valor == [{"cid_codigo": "A00", "cid_descricao": "Colera", "frequencia": 2}]
+    json.dumps(valor)
+
+
+@pytest.mark.anyio("asyncio")
+async def test_custom_backend_is_used():
+    class DictBackend(cache.CacheBackend):
+        def __init__(self):
+            self.data = {}
+
+        def get(self, key):
+            return self.data.get(key)
+
+        def set(self, key, value, ttl):
+            self.data[key] = value
+
+        def clear(self):
+            self.data.clear()
+
+    backend = DictBackend()
+    cache.set_cache_backend(backend)
+    try:
+        async def loader():
+            return ["linha"]
+
+        assert await cache.get_or_load("teste", {"data_fim": datetime.date(2024, 1, 31)}, loader) == ["linha"]
+        assert backend.data == {"teste?data_fim=2024-01-31": ["linha"]}
+    finally:
+        cache.set_cache_backend(None)
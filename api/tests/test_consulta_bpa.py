@@ -0,0 +1,80 @@
+import datetime
+from pathlib import Path
+import sys
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+# bpa_exporter importa a GUI (tkinter/tkcalendar)
+pytest.importorskip("tkcalendar")
+
+from bpa_exporter import BPAExporter
+from shared.numeracao_bpa import ORDEM_CONSULTA, ORDEM_RESULTADO
+
+INICIO, FIM = datetime.date(2024, 1, 1), datetime.date(2024, 1, 31)
+
+
+def test_dedup_no_banco_usa_distinct_on_e_mantem_a_ordem_da_numeracao():
+    exporter = BPAExporter()
+
+    sql_python = exporter._montar_sql_consulta(INICIO, FIM, "202401", "lancamento")
+    sql_banco = exporter._montar_sql_consulta(INICIO, FIM, "202401", "lancamento", dedup_no_banco=True)
+
+    assert "DISTINCT ON" not in sql_python and sql_python.rstrip().endswith(ORDEM_CONSULTA)
+    assert "SELECT DISTINCT ON (l.id_lancamento)" in sql_banco
+    assert "ORDER BY l.id_lancamento," in sql_banco
+    assert sql_banco.startswith("SELECT * FROM (") and sql_banco.rstrip().endswith(ORDEM_RESULTADO)
+    assert "l.data BETWEEN '2024-01-01' AND '2024-01-31'" in sql_banco
+
+
+class _Resultado:
+    def __init__(self, valores): self.valores = valores
+    def one(self): return self.valores
+
+
+class _ConexaoContagem:
+    """Devolve (linhas, bytes) conforme a consulta contada tenha ou não o DISTINCT ON."""
+    def execute(self, stmt):
+        return _Resultado((80, 40_000) if "DISTINCT ON" in str(stmt) else (100, 50_000))
+
+
+def test_medir_dedup_no_banco_informa_a_economia():
+    exporter = BPAExporter()
+    exporter.conn = _ConexaoContagem()
+    mensagens = []
+    exporter.gui_log_callback = mensagens.append
+
+    medidas = exporter.medir_dedup_no_banco(INICIO, FIM, "202401")
+
+    assert medidas["economia"] == {"linhas": 20, "bytes": 10_000}
+    assert "20 linhas e 0.0 MB a menos na rede" in mensagens[-1]
+
+
+class _ConexaoLinhas:
+    def __init__(self, linhas): self.linhas = linhas
+    def execute(self, stmt): return self
+    def fetchall(self): return [type("Linha", (), {"_mapping": linha})() for linha in self.linhas]
+
+
+def test_total_bpa_e_o_mesmo_com_e_sem_streaming(monkeypatch):
+    # Dois lançamentos repetidos (mesmo id): o total BPA é contado antes da deduplicação
+    linhas = [{"id_lancamento": i} for i in (1, 1, 2, 3, 3)]
+    exporter = BPAExporter()
+    exporter.conn = _ConexaoLinhas(linhas)
+    monkeypatch.setattr(exporter, "criar_contexto_exportacao", lambda: {})
+    monkeypatch.setattr(exporter, "resolver_procedimentos", lambda contexto, registros: contexto)
+    monkeypatch.setattr(exporter, "_classificar_registros", lambda registros, contexto, contadores: (list(registros), 0))
+    monkeypatch.setattr(exporter, "_executar_consulta_em_lotes", lambda sql, tamanho_lote: iter([linhas[:2], linhas[2:]]))
+    monkeypatch.setattr(
+        exporter, "_processador_registros",
+        lambda vetorizado: lambda registros, competencia, contexto: [{"_id_lancamento_original": r["id_lancamento"]} for r in registros],
+    )
+
+    em_lotes = exporter.consultar_dados_completo(INICIO, FIM, "202401", streaming=True, deduplicar=True)
+    de_uma_vez = exporter.consultar_dados_completo(INICIO, FIM, "202401")
+
+    assert len(em_lotes[0]) == 3 and len(de_uma_vez[0]) == 5
+    assert em_lotes[3] == de_uma_vez[3] == 5
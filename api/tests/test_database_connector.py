@@ -0,0 +1,87 @@
+import asyncio
+from pathlib import Path
+import sys
+
+import pytest
+from prometheus_client import REGISTRY
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from api import async_db, config, database_connector, main
+
+
+class FakeEngine:
+    def __init__(self):
+        self.disposed = False
+
+    def dispose(self):
+        self.disposed = True
+
+
+@pytest.fixture(autouse=True)
+def _reset_engine(monkeypatch):
+    settings = {"db_name": "app", "db_user": "u", "db_password": "p", "db_host": "localhost", "db_port": "5432"}
+    monkeypatch.setattr(database_connector, "get_db_settings", lambda: settings)
+    config.get_db_pool_settings.cache_clear()
+    database_connector.dispose_engine()
+    yield
+    database_connector.dispose_engine()
+    config.get_db_pool_settings.cache_clear()
+
+
+def test_init_engine_reuses_process_engine(monkeypatch):
+    created = []
+
+    def fake_criar_engine(**kwargs):
+        engine = FakeEngine()
+        created.append((engine, kwargs))
+        return engine
+
+    monkeypatch.setattr(database_connector, "criar_engine", fake_criar_engine)
+
+    for _ in range(3):
+        assert database_connector.init_engine() is created[0][0]
+
+    assert len(created) == 1
+    engine, _ = created[0]
+    database_connector.dispose_engine()
+    assert engine.disposed
+
+
+def test_pool_settings_from_env(monkeypatch):
+    monkeypatch.setenv("APP_DB_POOL_SIZE", "12")
+    monkeypatch.setenv("APP_DB_MAX_OVERFLOW", "3")
+    monkeypatch.setenv("APP_DB_POOL_RECYCLE", "600")
+    assert config.get_db_pool_settings() == {"pool_size": 12, "max_overflow": 3, "pool_timeout": 30, "pool_recycle": 600}
+
+    monkeypatch.setenv("APP_DB_POOL_SIZE", "muitos")
+    config.get_db_pool_settings.cache_clear()
+    with pytest.raises(RuntimeError):
+        config.get_db_pool_settings()
+
+
+def test_async_engine_uses_pool_settings(monkeypatch):
+    settings = {"db_name": "app", "db_user": "u", "db_password": "p", "db_host": "localhost", "db_port": "5432"}
+    monkeypatch.setattr(async_db, "get_db_settings", lambda: settings)
+    monkeypatch.setattr(async_db, "_engine", None)
+    monkeypatch.setattr(async_db, "_SessionLocal", None)
+    monkeypatch.setenv("APP_DB_POOL_SIZE", "9")
+    async_db._get_engine()
+    async_db.update_pool_metrics()
+    assert REGISTRY.get_sample_value("api_db_pool_size", {"engine": "async"}) == 9
+
+
+def test_lifespan_creates_and_disposes_async_engine(monkeypatch):
+    settings = {"db_name": "app", "db_user": "u", "db_password": "p", "db_host": "localhost", "db_port": "5432"}
+    monkeypatch.setattr(async_db, "get_db_settings", lambda: settings)
+    monkeypatch.setattr(async_db, "_engine", None)
+    monkeypatch.setattr(async_db, "_SessionLocal", None)
+
+    async def ciclo():
+        async with main.lifespan(main.app):
+            assert async_db._engine is not None
+        assert async_db._engine is None
+
+    asyncio.run(ciclo())
@@ -0,0 +1,63 @@
+from pathlib import Path
+import random
+import sys
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from shared.etapas_bpa import ConferenciaOrdem, DeduplicacaoPorLancamento, RegraIdadeProcedimento, aplicar_etapas
+from shared.numeracao_bpa import chave_numeracao, numerar_registros, ordenar_para_numeracao
+
+
+def _registros(quantidade, semente=3):
+    rnd = random.Random(semente)
+    return [
+        {"_id_lancamento_original": rnd.choice([None] + list(range(quantidade // 2))),
+         "prd_cnsmed": rnd.choice(["700000000000001", "700000000000002"]),
+         "prd_dtaten": f"202401{rnd.randint(1, 28):02d}",
+         "prd_pa": rnd.choice(["0301070300", "0301010072"]),
+         "_idade": rnd.choice([None, 5, 17, 18, 40])}
+        for _ in range(quantidade)
+    ]
+
+
+def _em_passadas(registros):
+    """Referência: deduplicação, regra de idade e numeração, cada uma em uma passada."""
+    vistos, unicos = set(), []
+    for registro in registros:
+        if registro["_id_lancamento_original"] is not None and registro["_id_lancamento_original"] not in vistos:
+            vistos.add(registro["_id_lancamento_original"])
+            unicos.append(dict(registro))
+    for registro in unicos:
+        if registro["prd_pa"] == "0301070300" and registro["_idade"] is not None and registro["_idade"] < 18:
+            registro["prd_pa"] = "0301010048"
+    return list(numerar_registros(ordenar_para_numeracao(unicos)))
+
+
+@pytest.mark.parametrize("ordenados", [True, False])
+def test_passada_unica_igual_as_etapas_separadas(ordenados):
+    registros = _registros(500)
+    if ordenados: registros.sort(key=chave_numeracao)
+    esperado = _em_passadas(registros)
+
+    deduplicacao, regra_idade, conferencia = DeduplicacaoPorLancamento(), RegraIdadeProcedimento(), ConferenciaOrdem()
+    finais = aplicar_etapas(registros, [deduplicacao, regra_idade, conferencia, numerar_registros])
+    if not conferencia.ordenado:
+        finais = list(numerar_registros(ordenar_para_numeracao(finais)))
+
+    assert conferencia.ordenado is ordenados
+    assert finais == esperado
+    assert deduplicacao.descartados == len(registros) - len(finais)
+    assert regra_idade.alterados == sum(r["prd_pa"] == "0301010048" for r in finais)
+
+
+def test_deduplicacao_compartilha_ids_entre_lotes():
+    ids_vistos = set()
+    primeiro = aplicar_etapas([{"_id_lancamento_original": 1}, {"_id_lancamento_original": 1}], [DeduplicacaoPorLancamento(ids_vistos)])
+    segundo = aplicar_etapas([{"_id_lancamento_original": 1}, {"_id_lancamento_original": 2}], [DeduplicacaoPorLancamento(ids_vistos)])
+
+    assert primeiro == [{"_id_lancamento_original": 1}]
+    assert segundo == [{"_id_lancamento_original": 2}]
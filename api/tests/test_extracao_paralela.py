@@ -0,0 +1,55 @@
+import datetime
+from pathlib import Path
+import random
+import sys
+
+import pytest
+from sqlalchemy import create_engine, text
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from shared.extracao_paralela import extrair_em_particoes, filtro_particao, particionar_periodo
+
+INICIO, FIM = datetime.date(2024, 1, 1), datetime.date(2024, 3, 15)
+
+
+def test_particoes_cobrem_o_periodo_sem_sobreposicao():
+    for particao, dias in (("dia", 1), ("semana", 7)):
+        particoes = particionar_periodo(INICIO, FIM, particao)
+        assert particoes[0][0] == INICIO and particoes[-1][1] == FIM + datetime.timedelta(days=1)
+        assert all(fim == proximo for (_, fim), (proximo, _) in zip(particoes, particoes[1:]))
+        assert all((fim - inicio).days <= dias for inicio, fim in particoes)
+
+    with pytest.raises(ValueError):
+        particionar_periodo(INICIO, FIM, "mes")
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'lancamentos.db'}")
+    rnd = random.Random(5)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE lancamentos (id_lancamento INTEGER, cns TEXT, data TEXT)"))
+        conn.execute(text("INSERT INTO lancamentos VALUES (:id, :cns, :data)"), [
+            {"id": i, "cns": rnd.choice(["700000000000001", "700000000000002", ""]),
+             # Com horário, para conferir que o limite das partições não perde nada
+             "data": f"{INICIO + datetime.timedelta(days=rnd.randint(0, (FIM - INICIO).days))} {rnd.randint(0, 23):02d}:30"}
+            for i in range(2000)
+        ])
+    yield engine
+    engine.dispose()
+
+
+def test_particoes_paralelas_igual_a_consulta_unica(engine):
+    base = f"SELECT * FROM lancamentos WHERE data >= '{INICIO}' AND data < '{FIM + datetime.timedelta(days=1)}'"
+    ordem = "ORDER BY cns, data, id_lancamento"
+    with engine.connect() as conn:
+        esperado = [dict(row._mapping) for row in conn.execute(text(f"{base} {ordem}"))]
+
+    consultas = [(f"{base} AND {filtro_particao('data', p)} {ordem}", None) for p in particionar_periodo(INICIO, FIM, "semana")]
+    obtido = extrair_em_particoes(engine, consultas, lambda r: (r["cns"], r["data"], r["id_lancamento"]), max_trabalhadores=4)
+
+    assert len(consultas) == 11
+    assert obtido == esperado
@@ -0,0 +1,99 @@
+import datetime
+from pathlib import Path
+import sys
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from api import fato_atendimentos
+
+
+class FakeResult:
+    def __init__(self, rows=None, scalar=None):
+        self.rows = rows or []
+        self.scalar = scalar
+
+    def fetchall(self):
+        return self.rows
+
+    def scalar_one(self):
+        return self.scalar
+
+    def scalar_one_or_none(self):
+        return self.scalar
+
+
+class FakeConn:
+    def __init__(self, watermark, dias_alterados, dias_pendentes=()):
+        self.watermark = watermark
+        self.dias_alterados = dias_alterados
+        self.dias_pendentes = list(dias_pendentes)
+        self.executed = []
+
+    def execute(self, query, params=None):
+        sql = str(query)
+        self.executed.append((sql, params))
+        if "clock_timestamp" in sql:
+            return FakeResult(scalar=datetime.datetime(2025, 2, 1, 12, 0))
+        if "SELECT atualizado_ate" in sql:
+            return FakeResult(scalar=self.watermark)
+        if "dias_pendentes" in sql:
+            dias, self.dias_pendentes = self.dias_pendentes, []
+            return FakeResult(rows=[(dia,) for dia in dias])
+        if "UNION" in sql:
+            return FakeResult(rows=[(dia,) for dia in self.dias_alterados])
+        return FakeResult()
+
+
+def test_refresh_incremental_recomputes_only_changed_days():
+    watermark = datetime.datetime(2025, 1, 31, 23, 0)
+    conn = FakeConn(watermark, [datetime.date(2025, 1, 30), datetime.date(2025, 1, 2)])
+
+    assert fato_atendimentos.refresh_incremental(conn) == 2
+
+    changed_sql, changed_params = next((sql, p) for sql, p in conn.executed if "UNION" in sql)
+    # Transacoes abertas antes do ultimo scan e confirmadas depois dele caem na sobreposicao
+    assert changed_params == {"desde": watermark - fato_atendimentos.WATERMARK_OVERLAP}
+    delete_params = next(p for sql, p in conn.executed if sql.startswith("DELETE FROM sigh.fato_atendimentos_dia "))
+    insert_params = next(p for sql, p in conn.executed if "INSERT INTO sigh.fato_atendimentos_dia" in sql)
+    assert delete_params == insert_params == {"dias": [datetime.date(2025, 1, 2), datetime.date(2025, 1, 30)]}
+    saved = next(p for sql, p in conn.executed if "fato_atendimentos_refresh (id" in sql)
+    assert saved == {"atualizado_ate": datetime.datetime(2025, 2, 1, 12, 0)}
+
+
+def test_refresh_incremental_without_changes_only_moves_watermark():
+    conn = FakeConn(datetime.datetime(2025, 1, 31), [])
+    assert fato_atendimentos.refresh_incremental(conn) == 0
+    assert not any(sql.startswith("DELETE FROM sigh.fato_atendimentos_dia ") for sql, _ in conn.executed)
+    assert any("fato_atendimentos_refresh (id" in sql for sql, _ in conn.executed)
+
+
+def test_refresh_incremental_recomputes_days_of_deleted_and_moved_lancamentos():
+    apagado, antigo, novo = datetime.date(2025, 1, 5), datetime.date(2025, 1, 10), datetime.date(2025, 1, 12)
+    # O apagado e o dia antigo do movido so aparecem nos dias pendentes gravados pelos triggers;
+    # o dia novo do movido vem pelo updated_at
+    conn = FakeConn(datetime.datetime(2025, 1, 31), [novo], dias_pendentes=[apagado, antigo])
+
+    assert fato_atendimentos.refresh_incremental(conn) == 3
+
+    delete_params = next(p for sql, p in conn.executed if sql.startswith("DELETE FROM sigh.fato_atendimentos_dia "))
+    assert delete_params == {"dias": [apagado, antigo, novo]}
+    assert conn.dias_pendentes == []
+    # Na proxima execucao os dias pendentes ja foram consumidos
+    conn.dias_alterados = []
+    assert fato_atendimentos.refresh_incremental(conn) == 0
+
+
+def test_refresh_incremental_requires_initial_load():
+    with pytest.raises(RuntimeError):
+        fato_atendimentos.refresh_incremental(FakeConn(None, []))
+
+
+def test_refresh_range_covers_every_day():
+    conn = FakeConn(None, [])
+    assert fato_atendimentos.refresh_range(conn, datetime.date(2024, 2, 27), datetime.date(2024, 3, 1)) == 4
+    with pytest.raises(ValueError):
+        fato_atendimentos.refresh_range(conn, datetime.date(2024, 3, 2), datetime.date(2024, 3, 1))
@@ -21,24 +21,34 @@ class FakeResult:
         return [FakeResult(self._mapping)]
 
 
-class FakeConn:
+class FakeSession:
     def __init__(self, faturamento_total=0, faltantes=0):
         self.calls = 0
         self.faturamento_total = faturamento_total
         self.faltantes = faltantes
 
-    def execute(self, query, params=None):
-        # first call -> metrics, second call -> missing
+    async def execute(self, query, params=None):
+        # metrics and missing queries run concurrently, so dispatch on the SQL, not on call order
         self.calls += 1
-        if self.calls == 1:
-            return FakeResult(
-                {
-                    "total_atendimentos": 10,
-                    "pacientes_unicos": 8,
-                    "faturamento_total": self.faturamento_total,
-                }
-            )
-        return FakeResult({"faltantes": self.faltantes})
+        if "faltantes" in str(query):
+            return FakeResult({"faltantes": self.faltantes})
+        return FakeResult(
+            {
+                "total_atendimentos": 10,
+                "pacientes_unicos": 8,
+                "faturamento_total": self.faturamento_total,
+            }
+        )
+
+    def __call__(self):
+        # also acts as the session factory: every "new session" is this fake
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
 
 
 @pytest.fixture
@@ -48,11 +58,11 @@ def anyio_backend():
 
 @pytest.mark.anyio("asyncio")
 async def test_get_kpis_principais_calculates_faturamento(monkeypatch):
-    conn = FakeConn(faturamento_total=1234.56, faltantes=0)
+    session = FakeSession(faturamento_total=1234.56, faltantes=0)
     kpi = await get_kpis_principais(
         data_inicio=datetime.date(2025, 1, 1),
         data_fim=datetime.date(2025, 1, 31),
-        conn=conn,
+        session_factory=session,
     )
     assert kpi.total_atendimentos_mes == 10
     assert kpi.pacientes_unicos_mes == 8
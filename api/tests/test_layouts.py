@@ -0,0 +1,73 @@
+from pathlib import Path
+import sys
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from shared.layouts import (
+    ALFA,
+    LAYOUT_APAC_CORPO,
+    LAYOUT_APAC_HEADER,
+    LAYOUT_APAC_PROCEDIMENTO,
+    LAYOUT_BPA_HEADER,
+    LAYOUT_BPA_I,
+    LAYOUT_CIHA,
+    NUM,
+    Campo,
+    Layout,
+)
+
+
+@pytest.mark.parametrize(
+    "layout, tamanho",
+    [
+        (LAYOUT_BPA_HEADER, 130),
+        (LAYOUT_BPA_I, 350),
+        (LAYOUT_APAC_HEADER, 137),
+        (LAYOUT_APAC_CORPO, 533),
+        (LAYOUT_APAC_PROCEDIMENTO, 97),
+        (LAYOUT_CIHA, 450),
+    ],
+)
+def test_tamanho_dos_layouts(layout, tamanho):
+    assert layout.tamanho == tamanho
+    assert len(layout.formatar_registro({})) == tamanho
+
+
+def test_formatar_completa_e_corta_cada_campo():
+    layout = Layout("teste", [Campo("a", 3), Campo("b", 4, NUM), Campo("c", 2, ALFA, valor="XY")])
+
+    assert layout.formatar_registro({"a": "abcdef", "b": "12"}) == "abc  12XY"
+    assert layout.formatar(["a", "12345", None]) == "a  1234  "
+    assert layout.formatar_registro({"a": None, "b": None}) == "       XY"
+
+
+def test_fatiar_e_o_inverso_de_formatar():
+    registro = {nome: "" for nome in LAYOUT_BPA_I.nomes}
+    registro.update({"prd_ident": "03", "prd_cnes": "2560372", "prd_nmpac": "MARIA", "prd_qt": "000001"})
+
+    linha = LAYOUT_BPA_I.formatar_registro(registro)
+    campos = LAYOUT_BPA_I.fatiar(linha)
+
+    assert campos["prd_nmpac"] == "MARIA".ljust(30)
+    assert campos["prd_qt"] == "000001"
+    assert LAYOUT_BPA_I.formatar_registro(campos) == linha
+    # Linha curta: campos finais vazios em vez de erro
+    assert LAYOUT_BPA_I.fatiar(linha[:20])["prd_cbo"] == ""
+
+
+def test_normalizadores_apac_e_ciha():
+    corpo = LAYOUT_APAC_CORPO.formatar_registro({"apa_cns_paciente": " 7000-0000 ", "apa_nm_paciente": "  JOSE  "})
+    inicio, fim = LAYOUT_APAC_CORPO.posicoes["apa_cns_paciente"]
+    assert corpo[inicio:fim] == "70000000".zfill(fim - inicio)
+    inicio, fim = LAYOUT_APAC_CORPO.posicoes["apa_nm_paciente"]
+    assert corpo[inicio:fim] == "JOSE".ljust(fim - inicio)
+
+    ciha = LAYOUT_CIHA.formatar_registro({"cih_qt": "3.0", "cih_cep": "abc"})
+    inicio, fim = LAYOUT_CIHA.posicoes["cih_qt"]
+    assert ciha[inicio:fim] == "3".zfill(fim - inicio)
+    inicio, fim = LAYOUT_CIHA.posicoes["cih_cep"]
+    assert ciha[inicio:fim] == "0" * (fim - inicio)
@@ -0,0 +1,73 @@
+from pathlib import Path
+import random
+import sys
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from shared.numeracao_bpa import chave_numeracao, numerar_registros, ordenar_para_numeracao
+
+
+def _registros(quantidade, semente=7):
+    rnd = random.Random(semente)
+    return [
+        {"id": i, "prd_cnsmed": rnd.choice(["700000000000001", "700000000000002", " " * 15]),
+         "prd_dtaten": f"202401{rnd.randint(1, 28):02d}"}
+        for i in range(quantidade)
+    ]
+
+
+def _numeracao(registros):
+    return [(r["id"], r["prd_flh"], r["prd_seq"]) for r in registros]
+
+
+def test_numera_no_proprio_registro_com_quebra_de_folha():
+    registros = _registros(300)
+    originais = {id(r) for r in registros}
+
+    numerados = list(numerar_registros(ordenar_para_numeracao(registros)))
+
+    assert {id(r) for r in numerados} == originais
+    assert [chave_numeracao(r) for r in numerados] == sorted(chave_numeracao(r) for r in numerados)
+    # Uma folha por profissional e a cada 99 registros
+    por_folha = {}
+    for r in numerados:
+        por_folha.setdefault(r["prd_flh"], []).append(r)
+    assert all(len(folha) <= 99 and len({r["prd_cnsmed"] for r in folha}) == 1 for folha in por_folha.values())
+    assert max(int(r["prd_seq"]) for r in numerados) == 99
+
+
+def test_iterador_ordenado_em_blocos_igual_a_lista():
+    esperado = _numeracao(numerar_registros(ordenar_para_numeracao(_registros(1000))))
+
+    fora_de_ordem = numerar_registros(ordenar_para_numeracao(iter(_registros(1000)), tamanho_bloco=64))
+    assert _numeracao(fora_de_ordem) == esperado
+
+    ja_ordenados = sorted(_registros(1000), key=chave_numeracao)
+    em_ordem = numerar_registros(ordenar_para_numeracao(iter(ja_ordenados), tamanho_bloco=64))
+    assert _numeracao(em_ordem) == esperado
+
+    um_bloco = numerar_registros(ordenar_para_numeracao(iter(_registros(1000)), tamanho_bloco=5000))
+    assert _numeracao(um_bloco) == esperado
+
+
+def test_iterador_ja_ordenado_e_repassado_em_fluxo():
+    ja_ordenados = sorted(_registros(1000), key=chave_numeracao)
+    lidos = []
+
+    def fonte():
+        for registro in ja_ordenados:
+            lidos.append(registro)
+            yield registro
+
+    fluxo = ordenar_para_numeracao(fonte(), tamanho_bloco=64, ja_ordenado=True)
+    assert next(fluxo) is ja_ordenados[0]
+    assert len(lidos) == 1
+    assert [r["id"] for r in fluxo] == [r["id"] for r in ja_ordenados[1:]]
+
+    fora_de_ordem = ordenar_para_numeracao(iter(ja_ordenados[::-1]), ja_ordenado=True)
+    with pytest.raises(ValueError, match="fora da ordem de numeração"):
+        list(fora_de_ordem)
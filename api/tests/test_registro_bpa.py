@@ -0,0 +1,47 @@
+from pathlib import Path
+import pickle
+import sys
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from shared.arquivo_bpa import codificar_registros
+from shared.layouts import LAYOUT_BPA_I
+from shared.numeracao_bpa import numerar_registros, ordenar_para_numeracao
+from shared.registro_bpa import CAMPOS_REGISTRO, RegistroBPAI
+
+
+def _registro(i, cns="700000000000001"):
+    valores = dict.fromkeys(CAMPOS_REGISTRO, "")
+    valores.update(prd_ident="03", prd_cnsmed=cns, prd_dtaten=f"202401{i % 28 + 1:02d}",
+                   prd_pa="0301010072", prd_qt="000001", prd_nmpac=f"PACIENTE {i}", _id_lancamento_original=i)
+    return RegistroBPAI(*valores.values())
+
+
+def test_registro_tem_a_interface_de_dict():
+    registro = _registro(1)
+
+    assert registro["prd_pa"] == registro.get("prd_pa") == "0301010072"
+    assert registro.get("inexistente", "x") == "x"
+    assert "prd_qt" in registro and "inexistente" not in registro
+    with pytest.raises(KeyError):
+        registro["inexistente"] = "1"
+
+    registro["prd_cid"] = "F200"
+    copia = registro.copy()
+    assert copia == registro and copia is not registro
+    assert dict(registro) == dict(zip(CAMPOS_REGISTRO, registro.valores()))
+    assert pickle.loads(pickle.dumps(registro)) == registro
+
+
+def test_registro_numerado_e_formatado_como_o_dict():
+    registros = [_registro(i, cns) for i in range(5) for cns in ("700000000000002", "700000000000001")]
+    como_dict = [dict(r) for r in registros]
+
+    linhas = list(codificar_registros(numerar_registros(ordenar_para_numeracao(registros))))
+
+    assert linhas == list(codificar_registros(numerar_registros(ordenar_para_numeracao(como_dict))))
+    assert all(len(linha) == LAYOUT_BPA_I.tamanho + 2 for linha in linhas)
@@ -0,0 +1,78 @@
+"""
+Deduplicação por lançamento no banco (DISTINCT ON) contra a deduplicação no Python.
+
+Roda a consulta principal do BPA nos dois modos para o mesmo período, imprime as linhas e
+os bytes enviados pelo banco em cada um (``BPAExporter.medir_dedup_no_banco``), o tempo de
+busca e confere que os dois modos chegam aos mesmos lançamentos.
+
+Uso (a partir da raiz do projeto; conexão via APP_DB_* ou config.ini):
+    python -m benchmarks.bench_dedup_sql --inicio 2024-01-01 --fim 2024-01-31
+"""
+import argparse
+import datetime
+import logging
+import statistics
+import time
+
+from sqlalchemy import text
+
+from api.config import get_db_settings
+from bpa_exporter import BPAExporter
+from shared.database import Database
+
+
+def medir(conn, sql, repeticoes):
+    tempos = []
+    linhas = None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        linhas = conn.execute(text(sql)).mappings().all()
+        tempos.append(time.perf_counter() - inicio)
+    return tempos, linhas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara a deduplicação por lançamento no banco e no Python.")
+    parser.add_argument("--inicio", type=datetime.date.fromisoformat, required=True)
+    parser.add_argument("--fim", type=datetime.date.fromisoformat, required=True)
+    parser.add_argument("--competencia", default=None, help="AAAAMM (padrão: mês corrente).")
+    parser.add_argument("--criterio", choices=["lancamento", "competencia"], default="lancamento")
+    parser.add_argument("--repeticoes", type=int, default=3)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    settings = get_db_settings()
+    db = Database()
+    sucesso, mensagem = db.conectar(
+        db_name=settings["db_name"], user=settings["db_user"], password=settings["db_password"],
+        host=settings["db_host"], port=settings["db_port"],
+    )
+    if not sucesso: raise SystemExit(mensagem)
+
+    exporter = BPAExporter()
+    exporter.conn = db.conn
+    competencia = args.competencia or datetime.datetime.now().strftime("%Y%m")
+    try:
+        medidas = exporter.medir_dedup_no_banco(args.inicio, args.fim, competencia, args.criterio)
+        for modo in ("python", "banco"):
+            print(f"{modo:>7}: {medidas[modo]['linhas']} linhas | {medidas[modo]['bytes'] / 1e6:.1f} MB")
+        print(f"economia: {medidas['economia']['linhas']} linhas | {medidas['economia']['bytes'] / 1e6:.1f} MB")
+
+        ids = {}
+        for modo, dedup_no_banco in (("python", False), ("banco", True)):
+            sql = exporter._montar_sql_consulta(args.inicio, args.fim, competencia, args.criterio, dedup_no_banco)
+            tempos, linhas = medir(db.conn, sql, args.repeticoes)
+            ids[modo] = [linha["id_lancamento"] for linha in linhas]
+            print(f"{modo:>7}: busca em mediana {statistics.median(tempos):.2f} s | min {min(tempos):.2f} s")
+
+        # A deduplicação no Python mantém a primeira linha de cada lançamento, na ordem da consulta
+        if list(dict.fromkeys(ids["python"])) != ids["banco"]:
+            raise SystemExit("Os dois modos chegaram a lançamentos diferentes!")
+        print("Mesmos lançamentos, na mesma ordem, nos dois modos.")
+    finally:
+        db.conn.close()
+        db.engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
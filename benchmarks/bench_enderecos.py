@@ -0,0 +1,116 @@
+"""
+Benchmark da resolução de endereço do paciente: plano antigo (ROW_NUMBER sobre toda a
+tabela de endereços) contra o LEFT JOIN LATERAL ... LIMIT 1 restrito aos pacientes da
+exportação.
+
+Gera uma tabela sintética de endereços em tabelas temporárias (nada é gravado no banco:
+tudo roda numa transação desfeita no final), confere que as duas estratégias escolhem o
+mesmo endereço e imprime o tempo de cada uma e o plano do EXPLAIN ANALYZE.
+
+Uso (a partir da raiz do projeto; conexão via APP_DB_* ou config.ini):
+    python -m benchmarks.bench_enderecos --pacientes 500000 --enderecos-por-paciente 3 --exportados 800
+"""
+import argparse
+import statistics
+import time
+
+from sqlalchemy import text
+
+from api.config import get_db_settings
+from shared.database import Database
+from shared.sql_enderecos import ESTRATEGIA_JANELA, ESTRATEGIA_LATERAL, clausula_with, montar_endereco_paciente
+
+TABELA_ENDERECOS = "bench_enderecos"
+TABELA_EXPORTADOS = "bench_pacientes_exportados"
+
+
+def criar_dados_sinteticos(conn, pacientes, enderecos_por_paciente, exportados):
+    """Popula as tabelas temporárias com o mesmo formato das colunas usadas de sigh.enderecos."""
+    conn.execute(text(f"""
+        CREATE TEMP TABLE {TABELA_ENDERECOS} ON COMMIT DROP AS
+        SELECT
+            row_number() OVER () AS id_endereco,
+            pac AS cod_paciente,
+            CASE WHEN random() < 0.05 THEN NULL ELSE (random() * 50000)::int END AS cod_logradouro,
+            (random() * 2000)::int::text AS numero,
+            NULL::text AS complemento,
+            CASE WHEN random() < 0.8 THEN 't' ELSE 'f' END AS ativo,
+            now() - (random() * interval '1000 days') AS data_hora_criacao,
+            CASE WHEN random() < 0.3 THEN NULL ELSE now() - (random() * interval '500 days') END AS data_hora_atualizacao
+        FROM generate_series(1, :pacientes) AS pac, generate_series(1, :por_paciente) AS n
+    """), {"pacientes": pacientes, "por_paciente": enderecos_por_paciente})
+    conn.execute(text(f"CREATE INDEX ON {TABELA_ENDERECOS} (cod_paciente)"))
+    conn.execute(text(f"""
+        CREATE TEMP TABLE {TABELA_EXPORTADOS} ON COMMIT DROP AS
+        SELECT (random() * (:pacientes - 1))::int + 1 AS id_paciente
+        FROM generate_series(1, :exportados)
+    """), {"pacientes": pacientes, "exportados": exportados})
+    conn.execute(text(f"ANALYZE {TABELA_ENDERECOS}"))
+    conn.execute(text(f"ANALYZE {TABELA_EXPORTADOS}"))
+
+
+def montar_consulta(estrategia):
+    cte, join = montar_endereco_paciente(estrategia=estrategia, tabela=TABELA_ENDERECOS)
+    return f"""
+        {clausula_with(cte)}
+        SELECT p.id_paciente, enderecos_pac.cod_logradouro, enderecos_pac.numero
+        FROM {TABELA_EXPORTADOS} p
+        {join}
+        ORDER BY p.id_paciente
+    """
+
+
+def medir(conn, sql, repeticoes):
+    tempos = []
+    linhas = None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        linhas = conn.execute(text(sql)).fetchall()
+        tempos.append(time.perf_counter() - inicio)
+    return tempos, linhas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara as estratégias de resolução de endereço do paciente.")
+    parser.add_argument("--pacientes", type=int, default=500_000)
+    parser.add_argument("--enderecos-por-paciente", type=int, default=3)
+    parser.add_argument("--exportados", type=int, default=800, help="Pacientes presentes na janela de exportação.")
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--explain", action="store_true", help="Imprime o EXPLAIN (ANALYZE, BUFFERS) de cada estratégia.")
+    args = parser.parse_args()
+
+    settings = get_db_settings()
+    db = Database()
+    sucesso, mensagem = db.conectar(
+        db_name=settings["db_name"], user=settings["db_user"], password=settings["db_password"],
+        host=settings["db_host"], port=settings["db_port"],
+    )
+    if not sucesso: raise SystemExit(mensagem)
+
+    conn = db.conn
+    transacao = conn.begin()
+    try:
+        print(f"Gerando {args.pacientes * args.enderecos_por_paciente} endereços sintéticos...")
+        criar_dados_sinteticos(conn, args.pacientes, args.enderecos_por_paciente, args.exportados)
+
+        resultados = {}
+        for estrategia in (ESTRATEGIA_JANELA, ESTRATEGIA_LATERAL):
+            sql = montar_consulta(estrategia)
+            tempos, linhas = medir(conn, sql, args.repeticoes)
+            resultados[estrategia] = linhas
+            print(f"{estrategia:>8}: mediana {statistics.median(tempos) * 1000:.1f} ms | min {min(tempos) * 1000:.1f} ms | {len(linhas)} linhas")
+            if args.explain:
+                plano = conn.execute(text(f"EXPLAIN (ANALYZE, BUFFERS) {sql}")).scalars().all()
+                print("\n".join(plano))
+
+        if resultados[ESTRATEGIA_JANELA] != resultados[ESTRATEGIA_LATERAL]:
+            raise SystemExit("As estratégias escolheram endereços diferentes!")
+        print("Resultados idênticos entre as estratégias.")
+    finally:
+        transacao.rollback()
+        conn.close()
+        db.engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
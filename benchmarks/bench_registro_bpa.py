@@ -0,0 +1,70 @@
+"""
+Memória dos registros BPA-I: ``RegistroBPAI`` (``__slots__``) contra o dict com as
+mesmas chaves usado antes.
+
+Monta os registros com ``processar_registros_bpa_i_completo`` a partir das linhas
+sintéticas de bench_bpa_vetorizado, mede com tracemalloc a memória retida por eles e
+pelos mesmos registros convertidos em dict e imprime o total por 100 mil registros, além
+do tempo de numeração e gravação do arquivo a partir de cada um.
+
+Uso (a partir da raiz do projeto):
+    python -m benchmarks.bench_registro_bpa --linhas 200000
+"""
+import argparse
+import gc
+import logging
+import os
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.bench_bpa_vetorizado import gerar_linhas
+from bpa_exporter import BPAExporter
+
+
+def memoria_retida(construir):
+    """Memória (bytes) ainda alocada pelo resultado de ``construir()``, e o resultado."""
+    gc.collect()
+    tracemalloc.start()
+    inicio = tracemalloc.get_traced_memory()[0]
+    resultado = construir()
+    gc.collect()
+    total = tracemalloc.get_traced_memory()[0] - inicio
+    tracemalloc.stop()
+    return total, resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara a memória de RegistroBPAI com a de dicts.")
+    parser.add_argument("--linhas", type=int, default=200_000)
+    parser.add_argument("--competencia", default="202401")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    exporter = BPAExporter()
+    contexto = exporter.criar_contexto_exportacao()
+    codigos_curtos = sorted(contexto.tabela_proc_cid)
+    mapeamento_proc = {str(id_bd): codigo for id_bd, codigo in enumerate(codigos_curtos, start=1)}
+    contexto.registrar_mapeamento(set(mapeamento_proc), mapeamento_proc)
+    linhas = gerar_linhas(args.linhas, [int(id_bd) for id_bd in mapeamento_proc] + [9999])
+
+    def montar():
+        return exporter.processar_registros_bpa_i_completo(linhas, args.competencia, contexto)
+
+    memoria_registros, registros = memoria_retida(montar)
+    # Os mesmos registros como dicts; os RegistroBPAI intermediários são descartados
+    memoria_dicts, dicts = memoria_retida(lambda: [dict(registro) for registro in montar()])
+    por_100k = 100_000 / len(registros) / 1e6
+    print(f"{len(registros)} registros (memória retida, incluindo os valores)")
+    print(f"  RegistroBPAI: {memoria_registros * por_100k:.1f} MB por 100 mil registros")
+    print(f"  dict:         {memoria_dicts * por_100k:.1f} MB por 100 mil registros")
+    with tempfile.TemporaryDirectory() as pasta:
+        for nome, lista in (("RegistroBPAI", registros), ("dict", dicts)):
+            inicio = time.perf_counter()
+            lista = exporter._atribuir_folha_sequencia_final(lista)
+            exporter.gerar_arquivo_txt(args.competencia, lista, os.path.join(pasta, f"{nome}.txt"))
+            print(f"  numeração + gravação a partir de {nome}: {time.perf_counter() - inicio:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Vazão do validador BPA-I (``BPAValidator.validar_arquivo`` em fluxo).
+
+Gera um arquivo BPA sintético com registros válidos e uma fração de linhas com um campo
+corrompido, valida com e sem o caminho rápido (expressão da linha inteira) e com a leitura
+por mmap, e imprime as linhas por segundo de cada modo, conferindo que todos chegam aos
+mesmos erros.
+
+Uso (a partir da raiz do projeto):
+    python -m benchmarks.bench_validador_bpa --linhas 1000000
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from bpa_validator import LEITURA_MMAP, LEITURA_TEXTO, BPAValidator
+from shared.arquivo_bpa import codificar_registros, escrever_arquivo_bpa
+from shared.layouts import LAYOUT_BPA_I
+
+REGISTRO_VALIDO = {
+    "prd_ident": "03", "prd_cnes": "2560372", "prd_cmp": "202401", "prd_cnsmed": "700000000000001",
+    "prd_cbo": "225125", "prd_dtaten": "20240115", "prd_flh": "001", "prd_seq": "01",
+    "prd_pa": "0301010072", "prd_cnspac": "700000000000002", "prd_sexo": "F", "prd_ibge": "171820",
+    "prd_cid": "F840", "prd_ldade": "035", "prd_qt": "000001", "prd_caten": "01", "prd_org": "BPA",
+    "prd_nmpac": "PACIENTE", "prd_dtnasc": "19890101", "prd_raca": "01", "prd_nac": "010",
+    "prd_cep_pcnte": "77000000", "prd_lograd_pcnte": "081", "prd_end_pcnte": "RUA A",
+    "prd_num_pcnte": "10", "prd_bairro_pcnte": "CENTRO", "prd_ine": "0000000000", "prd_situacao_rua": "N",
+}
+
+
+def gerar_registros(quantidade, fracao_invalidos, semente=7):
+    rnd = random.Random(semente)
+    campos = LAYOUT_BPA_I.nomes[1:]
+    for i in range(quantidade):
+        registro = dict(REGISTRO_VALIDO, prd_nmpac=f"PACIENTE {i}", prd_seq=str(i % 99 + 1).zfill(2))
+        if rnd.random() < fracao_invalidos:
+            registro[rnd.choice(campos)] = rnd.choice(["", "x", "1 2"])
+        yield registro
+
+
+def _cabecalho(num_linhas, num_folhas, controle):
+    return {"cbc_mvm": "202401", "cbc_lin": str(num_linhas).zfill(6), "cbc_flh": str(num_folhas).zfill(6),
+            "cbc_smt_vrf": str(controle).zfill(4), "cbc_rsp": "ORGAO"}
+
+
+def validar(caminho, caminho_rapido, leitura, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        validador = BPAValidator(caminho_rapido=caminho_rapido, leitura=leitura)
+        inicio = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            validador.validar_arquivo(caminho, streaming=True)
+        tempos.append(time.perf_counter() - inicio)
+    return tempos, validador.stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mede a vazão do validador BPA-I.")
+    parser.add_argument("--linhas", type=int, default=1_000_000)
+    parser.add_argument("--invalidos", type=float, default=0.01, help="Fração de registros com erro.")
+    parser.add_argument("--repeticoes", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, "bpa.txt")
+        escrever_arquivo_bpa(caminho, _cabecalho, codificar_registros(gerar_registros(args.linhas, args.invalidos)))
+        print(f"{args.linhas} linhas | {os.path.getsize(caminho) / 1e6:.0f} MB")
+
+        resultados = {}
+        modos = (
+            ("campo a campo", False, LEITURA_TEXTO),
+            ("caminho rápido", True, LEITURA_TEXTO),
+            ("mmap", True, LEITURA_MMAP),
+        )
+        for modo, caminho_rapido, leitura in modos:
+            tempos, resultados[modo] = validar(caminho, caminho_rapido, leitura, args.repeticoes)
+            mediana = statistics.median(tempos)
+            print(f"{modo:>15}: mediana {mediana:.2f} s | {args.linhas / mediana / 1e3:.0f} mil linhas/s")
+
+        if len({repr(stats) for stats in resultados.values()}) != 1:
+            raise SystemExit("Os modos chegaram a resultados diferentes!")
+        print(f"Mesmos resultados em todos os modos ({resultados['caminho rápido']['total_erros']} erros).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Imprime o EXPLAIN (ANALYZE, BUFFERS) de cada consulta dos routers de indicadores antes e
+depois dos índices da revisão 0005_add_hot_path_indexes.
+
+Tudo roda numa única transação desfeita no final: os índices da revisão são removidos
+(plano "antes"), recriados sem CONCURRENTLY (plano "depois") e o ROLLBACK devolve o banco
+ao estado original. DROP/CREATE INDEX seguram lock exclusivo nas tabelas até o fim, então
+rode contra uma cópia/homologação, não contra o banco de produção em horário de uso.
+
+Uso (a partir da raiz do projeto; conexão via APP_DB_* ou config.ini):
+    python -m benchmarks.explain_router_queries --data-inicio 2024-01-01 --data-fim 2024-12-31
+"""
+import argparse
+import importlib.util
+from datetime import date
+from pathlib import Path
+
+from sqlalchemy import text
+
+from api.config import get_db_settings
+from api.routers import indicadores_assistencial, indicadores_executivo, indicadores_produtividade, indicadores_territorial
+from shared.database import Database
+
+MIGRACAO_INDICES = Path(__file__).resolve().parents[1] / "api" / "alembic" / "versions" / "0005_add_hot_path_indexes.py"
+
+
+def carregar_migracao_indices():
+    spec = importlib.util.spec_from_file_location("migracao_0005", MIGRACAO_INDICES)
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+    return modulo
+
+
+def consultas_dos_routers(data_inicio, data_fim):
+    periodo = {"data_inicio": data_inicio, "data_fim": data_fim}
+    paginado = {**periodo, "limit": 200, "offset": 0}
+    num_dias = max((data_fim - data_inicio).days + 1, 1)
+    return [
+        ("executivo/kpis_principais", indicadores_executivo.KPIS_PRINCIPAIS_QUERY, periodo),
+        ("executivo/kpis_principais (faltantes)", indicadores_executivo.PROCEDIMENTOS_FALTANTES_QUERY, periodo),
+        ("executivo/atendimentos_por_periodo", indicadores_executivo.ATENDIMENTOS_POR_PERIODO_QUERY, periodo),
+        ("assistencial/top_diagnosticos", indicadores_assistencial.TOP_DIAGNOSTICOS_QUERY, {**periodo, "limit": 50, "offset": 0}),
+        ("assistencial/perfil_etario", indicadores_assistencial.PERFIL_ETARIO_QUERY, periodo),
+        ("assistencial/prevalencia_deficiencias", indicadores_assistencial.PREVALENCIA_DEFICIENCIAS_QUERY, periodo),
+        ("produtividade/ranking_profissionais", indicadores_produtividade.RANKING_PROFISSIONAIS_QUERY, {**paginado, "num_dias": num_dias}),
+        ("territorial/atendimentos_por_municipio", indicadores_territorial.ATENDIMENTOS_POR_MUNICIPIO_QUERY, paginado),
+    ]
+
+
+def explain(conn, query, params):
+    sql = query.text.strip().rstrip(";")
+    return conn.execute(text(f"EXPLAIN (ANALYZE, BUFFERS) {sql}"), params).scalars().all()
+
+
+def tempo_execucao(plano):
+    for linha in reversed(plano):
+        if linha.startswith("Execution Time"):
+            return linha.split(":", 1)[1].strip()
+    return "?"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EXPLAIN ANALYZE das consultas dos routers antes/depois dos índices da 0005.")
+    parser.add_argument("--data-inicio", type=date.fromisoformat, required=True)
+    parser.add_argument("--data-fim", type=date.fromisoformat, required=True)
+    parser.add_argument("--resumo", action="store_true", help="Mostra só o tempo de execução de cada consulta.")
+    args = parser.parse_args()
+
+    migracao = carregar_migracao_indices()
+    consultas = consultas_dos_routers(args.data_inicio, args.data_fim)
+
+    settings = get_db_settings()
+    db = Database()
+    sucesso, mensagem = db.conectar(
+        db_name=settings["db_name"], user=settings["db_user"], password=settings["db_password"],
+        host=settings["db_host"], port=settings["db_port"],
+    )
+    if not sucesso: raise SystemExit(mensagem)
+
+    conn = db.conn
+    transacao = conn.begin()
+    try:
+        for nome, tabela, *_ in migracao.INDICES:
+            conn.execute(text(f"DROP INDEX IF EXISTS {tabela.split('.')[0]}.{nome}"))
+        antes = {nome: explain(conn, query, params) for nome, query, params in consultas}
+
+        for indice in migracao.INDICES:
+            conn.execute(text(migracao.ddl_create_index(*indice, concurrently=False)))
+        for tabela in sorted({indice[1] for indice in migracao.INDICES}):
+            conn.execute(text(f"ANALYZE {tabela}"))
+        depois = {nome: explain(conn, query, params) for nome, query, params in consultas}
+
+        for nome, _, _ in consultas:
+            print(f"=== {nome}: antes {tempo_execucao(antes[nome])} | depois {tempo_execucao(depois[nome])}")
+            if args.resumo: continue
+            print("--- antes")
+            print("\n".join(antes[nome]))
+            print("--- depois")
+            print("\n".join(depois[nome]))
+            print()
+    finally:
+        transacao.rollback()
+        conn.close()
+        db.engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,8 @@ import os
 import pandas as pd
 from sqlalchemy import text
 import datetime
+import functools
+import itertools
 import math
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
@@ -17,12 +19,74 @@ from api.logging import log_export_event, setup_logging
 setup_logging()
 logger = logging.getLogger("exporter.bpa")
 
+# Linhas buscadas por ida ao servidor no modo streaming da consulta principal.
+TAMANHO_LOTE_STREAMING = 5000
+
+# Desempate do DISTINCT ON (l.id_lancamento) na deduplicação no banco: entre as linhas
+# repetidas pelos LEFT JOINs um-para-muitos, fica a de menor CBO, raça/etnia e IBGE.
+ORDEM_DISTINCT_LANCAMENTO = "ORDER BY l.id_lancamento, vcpc.codigo_cbo, vcre.codigo_raca_etnia, aihu_cep_ibge.ibge"
+
 
 # Importações dos módulos compartilhados
+from shared.arquivo_bpa import codificar_registros, escrever_arquivo_bpa
+from shared.bpa_vetorizado import carregar_frame, colunas_para_registros, montar_colunas_bpa_i
 from shared.database import Database
+from shared.etapas_bpa import ConferenciaOrdem, DeduplicacaoPorLancamento, RegraIdadeProcedimento, aplicar_etapas
+from shared.extracao_paralela import MAX_TRABALHADORES, OPCOES_PARTICAO, extrair_em_particoes, filtro_particao, particionar_periodo
 from shared.mapeamento_procedimentos import carregar_tabela_procedimentos_cid
 from shared.mapeamento_tp_logradouro_sigh_bpa import carregar_mapeamento_logradouros
 from shared.mapeamento_profissionais import carregar_mapeamento_profissionais
+from shared.numeracao_bpa import ORDEM_CONSULTA, ORDEM_RESULTADO, chave_ordem_consulta, numerar_registros, ordenar_para_numeracao
+from shared.registro_bpa import RegistroBPAI, coleta_pausada
+from shared.regras_prestador import RegrasPrestador, contar_mensagens
+from shared.sql_enderecos import ESTRATEGIA_LATERAL, clausula_with, montar_endereco_paciente
+
+class ContextoExportacaoBPA:
+    """
+    Tabelas de apoio de uma execução da exportação BPA. São resolvidas uma única vez
+    por execução e repassadas a todas as etapas do pipeline (classificação e montagem
+    dos registros BPA-I), evitando consultas e construções de tabela repetidas.
+    """
+    def __init__(self, tabela_proc_cid, mapeamento_logradouros, mapeamento_profissionais):
+        self.tabela_proc_cid = tabela_proc_cid
+        self.mapeamento_logradouros = mapeamento_logradouros
+        self.mapeamento_profissionais = mapeamento_profissionais
+        self.mapeamento_proc = {}
+        self.cod_procs_consultados = set()
+        self._regras_prestador = None
+
+    def cod_procs_pendentes(self, registros):
+        """IDs de procedimento presentes em ``registros`` que ainda não foram consultados no banco."""
+        return {str(reg.get('cod_proc')) for reg in registros if reg.get('cod_proc')} - self.cod_procs_consultados
+
+    def registrar_da_consulta(self, registros):
+        """
+        Absorve o ``codigo_procedimento`` que a consulta principal já traz via JOIN com
+        sigh.procedimentos. Registros sem a coluna continuam pendentes de consulta.
+        """
+        for reg in registros:
+            if 'codigo_procedimento' not in reg: break
+            cod_proc = reg.get('cod_proc')
+            if not cod_proc: continue
+            cod_proc = str(cod_proc)
+            if cod_proc in self.cod_procs_consultados: continue
+            self.cod_procs_consultados.add(cod_proc)
+            if reg['codigo_procedimento'] is not None:
+                self.mapeamento_proc[cod_proc] = str(reg['codigo_procedimento'])
+
+    def registrar_mapeamento(self, cod_procs, mapeamento_proc):
+        self.mapeamento_proc.update(mapeamento_proc)
+        self.cod_procs_consultados |= set(cod_procs)
+
+    def codigo_curto(self, cod_proc):
+        return self.mapeamento_proc.get(str(cod_proc))
+
+    def regras_prestador(self, cbo_override_map):
+        """Regras por (prestador, código curto) da execução, compiladas uma vez e reaproveitadas entre os lotes."""
+        if self._regras_prestador is None:
+            self._regras_prestador = RegrasPrestador(self.tabela_proc_cid, cbo_override_map, self.mapeamento_profissionais)
+        return self._regras_prestador
+
 
 class BPAExporter:
     """
@@ -103,16 +167,10 @@ class BPAExporter:
         )
         return acao, substituto
 
-    def _build_sql_completo(self, coluna_data_filtro, alias_tabela_filtro="l"):
-        return f"""
-        WITH RankedEnderecos AS (
-            SELECT
-                ep.cod_paciente, ep.cod_logradouro, ep.numero,
-                ROW_NUMBER() OVER(PARTITION BY ep.cod_paciente ORDER BY ep.data_hora_atualizacao DESC, ep.data_hora_criacao DESC, ep.id_endereco DESC) as rn
-            FROM sigh.enderecos ep
-            WHERE ep.ativo = 't' AND ep.cod_logradouro IS NOT NULL
-        ),
-        CidPrincipalFia AS (
+    def _build_sql_completo(self, coluna_data_filtro, alias_tabela_filtro="l", estrategia_endereco=ESTRATEGIA_LATERAL,
+                            distinto_por_lancamento=False):
+        cte_enderecos, join_enderecos = montar_endereco_paciente(estrategia=estrategia_endereco)
+        cte_cid_principal = """CidPrincipalFia AS (
             SELECT
                 cf.cod_fia,
                 c.codigo,
@@ -123,9 +181,11 @@ class BPAExporter:
                 sigh.cids c ON cf.cod_cid_fia = c.id_cid
             WHERE
                 cf.ativo = 't' AND c.ativo = 't'
-        )
-        SELECT
-            l.id_lancamento, l.cod_proc, l.quantidade, l.cod_cid AS lanc_cid,
+        )"""
+        return f"""
+        {clausula_with(cte_enderecos, cte_cid_principal)}
+        SELECT {"DISTINCT ON (l.id_lancamento)" if distinto_por_lancamento else ""}
+            l.id_lancamento, l.cod_proc, proc.codigo_procedimento, l.quantidade, l.cod_cid AS lanc_cid,
             fi.diagnostico AS diagnostico_ficha,
             fi.matricula AS cnspac_paciente_original,
             cid_principal.codigo AS cid_da_fia,
@@ -151,11 +211,12 @@ class BPAExporter:
         JOIN sigh.contas AS c ON l.cod_conta = c.id_conta
         JOIN sigh.ficha_amb_int AS fi ON c.cod_fia = fi.id_fia
         LEFT JOIN sigh.pacientes AS p ON fi.cod_paciente = p.id_paciente
+        LEFT JOIN sigh.procedimentos AS proc ON l.cod_proc = proc.id_procedimento
         LEFT JOIN CidPrincipalFia AS cid_principal ON fi.id_fia = cid_principal.cod_fia AND cid_principal.rn_cid = 1
         LEFT JOIN sigh.prestadores AS pr_lanc ON l.cod_prestador = pr_lanc.id_prestador
         LEFT JOIN sigh.v_cons_prestadores_cbos_scola AS vcpc ON l.cod_prestador = vcpc.id_prestador
         LEFT JOIN sigh.v_cons_racas_etnias_scola AS vcre ON p.cod_raca_etnia = vcre.id_raca_etnia
-        LEFT JOIN RankedEnderecos AS enderecos_pac ON p.id_paciente = enderecos_pac.cod_paciente AND enderecos_pac.rn = 1
+        {join_enderecos}
         LEFT JOIN endereco_sigh.logradouros AS logradouros_pac ON enderecos_pac.cod_logradouro = logradouros_pac.id_logradouro
         LEFT JOIN aihu.ceps_municipios_ibges AS aihu_cep_ibge ON logradouros_pac.cep = aihu_cep_ibge.cep
         """
@@ -177,86 +238,246 @@ class BPAExporter:
             self._log_message_gui(f"Erro ao carregar mapeamento de procedimentos: {str(e)}")
         return mapeamento_proc
 
-    def consultar_dados_completo(self, data_inicio, data_fim, competencia=None, criterio_data="lancamento"):
-        if not self.conn: return [], {}, 0
+    def criar_contexto_exportacao(self):
+        """Carrega as tabelas estáticas de apoio uma única vez para a execução corrente."""
+        return ContextoExportacaoBPA(
+            carregar_tabela_procedimentos_cid(),
+            carregar_mapeamento_logradouros(),
+            carregar_mapeamento_profissionais(),
+        )
+
+    def resolver_procedimentos(self, contexto, registros):
+        """
+        Resolve o código curto dos procedimentos de ``registros``: usa a coluna trazida pela
+        consulta principal e só consulta sigh.procedimentos para IDs ainda desconhecidos.
+        """
+        contexto.registrar_da_consulta(registros)
+        cod_procs_pendentes = contexto.cod_procs_pendentes(registros)
+        if cod_procs_pendentes:
+            contexto.registrar_mapeamento(cod_procs_pendentes, self.carregar_mapeamento_procedimentos(cod_procs_pendentes))
+        return contexto
+
+    def _montar_sql_consulta(self, data_inicio, data_fim, competencia_gui, criterio_data, dedup_no_banco=False, particao=None):
+        """
+        SQL da consulta principal. Com ``dedup_no_banco``, as linhas repetidas de um mesmo
+        lançamento (LEFT JOINs um-para-muitos com as views de CBO e raça/etnia e com a tabela
+        de IBGE por CEP) são removidas no banco com ``DISTINCT ON (l.id_lancamento)``. O
+        DISTINCT ON exige ordenar por ``l.id_lancamento``, então a consulta é envolvida numa
+        subconsulta e a ordem da numeração (``ORDEM_RESULTADO``) é aplicada por fora.
+
+        ``particao`` (``(inicio, proximo_inicio)``, ver shared/extracao_paralela.py) restringe
+        a consulta por data de lançamento a um trecho do período.
+        """
+        competencia_bd_formatada = competencia_gui[4:] + "/" + competencia_gui[:4]
+        data_inicio_str = data_inicio.isoformat()
+        data_fim_str = data_fim.isoformat()
+
+        coluna_data_para_select_no_alias = "data"
+        alias_tabela_para_select = "l"
+        if criterio_data == "competencia":
+            coluna_data_para_select_no_alias = "competencia"
+            alias_tabela_para_select = "c"
+
+        sql_base = self._build_sql_completo(
+            coluna_data_para_select_no_alias, alias_tabela_para_select, distinto_por_lancamento=dedup_no_banco
+        )
+
+        condicoes_where_comuns_sigh = ["c.ativo = 't'", "c.status_conta = 'A'", "l.cod_proc IS NOT NULL"]
+        if criterio_data == "competencia":
+            condicoes_especificas = [f"c.competencia = '{competencia_bd_formatada}'"] + condicoes_where_comuns_sigh
+            where_clause_final = "WHERE " + " AND ".join(condicoes_especificas)
+        else:
+            condicao_data = f"l.data BETWEEN '{data_inicio_str}' AND '{data_fim_str}'"
+            condicoes_com_data = [condicao_data] + condicoes_where_comuns_sigh
+            if particao: condicoes_com_data.append(filtro_particao("l.data", particao))
+            where_clause_final = "WHERE " + " AND ".join(condicoes_com_data)
+
+        # Mesma ordem da numeração de folhas, que assim dispensa a ordenação em memória
+        if not dedup_no_banco:
+            return sql_base + "\n" + where_clause_final + "\n" + ORDEM_CONSULTA
+        sql_distinto = sql_base + "\n" + where_clause_final + "\n" + ORDEM_DISTINCT_LANCAMENTO
+        return f"SELECT * FROM ({sql_distinto}\n) AS lancamentos_unicos\n{ORDEM_RESULTADO}"
+
+    def medir_dedup_no_banco(self, data_inicio, data_fim, competencia=None, criterio_data="lancamento"):
+        """
+        Compara o que a consulta principal envia pela rede sem e com ``dedup_no_banco``:
+        devolve (e registra no log) linhas e bytes de cada modo e a economia. Os bytes são os
+        da representação em texto de cada linha, aproximação do tráfego do protocolo.
+        """
+        competencia_gui = competencia or datetime.datetime.now().strftime("%Y%m")
+        medidas = {}
+        for modo, dedup_no_banco in (("python", False), ("banco", True)):
+            sql = self._montar_sql_consulta(data_inicio, data_fim, competencia_gui, criterio_data, dedup_no_banco)
+            linhas, tamanho = self.conn.execute(text(
+                f"SELECT count(*), COALESCE(sum(octet_length(q::text)), 0) FROM ({sql}\n) AS q"
+            )).one()
+            medidas[modo] = {"linhas": int(linhas), "bytes": int(tamanho)}
+        medidas["economia"] = {
+            chave: medidas["python"][chave] - medidas["banco"][chave] for chave in ("linhas", "bytes")
+        }
+        self._log_message_gui(
+            f"Deduplicação no banco: {medidas['banco']['linhas']} de {medidas['python']['linhas']} linhas "
+            f"({medidas['economia']['linhas']} linhas e {medidas['economia']['bytes'] / 1e6:.1f} MB a menos na rede)."
+        )
+        return medidas
+
+    def _executar_consulta_em_lotes(self, sql, tamanho_lote):
+        """
+        Executa a consulta com cursor nomeado no servidor (stream_results/yield_per),
+        entregando as linhas em lotes de tamanho fixo sem materializar o resultado inteiro.
+        """
+        stmt = text(sql).execution_options(stream_results=True, yield_per=tamanho_lote)
+        result = self.conn.execute(stmt)
+        try:
+            for particao in result.partitions():
+                yield [dict(row._mapping) for row in particao]
+        finally:
+            result.close()
+
+    def _classificar_registros(self, registros_do_banco, contexto, contadores_modalidade):
+        """Separa os lançamentos de BPA dos de APAC, acumulando os contadores por modalidade."""
+        tabela_proc_cid = contexto.tabela_proc_cid
+        registros_bpa, total_apac = [], 0
+        for reg in registros_do_banco:
+            codigo_curto = contexto.codigo_curto(reg.get('cod_proc'))
+            proc_info = tabela_proc_cid.get(codigo_curto) if codigo_curto else None
+            if proc_info:
+                categoria = proc_info.get('categoria', 'BPA')
+                if categoria.upper() == 'APAC':
+                    total_apac += 1
+                else:
+                    registros_bpa.append(reg)
+                    modalidade = proc_info.get('modalidade', 'Não Mapeado')
+                    contadores_modalidade[modalidade] = contadores_modalidade.get(modalidade, 0) + 1
+            else:
+                registros_bpa.append(reg)
+                contadores_modalidade['Não Mapeado'] = contadores_modalidade.get('Não Mapeado', 0) + 1
+                if reg.get('cod_proc'):
+                    self.mapeamentos_faltantes_log.add((codigo_curto or f"ID_BD:{reg.get('cod_proc')}", str(reg.get('cod_proc'))))
+        return registros_bpa, total_apac
+
+    def consultar_dados_completo(self, data_inicio, data_fim, competencia=None, criterio_data="lancamento",
+                                 streaming=False, tamanho_lote=TAMANHO_LOTE_STREAMING, deduplicar=False, vetorizado=False,
+                                 dedup_no_banco=False, particao=None, max_trabalhadores=MAX_TRABALHADORES):
+        """
+        Consulta os lançamentos do período e devolve ``(registros BPA-I processados,
+        contadores por modalidade, total APAC, total BPA)``. O total BPA é o de procedimentos
+        classificados para o BPA, antes da deduplicação, em qualquer modo.
+
+        Com ``streaming=True`` a consulta usa um cursor nomeado no servidor e as linhas
+        passam pela classificação, pelo processamento e (se ``deduplicar``) pela
+        deduplicação em lotes de ``tamanho_lote``, mantendo o pico de memória constante.
+        Com ``vetorizado=True`` os registros BPA-I são montados por coluna
+        (``processar_registros_bpa_i_vetorizado``), com o mesmo resultado.
+
+        Com ``dedup_no_banco=True`` a deduplicação por lançamento é feita na própria consulta
+        (ver ``_montar_sql_consulta``): as linhas repetidas nem chegam ao Python, que dispensa
+        ``deduplicar``, e os contadores por modalidade passam a contar lançamentos únicos.
+        ``medir_dedup_no_banco`` mostra as linhas e os bytes economizados.
+
+        Com ``particao`` ("dia" ou "semana") e critério por data de lançamento, o período é
+        consultado em partições paralelas (``_consultar_particionado``), cada uma com a sua
+        conexão do pool; nesse modo ``streaming`` é ignorado.
+        """
+        if not self.conn: return [], {}, 0, 0
         self.mapeamentos_faltantes_log.clear()
         try:
             competencia_gui = competencia or datetime.datetime.now().strftime("%Y%m")
-            competencia_bd_formatada = competencia_gui[4:] + "/" + competencia_gui[:4]
-            data_inicio_str = data_inicio.isoformat()
-            data_fim_str = data_fim.isoformat()
+            full_sql_query_str = self._montar_sql_consulta(data_inicio, data_fim, competencia_gui, criterio_data, dedup_no_banco)
+            deduplicar = deduplicar and not dedup_no_banco
 
-            coluna_data_para_select_no_alias = "data"
-            alias_tabela_para_select = "l"
-            if criterio_data == "competencia":
-                coluna_data_para_select_no_alias = "competencia"
-                alias_tabela_para_select = "c"
+            particionado = bool(particao) and criterio_data == "lancamento"
+            if streaming and not particionado:
+                return self._consultar_em_lotes(full_sql_query_str, competencia_gui, criterio_data, tamanho_lote, deduplicar, vetorizado)
 
-            sql_base = self._build_sql_completo(coluna_data_para_select_no_alias, alias_tabela_para_select)
-            
-            condicoes_where_comuns_sigh = ["c.ativo = 't'", "c.status_conta = 'A'", "l.cod_proc IS NOT NULL"]
-            if criterio_data == "competencia":
-                condicoes_especificas = [f"c.competencia = '{competencia_bd_formatada}'"] + condicoes_where_comuns_sigh
-                where_clause_final = "WHERE " + " AND ".join(condicoes_especificas)
+            if particionado:
+                registros_do_banco = self._consultar_particionado(
+                    data_inicio, data_fim, competencia_gui, dedup_no_banco, particao, max_trabalhadores
+                )
             else:
-                condicao_data = f"l.data BETWEEN '{data_inicio_str}' AND '{data_fim_str}'"
-                condicoes_com_data = [condicao_data] + condicoes_where_comuns_sigh
-                where_clause_final = "WHERE " + " AND ".join(condicoes_com_data)
-
-            order_by_clause = "ORDER BY pr_lanc.cns, l.data, l.id_lancamento"
-            full_sql_query_str = sql_base + "\n" + where_clause_final + "\n" + order_by_clause
-            
-            self._log_message_gui("Executando consulta principal no banco de dados...")
-            result = self.conn.execute(text(full_sql_query_str))
-            registros_do_banco = [dict(row._mapping) for row in result.fetchall()]
+                self._log_message_gui("Executando consulta principal no banco de dados...")
+                result = self.conn.execute(text(full_sql_query_str))
+                registros_do_banco = [dict(row._mapping) for row in result.fetchall()]
             self.registros_do_banco_para_indicadores = registros_do_banco
             self._log_message_gui(f"Consulta SQL retornou {len(registros_do_banco)} linhas brutas.")
             log_export_event(logger, "consulta_principal", batch_size=len(registros_do_banco), status="fetched", criterio=criterio_data)
 
-            if not registros_do_banco: return [], {}, 0
-
-            cod_procs_unicos = {reg.get('cod_proc') for reg in registros_do_banco if reg.get('cod_proc')}
-            mapeamento_proc = self.carregar_mapeamento_procedimentos(cod_procs_unicos)
-            tabela_proc_cid = carregar_tabela_procedimentos_cid()
-
-            registros_bpa, registros_apac, contadores_modalidade = [], [], {}
-            for reg in registros_do_banco:
-                codigo_curto = mapeamento_proc.get(str(reg.get('cod_proc')))
-                proc_info = tabela_proc_cid.get(codigo_curto) if codigo_curto else None
-                if proc_info:
-                    categoria = proc_info.get('categoria', 'BPA')
-                    if categoria.upper() == 'APAC':
-                        registros_apac.append(reg)
-                    else:
-                        registros_bpa.append(reg)
-                        modalidade = proc_info.get('modalidade', 'Não Mapeado')
-                        contadores_modalidade[modalidade] = contadores_modalidade.get(modalidade, 0) + 1
-                else:
-                    registros_bpa.append(reg)
-                    contadores_modalidade['Não Mapeado'] = contadores_modalidade.get('Não Mapeado', 0) + 1
-                    if reg.get('cod_proc'):
-                        self.mapeamentos_faltantes_log.add((codigo_curto or f"ID_BD:{reg.get('cod_proc')}", str(reg.get('cod_proc'))))
+            if not registros_do_banco: return [], {}, 0, 0
+
+            contexto = self.resolver_procedimentos(self.criar_contexto_exportacao(), registros_do_banco)
+
+            contadores_modalidade = {}
+            registros_bpa, total_apac = self._classificar_registros(registros_do_banco, contexto, contadores_modalidade)
             
-            self._log_message_gui(f"Classificação: {len(registros_bpa)} procedimentos para BPA, {len(registros_apac)} para APAC (ignorados).")
+            self._log_message_gui(f"Classificação: {len(registros_bpa)} procedimentos para BPA, {total_apac} para APAC (ignorados).")
 
             log_export_event(
                 logger,
                 "classificacao_procedimentos",
                 batch_size=len(registros_bpa),
                 status="ok",
-                apac_ignorados=len(registros_apac),
+                apac_ignorados=total_apac,
             )
 
             if registros_bpa:
-                registros_processados = self.processar_registros_bpa_i_completo(registros_bpa, competencia_gui)
+                registros_processados = self._processador_registros(vetorizado)(registros_bpa, competencia_gui, contexto)
+                if deduplicar:
+                    registros_processados = self.deduplicate_por_id_lancamento_original(registros_processados)
                 if self.mapeamentos_faltantes_log: self._escrever_log_mapeamentos_faltantes()
-                return registros_processados, contadores_modalidade, len(registros_apac)
+                return registros_processados, contadores_modalidade, total_apac, len(registros_bpa)
             else:
-                return [], contadores_modalidade, len(registros_apac)
+                return [], contadores_modalidade, total_apac, 0
         except Exception as e:
             self._log_message_gui(f"Erro na consulta: {e}")
             import traceback; traceback.print_exc()
-            return [], {}, 0
+            return [], {}, 0, 0
+
+    def _consultar_particionado(self, data_inicio, data_fim, competencia_gui, dedup_no_banco, particao, max_trabalhadores):
+        """Consulta principal por partições do período, em paralelo, intercaladas na ordem de ``ORDEM_CONSULTA``."""
+        particoes = particionar_periodo(data_inicio, data_fim, particao)
+        self._log_message_gui(
+            f"Executando consulta principal em {len(particoes)} partições por {particao} "
+            f"({min(max_trabalhadores, len(particoes))} em paralelo)..."
+        )
+        consultas = [
+            (self._montar_sql_consulta(data_inicio, data_fim, competencia_gui, "lancamento", dedup_no_banco, p), None)
+            for p in particoes
+        ]
+        return extrair_em_particoes(self.conn.engine, consultas, chave_ordem_consulta, max_trabalhadores)
+
+    def _consultar_em_lotes(self, full_sql_query_str, competencia_gui, criterio_data, tamanho_lote, deduplicar, vetorizado=False):
+        self._log_message_gui(f"Executando consulta principal em modo streaming (lotes de {tamanho_lote} linhas)...")
+        self.registros_do_banco_para_indicadores = []
+        contexto = self.criar_contexto_exportacao()
+        ids_vistos = set()
+        contadores_modalidade = {}
+        registros_processados = []
+        total_linhas, total_bpa, total_apac = 0, 0, 0
+        processar_registros = self._processador_registros(vetorizado)
+
+        for lote in self._executar_consulta_em_lotes(full_sql_query_str, tamanho_lote):
+            total_linhas += len(lote)
+            self.resolver_procedimentos(contexto, lote)
+            registros_bpa, apac_lote = self._classificar_registros(lote, contexto, contadores_modalidade)
+            total_bpa += len(registros_bpa)
+            total_apac += apac_lote
+            if not registros_bpa:
+                continue
+
+            processados_lote = processar_registros(registros_bpa, competencia_gui, contexto)
+            if deduplicar:
+                processados_lote = self._deduplicar_lote(processados_lote, ids_vistos)
+            registros_processados.extend(processados_lote)
+
+        self._log_message_gui(f"Consulta SQL retornou {total_linhas} linhas brutas.")
+        log_export_event(logger, "consulta_principal", batch_size=total_linhas, status="fetched", criterio=criterio_data, streaming=True)
+        self._log_message_gui(f"Classificação: {total_bpa} procedimentos para BPA, {total_apac} para APAC (ignorados).")
+        log_export_event(logger, "classificacao_procedimentos", batch_size=total_bpa, status="ok", apac_ignorados=total_apac)
+        if deduplicar:
+            self._log_message_gui(f"Deduplicação concluída: {len(registros_processados)} registros únicos.")
+
+        if self.mapeamentos_faltantes_log: self._escrever_log_mapeamentos_faltantes()
+        return registros_processados, contadores_modalidade, total_apac, total_bpa
     
     def calcular_idade(self, data_nascimento):
         """
@@ -280,26 +501,42 @@ class BPAExporter:
         idade = hoje.year - nascimento.year - ((hoje.month, hoje.day) < (nascimento.month, nascimento.day))
         return idade
 
-    def processar_registros_bpa_i_completo(self, registros_bd, competencia):
-        registros_bpa_i_sem_numeracao = []
-        tabela_proc_cid = carregar_tabela_procedimentos_cid()
-        cod_procs_bd_unicos = list(set([reg.get('cod_proc') for reg in registros_bd if reg.get('cod_proc')]))
-        mapeamento_proc = self.carregar_mapeamento_procedimentos(cod_procs_bd_unicos)
-        
-        mapeamento_logradouros = carregar_mapeamento_logradouros()
-        mapeamento_profissionais = carregar_mapeamento_profissionais()
+    def processar_registros_bpa_i_completo(self, registros_bd, competencia, contexto=None):
+        """
+        Monta os registros BPA-I (ainda sem folha/sequência). Quando chamado fora do
+        pipeline de consulta, sem ``contexto``, resolve as tabelas de apoio por conta própria.
+        """
+        if contexto is None:
+            contexto = self.resolver_procedimentos(self.criar_contexto_exportacao(), registros_bd)
+        regras = contexto.regras_prestador(self.cbo_override_map)
+        # Registros por regra aplicada; as mensagens de REGRA saem agregadas ao final
+        aplicacoes = {}
+        # Valores da execução compartilhados por todos os registros
+        cnes = self.config.get('cnes').ljust(7)
+        ine = self.config.get('default_ine').ljust(10)
+
+        # Os RegistroBPAI são rastreados pelo coletor cíclico; sem a pausa, a criação em
+        # massa dispara coletas completas repetidas
+        with coleta_pausada():
+            registros_bpa_i_sem_numeracao = self._montar_registros_bpa_i(
+                registros_bd, competencia, contexto, regras, aplicacoes, cnes, ine
+            )
+        self._log_regras(contar_mensagens(aplicacoes))
+        return registros_bpa_i_sem_numeracao
 
+    def _montar_registros_bpa_i(self, registros_bd, competencia, contexto, regras, aplicacoes, cnes, ine):
+        mapeamento_logradouros = contexto.mapeamento_logradouros
+        registros_bpa_i_sem_numeracao = []
         for reg_data in registros_bd:
             id_prestador = str(reg_data.get('id_prestador_lancamento'))
             cns_med_val = str(reg_data.get('cns_profissional_lancamento') or '').strip()
             cns_med = cns_med_val.ljust(15) if cns_med_val else ' ' * 15
-            
-            cbo_override = self.cbo_override_map.get(id_prestador)
-            if cbo_override:
-                cbo_val = cbo_override
-                self._log_message_gui(f"REGRA: CBO para o prestador ID {id_prestador} alterado para '{cbo_val}'.")
-            else:
-                cbo_val = str(reg_data.get('cbo_profissional_view') or '').strip()
+
+            regra = regras.regra(id_prestador, contexto.codigo_curto(reg_data.get('cod_proc')))
+            if regra.mensagens:
+                aplicacoes[regra] = aplicacoes.get(regra, 0) + 1
+
+            cbo_val = regra.cbo or str(reg_data.get('cbo_profissional_view') or '').strip()
             cbo = cbo_val.ljust(6)[:6] if cbo_val else ' ' * 6
             
             data_atend_obj = reg_data.get('data_atendimento_lancamento')
@@ -314,54 +551,18 @@ class BPAExporter:
             sexo = 'M' if sexo_bd == '1' else 'F'
             ibge_val = str(reg_data.get('ibge_por_cep') or '').strip()
             cod_ibge_paciente = ibge_val.ljust(6)[:6] if ibge_val else ' ' * 6
-            idade = 0
-            if data_nasc_obj and data_atend_obj:
-                idade = self.calcular_idade(data_nasc_obj)
-            idade_str = str(min(max(idade, 0), 130)).zfill(3)
+            # Calculada uma vez: prd_ldade (só com data de atendimento) e a regra de idade usam a mesma
+            idade = self.calcular_idade(data_nasc_obj) if data_nasc_obj else None
+            idade_str = str(min(max(idade, 0), 130)).zfill(3) if idade is not None and data_atend_obj else '000'
             raca_val = str(reg_data.get('codigo_raca_etnia_view') or '99').strip()
             raca = raca_val.zfill(2)
             etnia_val = str(reg_data.get('cod_etnia_indigena') or '').strip() if raca == '05' else ''
             etnia = etnia_val.zfill(4) if etnia_val else '    '
-            cod_proc_bd = reg_data.get('cod_proc')
-            codigo_curto = mapeamento_proc.get(str(cod_proc_bd))
-            
-            proc_info = tabela_proc_cid.get(codigo_curto, {}) if codigo_curto else {}
-            
-            cod_proc_sigtap_original = proc_info.get('codigo_sigtap', '0301010048')
-
-            cod_proc_sigtap_final = cod_proc_sigtap_original
-            proc_info_final = proc_info
-
-            if id_prestador == '35' and cod_proc_sigtap_original == '0301070075':
-                cod_proc_sigtap_final = '0301010072'
-                proc_info_final = tabela_proc_cid.get('72', {})
-                self._log_message_gui(f"REGRA: Procedimento '0301070075' do prestador ID 35 alterado para '{cod_proc_sigtap_final}'.")
-            elif id_prestador == '75' and cod_proc_sigtap_original == '0301010048':
-                cod_proc_sigtap_final = '0301040044'
-                proc_info_final = tabela_proc_cid.get('44', {})
-                self._log_message_gui(f"REGRA: Procedimento '0301010048' do prestador ID 75 (Andre Luiz) alterado para '{cod_proc_sigtap_final}'.")
-
-            servico_val = proc_info_final.get('servico', '')
-            classificacao_val = proc_info_final.get('classificacao', '')
-
-            if not servico_val and not classificacao_val:
-                info_profissional = mapeamento_profissionais.get(id_prestador, {})
-                servico_val = info_profissional.get('servico', '')
-                classificacao_val = info_profissional.get('classificacao', '')
-                if servico_val:
-                    self._log_message_gui(f"REGRA: Usando Serv/Class ({servico_val}/{classificacao_val}) do profissional ID {id_prestador} pois o procedimento não possui.")
-            
-            quantidade_final = '000001'
-            if cod_proc_sigtap_final == '0701050020':
-                quantidade_final = '000030'
-            
-            cid_obrigatorio = proc_info_final.get('cid_obrigatorio', False)
-            cid_sugestao = proc_info_final.get('cid_sugestao')
-            
+
             cid_banco_primario = reg_data.get('cid_da_fia') or reg_data.get('lanc_cid')
             cid_banco_secundario = reg_data.get('diagnostico_ficha')
             
-            cid_val = str(cid_banco_primario or cid_banco_secundario or cid_sugestao or ('Z000' if cid_obrigatorio else ''))
+            cid_val = str(cid_banco_primario or cid_banco_secundario or regra.cid_padrao)
             
             cid_formatado = cid_val.strip().upper().replace('.', '')
             cid = cid_formatado.ljust(4)[:4] if cid_formatado else '    '
@@ -374,145 +575,147 @@ class BPAExporter:
             tipo_logradouro_texto = str(reg_data.get('vcp_tp_logradouro') or '').strip().upper()
             codigo_logradouro = mapeamento_logradouros.get(tipo_logradouro_texto, '000')
             
-            registro_bpa_i = {
-                'prd_ident': '03', 'prd_cnes': self.config.get('cnes').ljust(7),
-                'prd_cmp': competencia, 'prd_cnsmed': cns_med, 'prd_cbo': cbo,
-                'prd_dtaten': data_atend_str, 'prd_flh': '   ', 'prd_seq': '  ',
-                'prd_pa': cod_proc_sigtap_final.ljust(10),
-                'prd_cnspac': cnspac, 'prd_sexo': sexo, 'prd_ibge': cod_ibge_paciente,
-                'prd_cid': cid, 'prd_ldade': idade_str, 'prd_qt': quantidade_final,
-                'prd_caten': '01', 'prd_naut': ' ' * 13, 'prd_org': 'BPA',
-                'prd_nmpac': nome_paciente, 'prd_dtnasc': data_nasc_str,
-                'prd_raca': raca, 'prd_etnia': etnia, 'prd_nac': '010',
-                'prd_srv': str(servico_val).zfill(3) if servico_val else '   ',
-                'prd_clf': str(classificacao_val).zfill(3) if classificacao_val else '   ',
-                'prd_equipe_Seq': ' ' * 8, 'prd_equipe_Area': ' ' * 4,
-                'prd_cnpj': ' ' * 14,
-                'prd_cep_pcnte': str(reg_data.get('vcp_cep') or '').ljust(8),
-                'prd_lograd_pcnte': codigo_logradouro.zfill(3),
-                'prd_end_pcnte': str(reg_data.get('vcp_logradouro') or '').ljust(30),
-                'prd_compl_pcnte': ' ' * 10,
-                'prd_num_pcnte': numero,
-                'prd_bairro_pcnte': str(reg_data.get('vcp_bairro_inicial') or '').ljust(30),
-                'prd_ddtel_pcnte': ' ' * 11, 'prd_email_pcnte': ' ' * 40,
-                'prd_ine': self.config.get('default_ine').ljust(10),
-                'prd_cpf_pcnte': ' ' * 11, 'prd_situacao_rua': ' ',
-                '_id_lancamento_original': reg_data.get('id_lancamento'),
-                '_nm_profissional': nome_profissional_val,
-                '_data_nasc_obj': data_nasc_obj
-            }
+            # Argumentos por posição, na ordem de CAMPOS_REGISTRO (ver shared/registro_bpa.py)
+            registro_bpa_i = RegistroBPAI(
+                # prd_ident, prd_cnes, prd_cmp, prd_cnsmed, prd_cbo, prd_dtaten, prd_flh, prd_seq
+                '03', cnes, competencia, cns_med, cbo, data_atend_str, '   ', '  ',
+                # prd_pa, prd_cnspac, prd_sexo, prd_ibge, prd_cid, prd_ldade, prd_qt
+                regra.prd_pa, cnspac, sexo, cod_ibge_paciente, cid, idade_str, regra.prd_qt,
+                # prd_caten, prd_naut, prd_org, prd_nmpac, prd_dtnasc, prd_raca, prd_etnia, prd_nac
+                '01', ' ' * 13, 'BPA', nome_paciente, data_nasc_str, raca, etnia, '010',
+                # prd_srv, prd_clf, prd_equipe_Seq, prd_equipe_Area, prd_cnpj
+                regra.prd_srv, regra.prd_clf, ' ' * 8, ' ' * 4, ' ' * 14,
+                # prd_cep_pcnte, prd_lograd_pcnte, prd_end_pcnte, prd_compl_pcnte, prd_num_pcnte, prd_bairro_pcnte
+                str(reg_data.get('vcp_cep') or '').ljust(8),
+                codigo_logradouro.zfill(3),
+                str(reg_data.get('vcp_logradouro') or '').ljust(30),
+                ' ' * 10,
+                numero,
+                str(reg_data.get('vcp_bairro_inicial') or '').ljust(30),
+                # prd_ddtel_pcnte, prd_email_pcnte, prd_ine, prd_cpf_pcnte, prd_situacao_rua
+                ' ' * 11, ' ' * 40, ine, ' ' * 11, ' ',
+                # _id_lancamento_original, _nm_profissional, _idade
+                reg_data.get('id_lancamento'), nome_profissional_val, idade,
+            )
             registros_bpa_i_sem_numeracao.append(registro_bpa_i)
         return registros_bpa_i_sem_numeracao
     
+    def processar_registros_bpa_i_vetorizado(self, registros_bd, competencia, contexto=None):
+        """
+        Mesmo resultado de ``processar_registros_bpa_i_completo``, calculado por coluna sobre
+        um DataFrame (ver shared/bpa_vetorizado.py), com as mesmas regras por prestador.
+        """
+        if not registros_bd: return []
+        if contexto is None:
+            contexto = self.resolver_procedimentos(self.criar_contexto_exportacao(), registros_bd)
+        colunas, regras = montar_colunas_bpa_i(
+            carregar_frame(registros_bd), competencia, contexto, self.config,
+            contexto.regras_prestador(self.cbo_override_map), self.calcular_idade
+        )
+        self._log_regras(regras)
+        return colunas_para_registros(colunas)
+
+    def _log_regras(self, contagem):
+        """Uma mensagem por REGRA aplicada, com o total de registros afetados."""
+        for mensagem, total in contagem.items():
+            self._log_message_gui(f"{mensagem} ({total} registros).")
+
+    def _processador_registros(self, vetorizado):
+        return self.processar_registros_bpa_i_vetorizado if vetorizado else self.processar_registros_bpa_i_completo
+
     def aplicar_deduplicacao(self, registros_brutos, metodo):
         if metodo == "por_id_lancamento":
             return self.deduplicate_por_id_lancamento_original(registros_brutos)
         return registros_brutos
 
     def aplicar_verificacao_idade_procedimento(self, registros_processados):
+        """Ajusta o procedimento no próprio registro; devolve a mesma lista."""
         self._log_message_gui("Aplicando regra de verificação de idade nos registros deduplicados...")
-        registros_ajustados = []
-        
-        contador_alteracoes = 0
-
-        for registro in registros_processados:
-            registro_copia = registro.copy()
-            cod_proc_sigtap = registro_copia.get('prd_pa', '').strip()
-            data_nasc_obj = registro_copia.get('_data_nasc_obj')
-
-            if cod_proc_sigtap == '0301070300' and data_nasc_obj:
-                idade_paciente = self.calcular_idade(data_nasc_obj)
-                if idade_paciente < 18:
-                    self._log_message_gui(f"REGRA PÓS-DEDUPLICAÇÃO: Paciente com {idade_paciente} anos. Procedimento '0301070300' alterado para '0301010048'.")
-                    registro_copia['prd_pa'] = '0301010048'.ljust(10)
-                    
-                    contador_alteracoes += 1
-
-            registros_ajustados.append(registro_copia)
-        
-        self._log_message_gui(f"Verificação de idade concluída. Total de {contador_alteracoes} registros alterados (de '0301070300' para '0301010048').")
-        return registros_ajustados
+        regra_idade = RegraIdadeProcedimento()
+        for _ in regra_idade(registros_processados): pass
+        self._log_regra_idade(regra_idade)
+        return registros_processados
 
+    def _log_regra_idade(self, regra_idade):
+        self._log_message_gui(f"Verificação de idade concluída. Total de {regra_idade.alterados} registros alterados (de '0301070300' para '0301010048').")
+
+    def _deduplicar_lote(self, registros_processados, ids_vistos):
+        """Deduplicação incremental: ``ids_vistos`` é compartilhado entre os lotes de uma mesma consulta."""
+        return aplicar_etapas(registros_processados, [DeduplicacaoPorLancamento(ids_vistos)])
 
     def deduplicate_por_id_lancamento_original(self, registros_processados):
         self._log_message_gui(f"Iniciando deduplicação de {len(registros_processados)} registros...")
         if not registros_processados: return []
-        ids_vistos = set()
-        registros_finais = []
-        for registro in registros_processados:
-            id_original = registro.get('_id_lancamento_original')
-            if id_original is not None and id_original not in ids_vistos:
-                ids_vistos.add(id_original)
-                registros_finais.append(registro)
+        registros_finais = aplicar_etapas(registros_processados, [DeduplicacaoPorLancamento()])
         self._log_message_gui(f"Deduplicação concluída: {len(registros_finais)} registros únicos.")
         return registros_finais
 
-    def _atribuir_folha_sequencia_final(self, lista_registros_processados):
-        if not lista_registros_processados: return []
-        lista_registros_processados.sort(key=lambda r: (r.get('prd_cnsmed', ''), r.get('prd_dtaten', '')))
-        cns_atual, folha_atual, seq_atual = None, 0, 0
-        registros_numerados = []
-        for registro in lista_registros_processados:
-            if registro.get('prd_cnsmed') != cns_atual:
-                cns_atual = registro.get('prd_cnsmed')
-                folha_atual += 1
-                seq_atual = 1
-            else:
-                seq_atual += 1
-                if seq_atual > 99:
-                    folha_atual += 1
-                    seq_atual = 1
-            registro_copia = registro.copy()
-            registro_copia['prd_flh'] = str(folha_atual).zfill(3)
-            registro_copia['prd_seq'] = str(seq_atual).zfill(2)
-            registros_numerados.append(registro_copia)
-        return registros_numerados
+    def pos_processar_registros(self, registros_processados, deduplicar=True):
+        """
+        Deduplicação (opcional), regra de idade e numeração de folha/sequência em uma única
+        passada (ver shared/etapas_bpa.py); devolve a lista final, pronta para
+        ``gerar_arquivo_txt``. Não depende da GUI, só do ``gui_log_callback`` opcional.
+
+        Os registros chegam na ordem de numeração da consulta (``ORDEM_CONSULTA``); se não
+        vierem, a numeração da passada é descartada e refeita depois de ordenar.
+        """
+        etapas = []
+        if deduplicar:
+            self._log_message_gui(f"Iniciando deduplicação de {len(registros_processados)} registros...")
+            etapas.append(DeduplicacaoPorLancamento())
+        regra_idade, conferencia = RegraIdadeProcedimento(), ConferenciaOrdem()
+        registros_finais = aplicar_etapas(registros_processados, etapas + [regra_idade, conferencia, numerar_registros])
+
+        if deduplicar:
+            self._log_message_gui(f"Deduplicação concluída: {len(registros_finais)} registros únicos.")
+        self._log_regra_idade(regra_idade)
+        if not conferencia.ordenado:
+            self._atribuir_folha_sequencia_final(registros_finais)
+        return registros_finais
+
+    def _atribuir_folha_sequencia_final(self, registros_processados):
+        """
+        Numera folha/sequência no próprio registro (ver shared/numeracao_bpa.py). Uma lista
+        é conferida/ordenada no lugar e devolvida numerada; um iterador é ordenado em blocos
+        e devolvido como iterador, para seguir em fluxo até ``gerar_arquivo_txt``.
+        """
+        registros_ordenados = ordenar_para_numeracao(registros_processados)
+        if not isinstance(registros_processados, list):
+            return numerar_registros(registros_ordenados)
+        for _ in numerar_registros(registros_ordenados): pass
+        return registros_processados
 
     def gerar_arquivo_txt(self, competencia, registros_bpa, caminho_arquivo_base):
-        if not registros_bpa: return False
+        """
+        Grava o arquivo BPA. ``registros_bpa`` pode ser uma lista ou qualquer iterador de
+        registros já numerados (folha/sequência): as linhas são escritas em fluxo e o
+        cabeçalho, com os totais e o campo de controle acumulados na escrita, é preenchido
+        ao final (ver shared/arquivo_bpa.py).
+        """
+        registros_bpa = iter(registros_bpa)
+        primeiro = next(registros_bpa, None)
+        if primeiro is None: return False
         try:
-            num_linhas = len(registros_bpa)
-            num_folhas = 0
-            if registros_bpa:
-                num_folhas = int(registros_bpa[-1]['prd_flh'])
-
-            campo_controle = 1111 
-
-            header_dict = {
-                'cbc_hdr_1': '01', 'cbc_hdr_2': '#BPA#', 'cbc_mvm': competencia,
-                'cbc_lin': str(num_linhas).zfill(6), 'cbc_flh': str(num_folhas).zfill(6),
-                'cbc_smt_vrf': str(campo_controle).zfill(4),
-                'cbc_rsp': self.config.get('orgao_responsavel', '').ljust(30),
-                'cbc_sgl': self.config.get('sigla_orgao', '').ljust(6),
-                'cbc_cgccpf': self.config.get('cgc_cpf', '').zfill(14),
-                'cbc_dst': self.config.get('orgao_destino', '').ljust(40),
-                'cbc_dst_in': self.config.get('indicador_destino', 'M'),
-                'cbc_versao': self.config.get('versao_sistema', '').ljust(10),
-            }
-            
-            ordem_campos_bpa_i = [
-                'prd_ident', 'prd_cnes', 'prd_cmp', 'prd_cnsmed', 'prd_cbo', 'prd_dtaten', 
-                'prd_flh', 'prd_seq', 'prd_pa', 'prd_cnspac', 'prd_sexo', 'prd_ibge', 
-                'prd_cid', 'prd_ldade', 'prd_qt', 'prd_caten', 'prd_naut', 'prd_org', 
-                'prd_nmpac', 'prd_dtnasc', 'prd_raca', 'prd_etnia', 'prd_nac', 'prd_srv', 
-                'prd_clf', 'prd_equipe_Seq', 'prd_equipe_Area', 'prd_cnpj', 'prd_cep_pcnte',
-                'prd_lograd_pcnte', 'prd_end_pcnte', 'prd_compl_pcnte', 'prd_num_pcnte',
-                'prd_bairro_pcnte', 'prd_ddtel_pcnte', 'prd_email_pcnte', 'prd_ine',
-                'prd_cpf_pcnte', 'prd_situacao_rua'
-            ]
-
-            with open(caminho_arquivo_base, 'w', newline='', encoding='latin-1') as f:
-                linha_header_str = "".join(header_dict.values())
-                f.write(linha_header_str + '\r\n')
-                for reg_dict in registros_bpa:
-                    valores_ordenados = [str(reg_dict.get(k, '')) for k in ordem_campos_bpa_i]
-                    linha_reg_str = "".join(valores_ordenados)
-                    
-                    f.write(linha_reg_str.ljust(350)[:350] + '\r\n')
+            linhas = codificar_registros(itertools.chain([primeiro], registros_bpa))
+            escrever_arquivo_bpa(caminho_arquivo_base, functools.partial(self._cabecalho_bpa, competencia), linhas)
             return True
         except Exception as e:
             self._log_message_gui(f"Erro ao gerar arquivo TXT: {e}")
             return False
+
+    def _cabecalho_bpa(self, competencia, num_linhas, num_folhas, campo_controle):
+        # Os campos fixos (cbc_hdr_1/cbc_hdr_2) e o preenchimento dos ALFA vêm do layout
+        return {
+            'cbc_mvm': competencia,
+            'cbc_lin': str(num_linhas).zfill(6), 'cbc_flh': str(num_folhas).zfill(6),
+            'cbc_smt_vrf': str(campo_controle).zfill(4),
+            'cbc_rsp': self.config.get('orgao_responsavel', ''),
+            'cbc_sgl': self.config.get('sigla_orgao', ''),
+            'cbc_cgccpf': self.config.get('cgc_cpf', '').zfill(14),
+            'cbc_dst': self.config.get('orgao_destino', ''),
+            'cbc_dst_in': self.config.get('indicador_destino', 'M'),
+            'cbc_versao': self.config.get('versao_sistema', ''),
+        }
         
     def _escrever_log_mapeamentos_faltantes(self):
         if not self.mapeamentos_faltantes_log: return
@@ -530,7 +733,12 @@ class BPAExporter:
     def gerar_relatorio_excel(self, registros_finais, contadores_modalidade, caminho_arquivo):
         try:
             self._log_message_gui("Preparando dados para o relatório Excel...")
-            df_final = pd.DataFrame(registros_finais)
+            # Só as colunas usadas no relatório; aceita dicts e RegistroBPAI
+            colunas_relatorio = ['prd_ldade', 'prd_ibge', '_nm_profissional']
+            df_final = pd.DataFrame.from_records(
+                [tuple(registro.get(campo) for campo in colunas_relatorio) for registro in registros_finais],
+                columns=colunas_relatorio,
+            )
             
             df_modalidade = pd.DataFrame(list(contadores_modalidade.items()), columns=['Modalidade', 'Nº de Atendimentos (Brutos)'])
             df_modalidade = df_modalidade[df_modalidade['Nº de Atendimentos (Brutos)'] > 0].sort_values(by='Nº de Atendimentos (Brutos)', ascending=False)
@@ -635,6 +843,23 @@ class BPAExporterGUI:
         self.chk_deduplicacao = ttk.Checkbutton(self.frame_filtros, text="Aplicar Deduplicação (Recomendado)", variable=self.deduplicacao_var)
         self.chk_deduplicacao.grid(row=2, column=0, columnspan=2, padx=5, pady=5, sticky="w")
 
+        self.streaming_var = tk.BooleanVar(value=True)
+        self.chk_streaming = ttk.Checkbutton(self.frame_filtros, text="Consultar em Lotes (Menor Uso de Memória)", variable=self.streaming_var)
+        self.chk_streaming.grid(row=2, column=2, columnspan=3, padx=5, pady=5, sticky="w")
+
+        self.vetorizado_var = tk.BooleanVar(value=False)
+        self.chk_vetorizado = ttk.Checkbutton(self.frame_filtros, text="Montagem Vetorizada (Mais Rápida)", variable=self.vetorizado_var)
+        self.chk_vetorizado.grid(row=3, column=0, columnspan=2, padx=5, pady=5, sticky="w")
+
+        self.dedup_banco_var = tk.BooleanVar(value=False)
+        self.chk_dedup_banco = ttk.Checkbutton(self.frame_filtros, text="Deduplicar no Banco (DISTINCT ON)", variable=self.dedup_banco_var)
+        self.chk_dedup_banco.grid(row=3, column=2, columnspan=3, padx=5, pady=5, sticky="w")
+
+        ttk.Label(self.frame_filtros, text="Extração Paralela:").grid(row=4, column=0, padx=5, pady=3, sticky="w")
+        self.particao_combo = ttk.Combobox(self.frame_filtros, values=list(OPCOES_PARTICAO), width=15, state="readonly")
+        self.particao_combo.current(0)
+        self.particao_combo.grid(row=4, column=1, padx=5, pady=3, sticky="w")
+
 
     def _criar_widgets_config(self):
         bpa_config_fields = [ ("Órgão Responsável:", "orgao_resp_entry", self.exporter.config['orgao_responsavel'], 35), ("Sigla Órgão:", "sigla_orgao_entry", self.exporter.config['sigla_orgao'], 8), ("CNPJ/CPF Estab.:", "cgc_cpf_entry", self.exporter.config['cgc_cpf'], 18), ("Órgão Destino:", "orgao_destino_entry", self.exporter.config['orgao_destino'], 35), ("Indicador Destino (M/E):", "indicador_destino_combo", ["M", "E"], 5), ("Versão Sistema BPA:", "versao_sistema_entry", self.exporter.config['versao_sistema'], 10), ("CNES Estabelecimento:", "cnes_entry", self.exporter.config['cnes'], 10) ]
@@ -714,29 +939,39 @@ class BPAExporterGUI:
             criterio_interno = map_criterio.get(self.criterio_data_combo.get())
             
             aplicar_dedup = self.deduplicacao_var.get()
+            usar_streaming = self.streaming_var.get()
+            usar_vetorizado = self.vetorizado_var.get()
+            dedup_no_banco = aplicar_dedup and self.dedup_banco_var.get()
+            particao = OPCOES_PARTICAO.get(self.particao_combo.get())
             
             self._atualizar_config_exporter()
 
-            registros_processados_sem_num, contadores, total_apac = self.exporter.consultar_dados_completo(
-                data_inicio_val, data_fim_val, competencia_val, criterio_interno
+            registros_processados_sem_num, contadores, total_apac, total_bpa = self.exporter.consultar_dados_completo(
+                data_inicio_val, data_fim_val, competencia_val, criterio_interno,
+                streaming=usar_streaming, deduplicar=aplicar_dedup and usar_streaming, vetorizado=usar_vetorizado,
+                dedup_no_banco=dedup_no_banco, particao=particao,
             )
             
             self.contadores_para_indicadores = contadores
-            self.lbl_total_bpa_valor.config(text=str(len(registros_processados_sem_num)))
+            # Antes da deduplicação, com ou sem streaming
+            self.lbl_total_bpa_valor.config(text=str(total_bpa))
             self.lbl_total_apac_valor.config(text=str(total_apac))
             
             if registros_processados_sem_num:
                 
-                registros_para_processamento_final = registros_processados_sem_num
-                if aplicar_dedup:
+                if dedup_no_banco:
+                    self._log_message("Deduplicação aplicada no banco de dados.")
+                elif aplicar_dedup and usar_streaming:
+                    self._log_message("Deduplicação aplicada durante a consulta em lotes.")
+                elif aplicar_dedup:
                     self._log_message("Aplicando deduplicação...")
-                    registros_para_processamento_final = self.exporter.deduplicate_por_id_lancamento_original(registros_processados_sem_num)
                 else:
                     self._log_message("AVISO: Deduplicação desativada. Todos os registros brutos (pós-filtro APAC) serão processados.")
 
-                registros_verificados = self.exporter.aplicar_verificacao_idade_procedimento(registros_para_processamento_final)
-
-                self.registros_bpa_processados = self.exporter._atribuir_folha_sequencia_final(registros_verificados)
+                # Deduplicação, regra de idade e numeração em uma única passada
+                self.registros_bpa_processados = self.exporter.pos_processar_registros(
+                    registros_processados_sem_num, deduplicar=aplicar_dedup and not usar_streaming and not dedup_no_banco
+                )
                 
                 self.lbl_total_registros_valor.config(text=str(len(self.registros_bpa_processados)))
                 
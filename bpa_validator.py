@@ -10,72 +10,222 @@ import sys
 import argparse
 import re
 import datetime
+import json
 import math
+import mmap
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from html import escape
+from itertools import groupby
+from operator import itemgetter
 from colorama import init, Fore, Style
 
+from shared.arquivo_bpa import ENCODING, campo_controle, dividir_em_trechos, ler_cabecalho_bpa, ler_linhas_bpa, valor_controle
+from shared.layouts import LAYOUT_BPA_HEADER, LAYOUT_BPA_I, NUM
+
 # Inicializar colorama para saída colorida no terminal
 init()
 
+
+def regras_validacao(layout):
+    """Converte um layout de shared/layouts.py nas regras do validador (posições base 1)."""
+    regras = {}
+    for campo in layout.campos:
+        inicio, fim = layout.posicoes[campo.nome]
+        regra = {'inicio': inicio + 1, 'fim': fim, 'tipo': campo.tipo, 'obrigatorio': campo.obrigatorio}
+        if campo.valor is not None:
+            regra['valor'] = campo.valor
+        elif campo.valores:
+            regra['valores'] = campo.valores
+        elif campo.tipo == NUM:
+            regra['pattern'] = rf'^\d{{{campo.tamanho}}}$'
+        else:
+            regra['tamanho'] = campo.tamanho
+        regras[campo.nome] = regra
+    return regras
+
+
+def compilar_verificacoes(regras):
+    """
+    Compila as regras de ``regras_validacao`` numa lista plana de ``(campo, inicio, fim,
+    obrigatorio, regra, aceita)``: posições base 0 para fatiar a linha e ``aceita(valor)``,
+    com o padrão já compilado, que diz se um valor não vazio passa na regra.
+    """
+    verificacoes = []
+    for campo, config in regras.items():
+        if 'valor' in config:
+            regra, aceita = 'valor', config['valor'].__eq__
+        elif 'valores' in config:
+            regra, aceita = 'valores', frozenset(config['valores']).__contains__
+        elif 'pattern' in config:
+            padrao = re.compile(config['pattern']).match
+            regra, aceita = 'pattern', lambda valor, padrao=padrao: padrao(valor.strip()) is not None
+        else:
+            tamanho = config['tamanho']
+            regra, aceita = 'tamanho', lambda valor, tamanho=tamanho: len(valor.rstrip()) <= tamanho
+        verificacoes.append((campo, config['inicio'] - 1, config['fim'], config['obrigatorio'], regra, aceita))
+    return verificacoes
+
+
+# Equivalentes de \s e \d (de str, como em str.strip()) para padrões de bytes latin-1: em
+# bytes, \s só reconhece os espaços ASCII, e \xa0, \x85 e \x1c-\x1f ficariam de fora
+ESPACO_LATIN1 = '[' + ''.join(re.escape(chr(c)) for c in range(256) if chr(c).isspace()) + ']'
+DIGITO_LATIN1 = '[0-9]'
+
+
+def _padrao_campo(config, largura, binario=False):
+    """Trecho da expressão de ``regex_registro_valido`` para um campo de ``largura`` caracteres."""
+    espaco, digito = (ESPACO_LATIN1, DIGITO_LATIN1) if binario else (r'\s', r'\d')
+    vazio = f"{espaco}{{{largura}}}"
+    valores = [config['valor']] if 'valor' in config else config.get('valores')
+    # aceita_vazio: o padrão também casa com um campo em branco
+    if valores is not None:
+        alternativas = [valor for valor in valores if len(valor) == largura]
+        padrao = f"(?:{'|'.join(map(re.escape, alternativas))})" if alternativas else '(?!)'
+        aceita_vazio = any(not valor.strip() for valor in alternativas)
+    elif config.get('pattern') == rf'^\d{{{largura}}}$':
+        padrao, aceita_vazio = f"{digito}{{{largura}}}", False
+    elif config.get('tamanho', 0) >= largura:
+        padrao, aceita_vazio = f".{{{largura}}}", True
+        if not config['obrigatorio']: return padrao
+    else:
+        # Sem tradução exata: nunca casa, e a linha vai para a verificação campo a campo
+        padrao, aceita_vazio = '(?!)', False
+    if config['obrigatorio']:
+        return f"(?!{vazio}){padrao}" if aceita_vazio else padrao
+    return f"(?:{vazio}|{padrao})"
+
+
+def _compilar(padrao, binario):
+    return re.compile(padrao.encode(ENCODING) if binario else padrao, re.DOTALL)
+
+
+def regex_registro_valido(regras, binario=False):
+    """
+    Expressão regular da linha inteira que só casa com linhas sem nenhuma falha nas
+    ``regras`` (caminho rápido do validador): uma busca por linha em vez de uma por campo.
+    Com ``binario``, um padrão de bytes latin-1 equivalente.
+    """
+    partes, posicao = [], 0
+    for config in sorted(regras.values(), key=lambda config: config['inicio']):
+        inicio, largura = config['inicio'] - 1, config['fim'] - config['inicio'] + 1
+        if inicio > posicao: partes.append(f".{{{inicio - posicao}}}")
+        partes.append(_padrao_campo(config, largura, binario))
+        posicao = inicio + largura
+    return _compilar(''.join(partes), binario)
+
+
+def padroes_campos(regras, binario=False):
+    """Expressão de cada campo, na ordem de ``regras``: só casa com valores sem falha."""
+    return [
+        _compilar(_padrao_campo(config, config['fim'] - config['inicio'] + 1, binario), binario)
+        for config in regras.values()
+    ]
+
+
+# Exemplos guardados por regra na validação em fluxo
+EXEMPLOS_POR_REGRA = 5
+# Trechos menores que isso (bytes) não compensam um processo do --jobs
+TAMANHO_MINIMO_TRECHO = 4 << 20
+
+# Leitura dos registros: linhas decodificadas (texto) ou bytes do arquivo mapeado (mmap)
+LEITURA_TEXTO = 'texto'
+LEITURA_MMAP = 'mmap'
+# Campos da soma de controle (ver shared.arquivo_bpa.valor_controle)
+_INICIO_PA, _FIM_PA = LAYOUT_BPA_I.posicoes['prd_pa']
+_INICIO_QT, _FIM_QT = LAYOUT_BPA_I.posicoes['prd_qt']
+
+
+class ResumoValidacao:
+    """
+    Erros dos registros agregados por regra (campo + verificação): o total de cada uma e
+    só os ``max_exemplos`` primeiros exemplos (linha, valor); ``None`` guarda todos. A
+    memória depende do número de regras do layout, não do tamanho do arquivo.
+    """
+
+    def __init__(self, max_exemplos=EXEMPLOS_POR_REGRA):
+        self.max_exemplos = max_exemplos
+        self.contagem = {}  # (campo, regra) -> total
+        self.exemplos = {}  # (campo, regra) -> [(num_linha, valor)]
+        self.total = 0
+
+    def registrar(self, campo, regra, num_linha, valor):
+        chave = (campo, regra)
+        total = self.contagem.get(chave, 0) + 1
+        self.contagem[chave] = total
+        self.total += 1
+        if self.max_exemplos is None or total <= self.max_exemplos:
+            self.exemplos.setdefault(chave, []).append((num_linha, valor))
+
+    def incorporar(self, outro, deslocamento=0):
+        """
+        Soma o resumo de um trecho posterior do arquivo, com as linhas dele deslocadas de
+        ``deslocamento``; os exemplos continuam sendo os primeiros do arquivo.
+        """
+        for chave, total in outro.contagem.items():
+            self.contagem[chave] = self.contagem.get(chave, 0) + total
+            exemplos = outro.exemplos.get(chave, [])
+            if self.max_exemplos is not None:
+                exemplos = exemplos[:self.max_exemplos - len(self.exemplos.get(chave, []))]
+            if exemplos:
+                self.exemplos.setdefault(chave, []).extend((num_linha + deslocamento, valor) for num_linha, valor in exemplos)
+        self.total += outro.total
+
+    def falhas_por_linha(self, ordem_campos):
+        """
+        Exemplos guardados agrupados por linha, ``(num_linha, [(campo, regra, valor)])``, na
+        ordem do arquivo e, dentro da linha, na dos campos (``ordem_campos``: campo -> posição).
+        """
+        falhas = sorted(
+            ((num_linha, ordem_campos.get(campo, -1), campo, regra, valor)
+             for (campo, regra), exemplos in self.exemplos.items()
+             for num_linha, valor in exemplos),
+            key=itemgetter(0, 1),
+        )
+        for num_linha, grupo in groupby(falhas, key=itemgetter(0)):
+            yield num_linha, [(campo, regra, valor) for _, _, campo, regra, valor in grupo]
+
+    def por_frequencia(self):
+        """``((campo, regra), total)`` da regra mais frequente para a menos (empates na ordem em que apareceram)."""
+        return sorted(self.contagem.items(), key=lambda item: -item[1])
+
+
+class ResultadoTrecho:
+    """Totais da validação de um trecho do arquivo (``BPAValidator.validar_trecho``)."""
+
+    def __init__(self, max_exemplos=None):
+        self.num_linhas = 0
+        self.total_registros = 0
+        self.registros_validos = 0
+        self.soma_controle = 0
+        self.resumo = ResumoValidacao(max_exemplos)
+
+
+def _validar_trecho(opcoes, *argumentos):
+    """``validar_trecho`` num processo do pool (as verificações compiladas não são serializáveis)."""
+    return BPAValidator(**opcoes).validar_trecho(*argumentos)
+
+
 class BPAValidator:
-    def __init__(self):
-        # Definição do layout do header
-        self.header_layout = {
-            'cbc_hdr_1': {'inicio': 1, 'fim': 2, 'tipo': 'NUM', 'valor': '01', 'obrigatorio': True},
-            'cbc_hdr_2': {'inicio': 3, 'fim': 7, 'tipo': 'ALFA', 'valor': '#BPA#', 'obrigatorio': True},
-            'cbc_mvm': {'inicio': 8, 'fim': 13, 'tipo': 'NUM', 'pattern': r'^\d{6}$', 'obrigatorio': True},
-            'cbc_lin': {'inicio': 14, 'fim': 19, 'tipo': 'NUM', 'pattern': r'^\d{6}$', 'obrigatorio': True},
-            'cbc_flh': {'inicio': 20, 'fim': 25, 'tipo': 'NUM', 'pattern': r'^\d{6}$', 'obrigatorio': True},
-            'cbc_smt_vrf': {'inicio': 26, 'fim': 29, 'tipo': 'NUM', 'pattern': r'^\d{4}$', 'obrigatorio': True},
-            'cbc_rsp': {'inicio': 30, 'fim': 59, 'tipo': 'ALFA', 'tamanho': 30, 'obrigatorio': True},
-            'cbc_sgl': {'inicio': 60, 'fim': 65, 'tipo': 'ALFA', 'tamanho': 6, 'obrigatorio': True},
-            'cbc_cgccpf': {'inicio': 66, 'fim': 79, 'tipo': 'NUM', 'pattern': r'^\d{14}$', 'obrigatorio': True},
-            'cbc_dst': {'inicio': 80, 'fim': 119, 'tipo': 'ALFA', 'tamanho': 40, 'obrigatorio': True},
-            'cbc_dst_in': {'inicio': 120, 'fim': 120, 'tipo': 'ALFA', 'valores': ['M', 'E'], 'obrigatorio': True},
-            'cbc_versao': {'inicio': 121, 'fim': 130, 'tipo': 'ALFA', 'tamanho': 10, 'obrigatorio': True}
-        }
-        
-        # Definição do layout do registro BPA-I
-        self.registro_bpa_i_layout = {
-            'prd_ident': {'inicio': 1, 'fim': 2, 'tipo': 'NUM', 'valor': '03', 'obrigatorio': True},
-            'prd_cnes': {'inicio': 3, 'fim': 9, 'tipo': 'NUM', 'pattern': r'^\d{7}$', 'obrigatorio': True},
-            'prd_cmp': {'inicio': 10, 'fim': 15, 'tipo': 'NUM', 'pattern': r'^\d{6}', 'obrigatorio': True},
-            'prd_cnsmed': {'inicio': 16, 'fim': 30, 'tipo': 'NUM', 'pattern': r'^\d{15}', 'obrigatorio': True},
-            'prd_cbo': {'inicio': 31, 'fim': 36, 'tipo': 'ALFA', 'tamanho': 6, 'obrigatorio': True},
-            'prd_dtaten': {'inicio': 37, 'fim': 44, 'tipo': 'NUM', 'pattern': r'^\d{8}', 'obrigatorio': True},
-            'prd_flh': {'inicio': 45, 'fim': 47, 'tipo': 'NUM', 'pattern': r'^\d{3}', 'obrigatorio': True},
-            'prd_seq': {'inicio': 48, 'fim': 49, 'tipo': 'NUM', 'pattern': r'^\d{2}', 'obrigatorio': True},
-            'prd_pa': {'inicio': 50, 'fim': 59, 'tipo': 'NUM', 'pattern': r'^\d{10}', 'obrigatorio': True},
-            'prd_cnspac': {'inicio': 60, 'fim': 74, 'tipo': 'NUM', 'pattern': r'^\d{15}', 'obrigatorio': False},
-            'prd_sexo': {'inicio': 75, 'fim': 75, 'tipo': 'ALFA', 'valores': ['M', 'F'], 'obrigatorio': True},
-            'prd_ibge': {'inicio': 76, 'fim': 81, 'tipo': 'NUM', 'pattern': r'^\d{6}', 'obrigatorio': False},
-            'prd_cid': {'inicio': 82, 'fim': 85, 'tipo': 'ALFA', 'tamanho': 4, 'obrigatorio': True},
-            'prd_ldade': {'inicio': 86, 'fim': 88, 'tipo': 'NUM', 'pattern': r'^\d{3}', 'obrigatorio': True},
-            'prd_qt': {'inicio': 89, 'fim': 94, 'tipo': 'NUM', 'pattern': r'^\d{6}', 'obrigatorio': True},
-            'prd_caten': {'inicio': 95, 'fim': 96, 'tipo': 'NUM', 'pattern': r'^\d{2}', 'obrigatorio': False},
-            'prd_naut': {'inicio': 97, 'fim': 109, 'tipo': 'NUM', 'pattern': r'^\d{13}', 'obrigatorio': False},
-            'prd_org': {'inicio': 110, 'fim': 112, 'tipo': 'ALFA', 'valor': 'BPA', 'obrigatorio': True},
-            'prd_nmpac': {'inicio': 113, 'fim': 142, 'tipo': 'ALFA', 'tamanho': 30, 'obrigatorio': True},
-            'prd_dtnasc': {'inicio': 143, 'fim': 150, 'tipo': 'NUM', 'pattern': r'^\d{8}', 'obrigatorio': True},
-            'prd_raca': {'inicio': 151, 'fim': 152, 'tipo': 'NUM', 'pattern': r'^\d{2}', 'obrigatorio': True},
-            'prd_etnia': {'inicio': 153, 'fim': 156, 'tipo': 'NUM', 'pattern': r'^\d{4}', 'obrigatorio': False},
-            'prd_nac': {'inicio': 157, 'fim': 159, 'tipo': 'NUM', 'pattern': r'^\d{3}', 'obrigatorio': False},
-            'prd_srv': {'inicio': 160, 'fim': 162, 'tipo': 'NUM', 'pattern': r'^\d{3}', 'obrigatorio': False},
-            'prd_clf': {'inicio': 163, 'fim': 165, 'tipo': 'NUM', 'pattern': r'^\d{3}', 'obrigatorio': False},
-            'prd_equipe_Seq': {'inicio': 166, 'fim': 173, 'tipo': 'NUM', 'pattern': r'^\d{8}', 'obrigatorio': False},
-            'prd_equipe_Area': {'inicio': 174, 'fim': 177, 'tipo': 'NUM', 'pattern': r'^\d{4}', 'obrigatorio': False},
-            'prd_cnpj': {'inicio': 178, 'fim': 191, 'tipo': 'NUM', 'pattern': r'^\d{14}', 'obrigatorio': False},
-            'prd_cep_pcnte': {'inicio': 192, 'fim': 199, 'tipo': 'NUM', 'pattern': r'^\d{8}', 'obrigatorio': False},
-            'prd_lograd_pcnte': {'inicio': 200, 'fim': 202, 'tipo': 'NUM', 'pattern': r'^\d{3}', 'obrigatorio': False},
-            'prd_end_pcnte': {'inicio': 203, 'fim': 232, 'tipo': 'ALFA', 'tamanho': 30, 'obrigatorio': False},
-            'prd_compl_pcnte': {'inicio': 233, 'fim': 242, 'tipo': 'ALFA', 'tamanho': 10, 'obrigatorio': False},
-            'prd_num_pcnte': {'inicio': 243, 'fim': 247, 'tipo': 'ALFA', 'tamanho': 5, 'obrigatorio': False},
-            'prd_bairro_pcnte': {'inicio': 248, 'fim': 277, 'tipo': 'ALFA', 'tamanho': 30, 'obrigatorio': False},
-            'prd_ddtel_pcnte': {'inicio': 278, 'fim': 288, 'tipo': 'NUM', 'pattern': r'^\d{11}', 'obrigatorio': False},
-            'prd_email_pcnte': {'inicio': 289, 'fim': 328, 'tipo': 'ALFA', 'tamanho': 40, 'obrigatorio': False},
-            'prd_ine': {'inicio': 329, 'fim': 338, 'tipo': 'NUM', 'pattern': r'^\d{10}', 'obrigatorio': True},
-            'prd_cpf_pcnte': {'inicio': 339, 'fim': 349, 'tipo': 'NUM', 'pattern': r'^\d{11}', 'obrigatorio': False},
-            'prd_situacao_rua': {'inicio': 350, 'fim': 350, 'tipo': 'ALFA', 'valores': ['N', 'S'], 'obrigatorio': False}
-        }
+    def __init__(self, caminho_rapido=True, leitura=LEITURA_TEXTO):
+        # Regras de validação derivadas dos layouts compartilhados com o exportador
+        self.header_layout = regras_validacao(LAYOUT_BPA_HEADER)
+        self.registro_bpa_i_layout = regras_validacao(LAYOUT_BPA_I)
+        # Compiladas uma vez: verificações campo a campo e a expressão da linha inteira
+        self._verificacoes = compilar_verificacoes(self.registro_bpa_i_layout)
+        self._ordem_campos = {campo: posicao for posicao, campo in enumerate(self.registro_bpa_i_layout)}
+        self._registro_valido = regex_registro_valido(self.registro_bpa_i_layout).match
+        # As mesmas regras em padrões de bytes, para a leitura com mmap
+        self._registro_valido_bytes = regex_registro_valido(self.registro_bpa_i_layout, binario=True).match
+        self._campos_validos_bytes = [padrao.match for padrao in padroes_campos(self.registro_bpa_i_layout, binario=True)]
+        self.caminho_rapido = caminho_rapido
+        self.leitura = leitura
+        # Última validação (ver eventos_validacao)
+        self.arquivo_validado = None
+        self.competencia = None
+        self.validado_em = None
+        self.resumo = ResumoValidacao()
+        self.erros_arquivo = []
         
         # Estatísticas de validação
         self.stats = {
@@ -95,10 +245,9 @@ class BPAValidator:
             return False, erros
             
         # Validar cada campo do cabeçalho
+        valores = LAYOUT_BPA_HEADER.fatiar(linha)
         for campo, config in self.header_layout.items():
-            inicio = config['inicio'] - 1  # Ajustar para índice base 0
-            fim = config['fim']
-            valor_campo = linha[inicio:fim]
+            valor_campo = valores[campo]
             
             # Verificar valor fixo
             if 'valor' in config:
@@ -122,139 +271,300 @@ class BPAValidator:
         
         return len(erros) == 0, erros
 
-    def validar_registro_bpa_i(self, linha, num_linha):
-        """Valida um registro BPA-I"""
-        erros = []
-        
-        # Verificar tamanho mínimo da linha
+    def _falhas_registro(self, linha):
+        """
+        Falhas de uma linha BPA-I, como tuplas ``(campo, regra, valor)``; ``regra`` é a
+        verificação que falhou ('obrigatorio', 'valor', 'valores', 'pattern', 'tamanho', ou
+        'tamanho_linha' para a linha curta, com o tamanho dela no lugar do valor).
+        """
         if len(linha) < 350:
-            erros.append(f"Linha {num_linha}: Tamanho inválido: {len(linha)}, esperado 350 caracteres")
-            return False, erros
-            
-        # Validar cada campo do registro
-        for campo, config in self.registro_bpa_i_layout.items():
-            inicio = config['inicio'] - 1  # Ajustar para índice base 0
-            fim = config['fim']
-            
-            # Garantir que a linha tenha comprimento suficiente
-            if len(linha) < fim:
-                erros.append(f"Linha {num_linha}: Tamanho insuficiente para o campo {campo}")
-                continue
-                
+            return [('linha', 'tamanho_linha', len(linha))]
+        # Caminho rápido: a linha inteira contra uma só expressão
+        if self.caminho_rapido and self._registro_valido(linha):
+            return []
+
+        falhas = []
+        for campo, inicio, fim, obrigatorio, regra, aceita in self._verificacoes:
             valor_campo = linha[inicio:fim]
-            
-            # Verificar campo obrigatório
-            if config['obrigatorio']:
-                if valor_campo.strip() == '':
-                    erros.append(f"Linha {num_linha}: Campo obrigatório {campo} está vazio")
-                    continue
-            
-            # Se o campo não é obrigatório e está vazio, pular validações adicionais
-            if not config['obrigatorio'] and valor_campo.strip() == '':
+            # Campo vazio: erro se obrigatório, senão dispensa as demais validações
+            if not valor_campo.strip():
+                if obrigatorio:
+                    falhas.append((campo, 'obrigatorio', valor_campo))
+            elif not aceita(valor_campo):
+                falhas.append((campo, regra, valor_campo))
+        return falhas
+
+    def mensagem_falha(self, num_linha, campo, regra, valor):
+        """Texto do erro de uma falha de ``_falhas_registro`` na linha ``num_linha``"""
+        if regra == 'tamanho_linha':
+            return f"Linha {num_linha}: Tamanho inválido: {valor}, esperado 350 caracteres"
+        if regra == 'obrigatorio':
+            return f"Linha {num_linha}: Campo obrigatório {campo} está vazio"
+        config = self.registro_bpa_i_layout[campo]
+        if regra == 'valor':
+            return f"Linha {num_linha}, Campo {campo}: valor '{valor}' não corresponde ao esperado '{config['valor']}'"
+        if regra == 'valores':
+            return f"Linha {num_linha}, Campo {campo}: valor '{valor}' não está entre os valores permitidos {config['valores']}"
+        if regra == 'pattern':
+            return f"Linha {num_linha}, Campo {campo}: valor '{valor}' não corresponde ao padrão esperado"
+        return f"Linha {num_linha}, Campo {campo}: tamanho do valor excede o limite de {config['tamanho']} caracteres"
+
+    def validar_registro_bpa_i(self, linha, num_linha):
+        """Valida um registro BPA-I (linha do arquivo, ou registro do exportador: dict ou RegistroBPAI)"""
+        if not isinstance(linha, str):
+            linha = LAYOUT_BPA_I.formatar_registro(linha)
+        falhas = self._falhas_registro(linha)
+        return not falhas, [self.mensagem_falha(num_linha, *falha) for falha in falhas]
+
+    def validar_trecho(self, caminho_arquivo, inicio, fim=None, max_exemplos=None):
+        """
+        Valida os registros BPA-I entre os bytes ``inicio`` e ``fim`` do arquivo (limites de
+        linha, ver ``dividir_em_trechos``). As linhas do resultado são contadas a partir do
+        início do trecho (0); com ``max_exemplos=None`` o resumo guarda todas as falhas.
+        """
+        resultado = ResultadoTrecho(max_exemplos)
+        if self.leitura == LEITURA_MMAP:
+            return self._validar_trecho_mmap(caminho_arquivo, inicio, fim, resultado)
+        resumo = resultado.resumo
+        num_linhas = total = validos = soma = 0
+        for num_linhas, linha in enumerate(ler_linhas_bpa(caminho_arquivo, inicio=inicio, fim=fim), 1):
+            # Só registros BPA-I (começam com '03')
+            if linha[:2] != '03': continue
+            total += 1
+            soma += valor_controle(linha)
+            falhas = self._falhas_registro(linha)
+            if not falhas:
+                validos += 1
                 continue
-            
-            # Verificar valor fixo
-            if 'valor' in config:
-                if valor_campo != config['valor']:
-                    erros.append(f"Linha {num_linha}, Campo {campo}: valor '{valor_campo}' não corresponde ao esperado '{config['valor']}'")
-            
-            # Verificar valores permitidos
-            elif 'valores' in config:
-                if valor_campo not in config['valores']:
-                    erros.append(f"Linha {num_linha}, Campo {campo}: valor '{valor_campo}' não está entre os valores permitidos {config['valores']}")
-            
-            # Verificar padrão regex
-            elif 'pattern' in config:
-                if not re.match(config['pattern'], valor_campo.strip()):
-                    erros.append(f"Linha {num_linha}, Campo {campo}: valor '{valor_campo}' não corresponde ao padrão esperado")
-            
-            # Verificar tamanho específico
-            elif 'tamanho' in config:
-                if len(valor_campo.rstrip()) > config['tamanho']:
-                    erros.append(f"Linha {num_linha}, Campo {campo}: tamanho do valor excede o limite de {config['tamanho']} caracteres")
-        
-        return len(erros) == 0, erros
+            for campo, regra, valor in falhas:
+                resumo.registrar(campo, regra, num_linhas - 1, valor)
+
+        resultado.num_linhas = num_linhas
+        resultado.total_registros, resultado.registros_validos = total, validos
+        resultado.soma_controle = soma
+        return resultado
+
+    def _validar_trecho_mmap(self, caminho_arquivo, inicio, fim, resultado):
+        """
+        ``validar_trecho`` sobre o arquivo mapeado em memória: as linhas são achadas com
+        ``find`` e validadas direto nos bytes do mapa (as expressões recebem o mapa com os
+        limites da linha, sem cópia). Só os campos com falha, e os dois da soma de controle,
+        são copiados e decodificados.
+        """
+        resumo = resultado.resumo
+        num_linhas = total = validos = soma = 0
+        tamanho = os.path.getsize(caminho_arquivo)
+        fim = tamanho if fim is None else min(fim, tamanho)
+        if inicio >= fim: return resultado
+
+        with open(caminho_arquivo, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as dados:
+            buscar = dados.find
+            registro_valido = self._registro_valido_bytes if self.caminho_rapido else None
+            verificacoes = list(zip(self._verificacoes, self._campos_validos_bytes))
+            proxima = inicio
+            while proxima < fim:
+                linha = proxima
+                final = buscar(b'\n', linha, fim)
+                proxima = fim if final < 0 else final + 1
+                final = fim if final < 0 else final
+                while final > linha and dados[final - 1] == 13:  # '\r'
+                    final -= 1
+                num_linhas += 1
 
-    def validar_arquivo(self, caminho_arquivo):
-        """Valida um arquivo BPA-I completo"""
+                # Só registros BPA-I (começam com '03')
+                if final - linha < 2 or dados[linha] != 48 or dados[linha + 1] != 51: continue
+                total += 1
+                try:
+                    soma += int(dados[linha + _INICIO_PA:min(linha + _FIM_PA, final)]) + int(dados[linha + _INICIO_QT:min(linha + _FIM_QT, final)])
+                except ValueError:
+                    # int() de str aceita também os espaços de latin-1, que o de bytes recusa
+                    soma += valor_controle(dados[linha:final].decode(ENCODING))
+
+                if final - linha < 350:
+                    falhas = [('linha', 'tamanho_linha', final - linha)]
+                elif registro_valido and registro_valido(dados, linha, final):
+                    validos += 1
+                    continue
+                else:
+                    falhas = []
+                    for (campo, inicio_campo, fim_campo, obrigatorio, regra, aceita), campo_valido in verificacoes:
+                        if campo_valido(dados, linha + inicio_campo, linha + fim_campo): continue
+                        valor_campo = dados[linha + inicio_campo:linha + fim_campo].decode(ENCODING)
+                        if not valor_campo.strip():
+                            if obrigatorio:
+                                falhas.append((campo, 'obrigatorio', valor_campo))
+                        elif not aceita(valor_campo):
+                            falhas.append((campo, regra, valor_campo))
+                    if not falhas:
+                        validos += 1
+                        continue
+
+                for campo, regra, valor in falhas:
+                    resumo.registrar(campo, regra, num_linhas - 1, valor)
+
+        resultado.num_linhas = num_linhas
+        resultado.total_registros, resultado.registros_validos = total, validos
+        resultado.soma_controle = soma
+        return resultado
+
+    def submeter_trechos(self, executor, caminho_arquivo, partes, streaming=False, max_exemplos=EXEMPLOS_POR_REGRA):
+        """
+        Agenda no ``executor`` (um pool de processos) a validação dos registros do arquivo em
+        até ``partes`` trechos de linhas inteiras; devolve os futuros, na ordem do arquivo.
+        """
+        _, fim_cabecalho = ler_cabecalho_bpa(caminho_arquivo)
+        return [
+            executor.submit(_validar_trecho, {'caminho_rapido': self.caminho_rapido, 'leitura': self.leitura}, caminho_arquivo, inicio, fim,
+                            max_exemplos if streaming else None)
+            for inicio, fim in dividir_em_trechos(caminho_arquivo, partes, fim_cabecalho, TAMANHO_MINIMO_TRECHO)
+        ]
+
+    def validar_arquivos(self, caminhos, jobs=1, ao_validar=None, **opcoes):
+        """
+        Valida vários arquivos, na ordem, e devolve ``[(caminho, valido, stats)]``. Com
+        ``jobs > 1`` os trechos de todos os arquivos vão de uma vez para o mesmo pool, então
+        arquivos pequenos também são validados ao mesmo tempo; a saída é a da validação serial.
+        ``ao_validar(caminho, valido)`` é chamada logo após cada arquivo, enquanto o resultado
+        dele ainda está no validador (ex.: para gerar os relatórios sem validar de novo).
+        """
+        def validar(caminho, trechos=None):
+            valido = self.validar_arquivo(caminho, trechos=trechos, **opcoes)
+            if ao_validar: ao_validar(caminho, valido)
+            return caminho, valido, self.stats
+
+        if jobs <= 1:
+            return [validar(caminho) for caminho in caminhos]
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            trechos = [self.submeter_trechos(executor, caminho, jobs, **opcoes) for caminho in caminhos]
+            return [validar(caminho, trechos_arquivo) for caminho, trechos_arquivo in zip(caminhos, trechos)]
+
+    def validar_arquivo(self, caminho_arquivo, streaming=False, max_exemplos=EXEMPLOS_POR_REGRA, jobs=1, trechos=None):
+        """
+        Valida um arquivo BPA-I completo, lido em blocos (``ler_linhas_bpa``) e validado em
+        trechos de ``TAMANHO_MINIMO_TRECHO``: as falhas de cada linha ficam só no resumo
+        (``ResumoValidacao``, com todos os exemplos) e são impressas ao fim de cada trecho.
+
+        Com ``streaming=True`` a memória fica constante qualquer que seja o tamanho do
+        arquivo: os erros dos registros são só contados por regra (``ResumoValidacao``),
+        guardando os ``max_exemplos`` primeiros de cada uma, e nada é impresso por linha.
+
+        Com ``jobs > 1`` os registros são validados em trechos num pool de processos
+        (``trechos``: futuros já agendados com ``submeter_trechos``); os resultados dos
+        trechos são somados na ordem do arquivo, com a mesma saída da validação serial.
+        """
         try:
             print(f"\n{Fore.BLUE}Validando arquivo: {caminho_arquivo}{Style.RESET_ALL}")
-            
+
+            resumo = ResumoValidacao(max_exemplos if streaming else None)
             # Resetar estatísticas
             self.stats = {
                 'total_registros': 0,
                 'registros_validos': 0,
                 'registros_invalidos': 0,
-                'erros': []
+                'erros': [],
+                'total_erros': 0,
+                'erros_por_regra': {}
             }
-            
-            with open(caminho_arquivo, 'r', encoding='latin-1') as f:
-                linhas = f.readlines()
-                
-            if not linhas:
+            # Resultado guardado para os relatórios (eventos_validacao)
+            self.arquivo_validado, self.competencia = caminho_arquivo, None
+            self.validado_em = datetime.datetime.now()
+            self.resumo, self.erros_arquivo = resumo, []
+
+            cabecalho, fim_cabecalho = ler_cabecalho_bpa(caminho_arquivo)
+            if cabecalho is None:
                 print(f"{Fore.RED}Erro: Arquivo vazio{Style.RESET_ALL}")
                 return False
-                
+
             # Validar cabeçalho (primeira linha)
-            header_valido, erros_header = self.validar_header(linhas[0].rstrip('\r\n'))
+            erros_arquivo = self.erros_arquivo
+            header_valido, erros_header = self.validar_header(cabecalho)
             if not header_valido:
                 print(f"{Fore.RED}Erros no cabeçalho:{Style.RESET_ALL}")
                 for erro in erros_header:
                     print(f"  - {erro}")
-                self.stats['erros'].extend(erros_header)
-                
+                erros_arquivo.extend(erros_header)
+                if not streaming: self.stats['erros'].extend(erros_header)
+
             # Extrair informações do cabeçalho
-            competencia = linhas[0][7:13] if len(linhas[0]) > 13 else "??????"
-            num_linhas_declarado = int(linhas[0][13:19]) if len(linhas[0]) > 19 and linhas[0][13:19].isdigit() else 0
-            num_folhas_declarado = int(linhas[0][19:25]) if len(linhas[0]) > 25 and linhas[0][19:25].isdigit() else 0
-            
-            # Validar registros BPA-I
-            total_registros_bpa_i = 0
-            registros_validos = 0
-            registros_invalidos = 0
-            
-            for i, linha in enumerate(linhas[1:], 1):
-                linha = linha.rstrip('\r\n')
-                
-                # Verificar se é um registro BPA-I (começa com '03')
-                if len(linha) >= 2 and linha[0:2] == '03':
-                    total_registros_bpa_i += 1
-                    registro_valido, erros_registro = self.validar_registro_bpa_i(linha, i+1)
-                    
-                    if registro_valido:
-                        registros_validos += 1
-                    else:
-                        registros_invalidos += 1
-                        self.stats['erros'].extend(erros_registro)
-                        
-                        # Limitar quantidade de erros exibidos
-                        if len(erros_registro) > 3:
-                            print(f"{Fore.YELLOW}Linha {i+1}: {len(erros_registro)} erros encontrados (exibindo os 3 primeiros){Style.RESET_ALL}")
-                            for erro in erros_registro[:3]:
-                                print(f"  - {erro}")
-                        else:
-                            print(f"{Fore.YELLOW}Linha {i+1}: {len(erros_registro)} erros encontrados{Style.RESET_ALL}")
-                            for erro in erros_registro:
-                                print(f"  - {erro}")
-            
+            campos_header = LAYOUT_BPA_HEADER.fatiar(cabecalho)
+            competencia = campos_header['cbc_mvm'] if len(campos_header['cbc_mvm']) == 6 else "??????"
+            self.competencia = competencia
+            num_linhas_declarado = int(campos_header['cbc_lin']) if campos_header['cbc_lin'].isdigit() else 0
+            num_folhas_declarado = int(campos_header['cbc_flh']) if campos_header['cbc_flh'].isdigit() else 0
+            controle_declarado = int(campos_header['cbc_smt_vrf']) if campos_header['cbc_smt_vrf'].isdigit() else 0
+
+            # Validar registros BPA-I em trechos, no pool de processos ou um a um; cada trecho
+            # é somado (e, fora do modo em fluxo, impresso linha a linha) assim que termina
+            with ExitStack() as pilha:
+                if trechos is None and jobs > 1:
+                    executor = pilha.enter_context(ProcessPoolExecutor(max_workers=jobs))
+                    trechos = self.submeter_trechos(executor, caminho_arquivo, jobs, streaming, max_exemplos)
+                if trechos is not None:
+                    resultados = (trecho.result() for trecho in trechos)
+                else:
+                    # Em fluxo nada é impresso por linha, então um trecho só basta
+                    partes = 1 if streaming else os.path.getsize(caminho_arquivo)
+                    resultados = (
+                        self.validar_trecho(caminho_arquivo, inicio, fim, resumo.max_exemplos)
+                        for inicio, fim in dividir_em_trechos(caminho_arquivo, partes, fim_cabecalho, TAMANHO_MINIMO_TRECHO)
+                    )
+
+                total_registros_bpa_i = 0
+                registros_validos = 0
+                soma_controle = 0
+                primeira_linha = 2  # a linha 1 é o cabeçalho
+                for resultado in resultados:
+                    total_registros_bpa_i += resultado.total_registros
+                    registros_validos += resultado.registros_validos
+                    soma_controle += resultado.soma_controle
+                    resumo.incorporar(resultado.resumo, primeira_linha)
+                    if not streaming:
+                        self._imprimir_falhas(resultado.resumo, primeira_linha)
+                    primeira_linha += resultado.num_linhas
+            registros_invalidos = total_registros_bpa_i - registros_validos
+
             # Atualizar estatísticas
             self.stats['total_registros'] = total_registros_bpa_i
             self.stats['registros_validos'] = registros_validos
             self.stats['registros_invalidos'] = registros_invalidos
-            
+
+            erros_totais = []
             # Verificar se o número de registros está correto
             if total_registros_bpa_i != num_linhas_declarado:
-                erro_msg = f"Número de registros BPA-I ({total_registros_bpa_i}) não corresponde ao declarado no cabeçalho ({num_linhas_declarado})"
-                print(f"{Fore.RED}{erro_msg}{Style.RESET_ALL}")
-                self.stats['erros'].append(erro_msg)
-            
+                erros_totais.append(f"Número de registros BPA-I ({total_registros_bpa_i}) não corresponde ao declarado no cabeçalho ({num_linhas_declarado})")
+
             # Verificar número de folhas
             num_folhas_calculado = math.ceil(total_registros_bpa_i / 99) if total_registros_bpa_i > 0 else 1
             if num_folhas_calculado != num_folhas_declarado:
-                erro_msg = f"Número de folhas calculado ({num_folhas_calculado}) com base em 99 regs/folha não corresponde ao declarado no cabeçalho ({num_folhas_declarado})"
+                erros_totais.append(f"Número de folhas calculado ({num_folhas_calculado}) com base em 99 regs/folha não corresponde ao declarado no cabeçalho ({num_folhas_declarado})")
+
+            # Verificar campo de controle (soma acumulada no mesmo laço dos registros)
+            controle_calculado = campo_controle(soma_controle)
+            if controle_calculado != controle_declarado:
+                erros_totais.append(f"Campo de controle calculado ({controle_calculado}) não corresponde ao declarado no cabeçalho ({controle_declarado})")
+
+            for erro_msg in erros_totais:
                 print(f"{Fore.RED}{erro_msg}{Style.RESET_ALL}")
-                self.stats['erros'].append(erro_msg)
-            
+            erros_arquivo.extend(erros_totais)
+
+            if streaming:
+                # Só os exemplos de cada regra, depois dos erros do arquivo
+                self.stats['erros'] = erros_arquivo + [
+                    self.mensagem_falha(num_linha, campo, regra, valor)
+                    for (campo, regra), exemplos in resumo.exemplos.items()
+                    for num_linha, valor in exemplos
+                ]
+            else:
+                # Na ordem das linhas, entre os erros do cabeçalho e os dos totais
+                self.stats['erros'].extend(
+                    self.mensagem_falha(num_linha, *falha)
+                    for num_linha, falhas in resumo.falhas_por_linha(self._ordem_campos)
+                    for falha in falhas
+                )
+                self.stats['erros'].extend(erros_totais)
+            self.stats['total_erros'] = len(erros_arquivo) + resumo.total
+            self.stats['erros_por_regra'] = {f"{campo}:{regra}": total for (campo, regra), total in resumo.contagem.items()}
+
             # Exibir resumo
             print(f"\n{Fore.GREEN}Resumo da validação:{Style.RESET_ALL}")
             print(f"Arquivo: {caminho_arquivo}")
@@ -262,132 +572,257 @@ class BPAValidator:
             print(f"Total de registros: {total_registros_bpa_i}")
             print(f"Registros válidos: {registros_validos}")
             print(f"Registros inválidos: {registros_invalidos}")
-            print(f"Total de erros: {len(self.stats['erros'])}")
-            
-            if len(self.stats['erros']) == 0:
+            print(f"Total de erros: {self.stats['total_erros']}")
+            if streaming and resumo.contagem:
+                print(f"\n{Fore.YELLOW}Erros por regra (até {max_exemplos} exemplos de cada):{Style.RESET_ALL}")
+                for (campo, regra), total in resumo.por_frequencia():
+                    print(f"{campo} ({regra}): {total}")
+                    for num_linha, valor in resumo.exemplos.get((campo, regra), []):
+                        print(f"  - {self.mensagem_falha(num_linha, campo, regra, valor)}")
+
+            if self.stats['total_erros'] == 0:
                 print(f"\n{Fore.GREEN}O arquivo está em conformidade com o layout BPA-I.{Style.RESET_ALL}")
                 return True
             else:
                 print(f"\n{Fore.RED}O arquivo contém erros. Corrija-os e tente novamente.{Style.RESET_ALL}")
                 return False
-                
+
         except Exception as e:
+            self.arquivo_validado = None
             print(f"{Fore.RED}Erro ao validar arquivo: {str(e)}{Style.RESET_ALL}")
             import traceback
             traceback.print_exc()
             return False
     
-    def gerar_relatorio(self, caminho_arquivo, caminho_saida):
-        """Gera um relatório de validação em formato HTML"""
+    def _imprimir_falhas(self, resumo, primeira_linha):
+        """Imprime, linha a linha, as falhas guardadas no resumo de um trecho iniciado em ``primeira_linha``."""
+        for deslocamento, falhas in resumo.falhas_por_linha(self._ordem_campos):
+            num_linha = primeira_linha + deslocamento
+            # Limitar quantidade de erros exibidos
+            if len(falhas) > 3:
+                print(f"{Fore.YELLOW}Linha {num_linha}: {len(falhas)} erros encontrados (exibindo os 3 primeiros){Style.RESET_ALL}")
+            else:
+                print(f"{Fore.YELLOW}Linha {num_linha}: {len(falhas)} erros encontrados{Style.RESET_ALL}")
+            for falha in falhas[:3]:
+                print(f"  - {self.mensagem_falha(num_linha, *falha)}")
+
+    def eventos_validacao(self):
+        """
+        Resultado da última validação como eventos (dicts serializáveis em JSON), na ordem
+        do relatório: o arquivo, o resumo, os erros do arquivo (cabeçalho e totais) e, para
+        cada regra (campo + verificação, da mais frequente para a menos), o total e os erros
+        dela, na ordem das linhas. No modo em fluxo só os exemplos guardados viram eventos.
+        """
+        yield {'tipo': 'arquivo', 'arquivo': self.arquivo_validado, 'competencia': self.competencia,
+               'validado_em': self.validado_em.isoformat(timespec='seconds')}
+        yield {'tipo': 'resumo', 'valido': self.stats['total_erros'] == 0,
+               **{chave: self.stats[chave] for chave in ('total_registros', 'registros_validos', 'registros_invalidos', 'total_erros')}}
+        for mensagem in self.erros_arquivo:
+            yield {'tipo': 'erro_arquivo', 'mensagem': mensagem}
+        for (campo, regra), total in self.resumo.por_frequencia():
+            exemplos = self.resumo.exemplos.get((campo, regra), [])
+            yield {'tipo': 'regra', 'campo': campo, 'regra': regra, 'total': total, 'exemplos': len(exemplos)}
+            for num_linha, valor in exemplos:
+                yield {'tipo': 'erro', 'linha': num_linha, 'campo': campo, 'regra': regra, 'valor': valor,
+                       'mensagem': self.mensagem_falha(num_linha, campo, regra, valor)}
+
+    def _validar_se_preciso(self, caminho_arquivo, reutilizar, opcoes):
+        if not (reutilizar and self.arquivo_validado == caminho_arquivo):
+            self.validar_arquivo(caminho_arquivo, **opcoes)
+
+    def gerar_ndjson(self, caminho_arquivo, caminho_saida, reutilizar=True, **opcoes):
+        """
+        Grava o resultado da validação em NDJSON (``eventos_validacao``, um por linha). Com
+        ``reutilizar``, aproveita a última validação se ela foi deste arquivo; senão valida
+        com ``opcoes`` (de ``validar_arquivo``).
+        """
         try:
-            # Validar o arquivo primeiro
-            self.validar_arquivo(caminho_arquivo)
-            
-            # Criar relatório HTML
-            agora = datetime.datetime.now().strftime("%d/%m/%Y %H:%M:%S")
-            
-            html = f"""
-            <!DOCTYPE html>
-            <html lang="pt-br">
-            <head>
-                <meta charset="UTF-8">
-                <meta name="viewport" content="width=device-width, initial-scale=1.0">
-                <title>Relatório de Validação BPA-I</title>
-                <style>
-                    body {{ font-family: Arial, sans-serif; margin: 20px; }}
-                    h1 {{ color: #2c3e50; }}
-                    h2 {{ color: #3498db; }}
-                    .success {{ color: green; }}
-                    .error {{ color: red; }}
-                    .warning {{ color: orange; }}
-                    table {{ border-collapse: collapse; width: 100%; margin-top: 20px; }}
-                    th, td {{ border: 1px solid #ddd; padding: 8px; text-align: left; }}
-                    th {{ background-color: #f2f2f2; }}
-                    tr:nth-child(even) {{ background-color: #f9f9f9; }}
-                </style>
-            </head>
-            <body>
-                <h1>Relatório de Validação BPA-I</h1>
-                <p><strong>Arquivo:</strong> {os.path.basename(caminho_arquivo)}</p>
-                <p><strong>Data/Hora:</strong> {agora}</p>
-                
-                <h2>Resumo</h2>
-                <p><strong>Total de registros:</strong> {self.stats['total_registros']}</p>
-                <p><strong>Registros válidos:</strong> {self.stats['registros_validos']}</p>
-                <p><strong>Registros inválidos:</strong> {self.stats['registros_invalidos']}</p>
-                <p><strong>Total de erros:</strong> {len(self.stats['erros'])}</p>
-                
-                <h2>Status</h2>
-                <p class="{('success' if len(self.stats['erros']) == 0 else 'error')}">
-                    {('O arquivo está em conformidade com o layout BPA-I.' if len(self.stats['erros']) == 0 else 'O arquivo contém erros. Corrija-os e tente novamente.')}
-                </p>
-            """
-            
-            # Adicionar lista de erros, se houver
-            if self.stats['erros']:
-                html += """
-                <h2>Erros Encontrados</h2>
-                <table>
-                    <tr>
-                        <th>#</th>
-                        <th>Descrição</th>
-                    </tr>
-                """
-                
-                for i, erro in enumerate(self.stats['erros'], 1):
-                    html += f"""
-                    <tr>
-                        <td>{i}</td>
-                        <td>{erro}</td>
-                    </tr>
-                    """
-                
-                html += "</table>"
-            
-            # Fechar tags HTML
-            html += """
-            </body>
-            </html>
-            """
-            
-            # Salvar relatório
+            self._validar_se_preciso(caminho_arquivo, reutilizar, opcoes)
             with open(caminho_saida, 'w', encoding='utf-8') as f:
-                f.write(html)
-                
+                escrever_ndjson(self.eventos_validacao(), f)
+            print(f"\n{Fore.GREEN}Resultado em NDJSON gerado com sucesso: {caminho_saida}{Style.RESET_ALL}")
+            return True
+        except Exception as e:
+            print(f"{Fore.RED}Erro ao gerar NDJSON: {str(e)}{Style.RESET_ALL}")
+            return False
+
+    def gerar_relatorio(self, caminho_arquivo, caminho_saida, reutilizar=True, **opcoes):
+        """
+        Gera o relatório de validação em HTML, escrito em fluxo a partir de
+        ``eventos_validacao`` (ver ``escrever_relatorio_html``). ``reutilizar`` e ``opcoes``
+        como em ``gerar_ndjson``.
+        """
+        try:
+            self._validar_se_preciso(caminho_arquivo, reutilizar, opcoes)
+            escrever_relatorio_html(self.eventos_validacao(), caminho_saida)
             print(f"\n{Fore.GREEN}Relatório gerado com sucesso: {caminho_saida}{Style.RESET_ALL}")
             return True
-            
         except Exception as e:
             print(f"{Fore.RED}Erro ao gerar relatório: {str(e)}{Style.RESET_ALL}")
             return False
 
+
+def escrever_ndjson(eventos, destino):
+    """Grava os eventos em ``destino`` (arquivo aberto em modo texto), um objeto JSON por linha."""
+    for evento in eventos:
+        destino.write(json.dumps(evento, ensure_ascii=False) + '\n')
+
+
+def ler_ndjson(caminho):
+    """Eventos de um arquivo gravado com ``escrever_ndjson``, lidos um a um."""
+    with open(caminho, encoding='utf-8') as f:
+        for linha in f:
+            if linha.strip(): yield json.loads(linha)
+
+
+_HTML_INICIO = """<!DOCTYPE html>
+<html lang="pt-br">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Relatório de Validação BPA-I</title>
+    <style>
+        body {{ font-family: Arial, sans-serif; margin: 20px; }}
+        h1 {{ color: #2c3e50; }}
+        h2 {{ color: #3498db; }}
+        .success {{ color: green; }}
+        .error {{ color: red; }}
+        .warning {{ color: orange; }}
+        table {{ border-collapse: collapse; width: 100%; margin-top: 20px; }}
+        th, td {{ border: 1px solid #ddd; padding: 8px; text-align: left; }}
+        th {{ background-color: #f2f2f2; }}
+        tr:nth-child(even) {{ background-color: #f9f9f9; }}
+    </style>
+</head>
+<body>
+    <h1>Relatório de Validação BPA-I</h1>
+    <p><strong>Arquivo:</strong> {arquivo}</p>
+    <p><strong>Competência:</strong> {competencia}</p>
+    <p><strong>Data/Hora:</strong> {agora}</p>
+"""
+
+_HTML_RESUMO = """
+    <h2>Resumo</h2>
+    <p><strong>Total de registros:</strong> {total_registros}</p>
+    <p><strong>Registros válidos:</strong> {registros_validos}</p>
+    <p><strong>Registros inválidos:</strong> {registros_invalidos}</p>
+    <p><strong>Total de erros:</strong> {total_erros}</p>
+
+    <h2>Status</h2>
+    <p class="{classe}">{status}</p>
+"""
+
+_HTML_REGRA = """
+    <h3>{campo} ({regra}): {total} erro(s){nota}</h3>
+    <table>
+        <tr><th>Linha</th><th>Valor</th><th>Descrição</th></tr>
+"""
+
+
+def escrever_relatorio_html(eventos, caminho_saida):
+    """
+    Escreve o relatório HTML a partir de eventos de ``BPAValidator.eventos_validacao`` (ou
+    lidos de um NDJSON com ``ler_ndjson``) à medida que chegam: cada evento vira um trecho
+    do arquivo, com os erros agrupados por campo e regra, sem montar o relatório inteiro em
+    memória. Todos os valores vindos do arquivo validado são escapados.
+    """
+    with open(caminho_saida, 'w', encoding='utf-8') as f:
+        escrever = f.write
+        tabela_aberta = secao_erros = False
+        num_erro_arquivo = 0
+        for evento in eventos:
+            tipo = evento['tipo']
+            if tipo == 'arquivo':
+                agora = datetime.datetime.fromisoformat(evento['validado_em']).strftime("%d/%m/%Y %H:%M:%S")
+                escrever(_HTML_INICIO.format(
+                    arquivo=escape(os.path.basename(evento['arquivo'] or '')),
+                    competencia=escape(evento['competencia'] or ''), agora=agora,
+                ))
+                continue
+            if tipo == 'resumo':
+                valido = evento['valido']
+                escrever(_HTML_RESUMO.format(
+                    classe='success' if valido else 'error',
+                    status='O arquivo está em conformidade com o layout BPA-I.' if valido else 'O arquivo contém erros. Corrija-os e tente novamente.',
+                    **{chave: evento[chave] for chave in ('total_registros', 'registros_validos', 'registros_invalidos', 'total_erros')},
+                ))
+                continue
+
+            if not secao_erros:
+                escrever("\n    <h2>Erros Encontrados</h2>\n")
+                secao_erros = True
+            if tipo == 'erro_arquivo':
+                if not tabela_aberta:
+                    escrever("    <table>\n        <tr><th>#</th><th>Descrição</th></tr>\n")
+                    tabela_aberta = True
+                num_erro_arquivo += 1
+                escrever(f"        <tr><td>{num_erro_arquivo}</td><td>{escape(evento['mensagem'])}</td></tr>\n")
+            elif tipo == 'regra':
+                if tabela_aberta: escrever("    </table>\n")
+                nota = f" (exibindo os {evento['exemplos']} primeiros)" if evento['exemplos'] < evento['total'] else ''
+                escrever(_HTML_REGRA.format(campo=escape(evento['campo']), regra=escape(evento['regra']), total=evento['total'], nota=nota))
+                tabela_aberta = True
+            elif tipo == 'erro':
+                escrever(f"        <tr><td>{evento['linha']}</td><td><code>{escape(str(evento['valor']))}</code></td>"
+                         f"<td>{escape(evento['mensagem'])}</td></tr>\n")
+
+        if tabela_aberta: escrever("    </table>\n")
+        escrever("</body>\n</html>\n")
+
+
 def main():
     """Função principal"""
     # Configurar argumentos de linha de comando
     parser = argparse.ArgumentParser(description='Validador de arquivos BPA-I')
-    parser.add_argument('arquivo', help='Caminho para o arquivo BPA-I a ser validado')
+    parser.add_argument('arquivos', nargs='+', metavar='arquivo',
+                        help='Arquivo BPA-I a ser validado, ou pasta (valida os *.txt dela)')
     parser.add_argument('-r', '--relatorio', help='Gerar relatório HTML de validação', action='store_true')
-    parser.add_argument('-o', '--output', help='Caminho para o arquivo de saída do relatório')
+    parser.add_argument('-n', '--ndjson', action='store_true',
+                        help='Gravar o resultado em NDJSON (um evento JSON por linha) ao lado de cada arquivo')
+    parser.add_argument('-o', '--output', help='Caminho para o arquivo de saída do relatório (só com um arquivo)')
+    parser.add_argument('-s', '--streaming', action='store_true',
+                        help='Validação em fluxo, com memória constante: erros contados por regra, sem saída por linha')
+    parser.add_argument('-e', '--exemplos', type=int, default=EXEMPLOS_POR_REGRA,
+                        help=f'Exemplos guardados por regra no modo --streaming (padrão: {EXEMPLOS_POR_REGRA})')
+    parser.add_argument('-m', '--mmap', action='store_true',
+                        help='Valida os bytes do arquivo mapeado em memória, sem decodificar as linhas')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='Processos para validar trechos dos arquivos e vários arquivos ao mesmo tempo (padrão: 1)')
     
     args = parser.parse_args()
     
-    # Verificar se o arquivo existe
-    if not os.path.isfile(args.arquivo):
-        print(f"{Fore.RED}Erro: O arquivo {args.arquivo} não existe.{Style.RESET_ALL}")
-        return 1
+    # Expandir pastas e verificar se os arquivos existem
+    arquivos = []
+    for caminho in args.arquivos:
+        if os.path.isdir(caminho):
+            arquivos.extend(sorted(
+                os.path.join(caminho, nome) for nome in os.listdir(caminho)
+                if nome.lower().endswith('.txt') and os.path.isfile(os.path.join(caminho, nome))
+            ))
+        elif os.path.isfile(caminho):
+            arquivos.append(caminho)
+        else:
+            print(f"{Fore.RED}Erro: O arquivo {caminho} não existe.{Style.RESET_ALL}")
+            return 1
+    if args.output and len(arquivos) > 1:
+        parser.error('--output só pode ser usado com um único arquivo')
     
     # Criar validador
-    validador = BPAValidator()
+    validador = BPAValidator(leitura=LEITURA_MMAP if args.mmap else LEITURA_TEXTO)
     
-    # Validar arquivo
-    resultado = validador.validar_arquivo(args.arquivo)
+    # Gerar relatórios, se solicitado, a partir da validação que acabou de ser feita
+    def gerar_relatorios(arquivo, valido):
+        base = os.path.splitext(arquivo)[0]
+        if args.ndjson:
+            validador.gerar_ndjson(arquivo, base + '_validacao.ndjson')
+        if args.relatorio:
+            validador.gerar_relatorio(arquivo, args.output if args.output else base + '_validacao.html')
     
-    # Gerar relatório, se solicitado
-    if args.relatorio:
-        output_path = args.output if args.output else os.path.splitext(args.arquivo)[0] + '_validacao.html'
-        validador.gerar_relatorio(args.arquivo, output_path)
+    # Validar arquivos
+    opcoes = {'streaming': args.streaming, 'max_exemplos': args.exemplos}
+    resultados = validador.validar_arquivos(arquivos, args.jobs, gerar_relatorios, **opcoes)
     
-    return 0 if resultado else 1
+    return 0 if all(valido for _, valido, _ in resultados) else 1
 
 if __name__ == "__main__":
     sys.exit(main())
\ No newline at end of file
@@ -9,9 +9,18 @@ import pandas as pd
 import traceback
 from shared.mapeamento_profissionais import carregar_mapeamento_profissionais
 from shared.database import Database
-from shared.mapeamento_procedimentos import carregar_tabela_procedimentos_cid
+from shared.extracao_paralela import MAX_TRABALHADORES, OPCOES_PARTICAO, extrair_em_particoes, filtro_particao, particionar_periodo
+from shared.layouts import LAYOUT_CIHA
+from shared.mapeamento_procedimentos import carregar_tabela_procedimentos_cid, mapeamento_procedimentos_da_consulta
+from shared.sql_enderecos import ESTRATEGIA_LATERAL, clausula_with, montar_endereco_paciente
 from tkcalendar import DateEntry
 
+def chave_ordem_ciha(reg):
+    """ORDER BY da consulta particionada: nome (byte a byte, nulos por último) e lançamento."""
+    nome = reg.get('no_paciente')
+    return (nome is None, nome or '', reg.get('id_lancamento'))
+
+
 class CIHAExporter:
     def __init__(self):
         self.conn = None
@@ -46,7 +55,18 @@ class CIHAExporter:
             self._log_message_gui(f"Erro ao carregar mapeamento de procedimentos SIGH: {str(e)}")
         return mapeamento_proc
 
-    def _build_sql_ciha(self, data_inicio, data_fim, unidade_selecionada):
+    def _build_sql_ciha(self, data_inicio, data_fim, unidade_selecionada, incluir_codigo_procedimento=False, estrategia_endereco=ESTRATEGIA_LATERAL,
+                        particao=None):
+        """
+        Monta a consulta da CIHA. Com ``incluir_codigo_procedimento`` o código curto vem da
+        própria consulta (JOIN com sigh.procedimentos), dispensando carregar_mapeamento_procedimentos.
+
+        ``particao`` restringe a consulta a um trecho do período (ver
+        shared/extracao_paralela.py). Nesse modo o nome do paciente é ordenado byte a byte
+        (``COLLATE "C"``), para que as partições possam ser intercaladas no Python
+        (``chave_ordem_ciha``) sem depender da collation do banco: nomes acentuados ou em
+        minúsculas vêm depois de "Z", ao contrário da consulta única, que segue a collation.
+        """
         data_inicio_str = data_inicio.isoformat()
         data_fim_str = data_fim.isoformat()
 
@@ -58,15 +78,18 @@ class CIHAExporter:
             raise ValueError("A lista de códigos de profissionais do mapeamento está vazia.")
 
         filtro_profissionais_sql = f"AND fi.cod_medico IN ({codigos_profissionais})"
+        if particao: filtro_profissionais_sql += f" AND {filtro_particao('fi.data_atendimento', particao)}"
+        coluna_codigo_procedimento = "proc.codigo_procedimento," if incluir_codigo_procedimento else ""
+        join_procedimentos = "LEFT JOIN sigh.procedimentos proc ON l.cod_proc = proc.id_procedimento" if incluir_codigo_procedimento else ""
+        cte_enderecos, join_enderecos = montar_endereco_paciente(
+            colunas=("cod_logradouro", "numero", "complemento"),
+            estrategia=estrategia_endereco,
+            somente_com_logradouro=False,
+            desempatar_por_id=False,
+        )
         
         sql_query = f"""
-        WITH RankedEnderecos AS (
-            SELECT
-                ep.cod_paciente, ep.cod_logradouro, ep.numero, ep.complemento,
-                ROW_NUMBER() OVER(PARTITION BY ep.cod_paciente ORDER BY ep.data_hora_atualizacao DESC, ep.data_hora_criacao DESC) as rn
-            FROM sigh.enderecos ep
-            WHERE ep.ativo = 't'
-        )
+        {clausula_with(cte_enderecos)}
         SELECT DISTINCT l.id_lancamento,
             v_pac.cartao_sus AS nu_cns,
             p.nm_paciente AS no_paciente,
@@ -77,6 +100,7 @@ class CIHAExporter:
             l.cod_cid,
             fi.diagnostico,
             l.cod_proc,
+            {coluna_codigo_procedimento}
             l.quantidade,
             logradouros_pac.logradouro AS ds_logradouro,
             enderecos_pac.numero AS nu_logradouro,
@@ -92,16 +116,37 @@ class CIHAExporter:
         JOIN sigh.ficha_amb_int fi ON c.cod_fia = fi.id_fia
         JOIN sigh.pacientes p ON fi.cod_paciente = p.id_paciente
         LEFT JOIN sigh.v_cons_pacientes_laboratorios v_pac ON p.id_paciente = v_pac.registro
-        LEFT JOIN RankedEnderecos AS enderecos_pac ON p.id_paciente = enderecos_pac.cod_paciente AND enderecos_pac.rn = 1
+        {join_procedimentos}
+        {join_enderecos}
         LEFT JOIN endereco_sigh.logradouros AS logradouros_pac ON enderecos_pac.cod_logradouro = logradouros_pac.id_logradouro
         WHERE fi.data_atendimento BETWEEN :inicio AND :fim {filtro_profissionais_sql}
-        ORDER BY p.nm_paciente, l.id_lancamento
+        {"" if particao else "ORDER BY p.nm_paciente, l.id_lancamento"}
         """
+        if particao:
+            # Com SELECT DISTINCT o ORDER BY não aceita a expressão com COLLATE; ordena por fora
+            sql_query = f"SELECT * FROM ({sql_query}) AS ciha_particao ORDER BY no_paciente COLLATE \"C\", id_lancamento"
         
         sql_params = {'inicio': data_inicio_str, 'fim': data_fim_str}
         
         return sql_query, sql_params
 
+    def _consultar_registros(self, params):
+        """Registros do período; com ``params['particao']`` ("dia" ou "semana"), em partições paralelas."""
+        particao = params.get('particao')
+        if not particao:
+            sql, sql_params = self._build_sql_ciha(params['data_inicio'], params['data_fim'], params['unidade'], incluir_codigo_procedimento=True)
+            return [dict(row._mapping) for row in self.conn.execute(text(sql), sql_params).fetchall()]
+
+        particoes = particionar_periodo(params['data_inicio'], params['data_fim'], particao)
+        self._log_message_gui(f"Consultando o período em {len(particoes)} partições por {particao} (nomes em ordem byte a byte)...")
+        consultas = [
+            self._build_sql_ciha(params['data_inicio'], params['data_fim'], params['unidade'], incluir_codigo_procedimento=True, particao=p)
+            for p in particoes
+        ]
+        return extrair_em_particoes(
+            self.conn.engine, consultas, chave_ordem_ciha, params.get('max_trabalhadores', MAX_TRABALHADORES)
+        )
+
     def aplicar_filtro_procedimentos(self, registros, filtro_texto):
         if not filtro_texto.strip():
             self._log_message_gui("Nenhum filtro de procedimento aplicado. Exportando todos os registros da consulta.")
@@ -149,10 +194,7 @@ class CIHAExporter:
         if not self.conn: return False, "Sem conexão com o banco."
         try:
             self._log_message_gui("Iniciando consulta de dados para CIHA...")
-            sql, sql_params = self._build_sql_ciha(params['data_inicio'], params['data_fim'], params['unidade'])
-            
-            result = self.conn.execute(text(sql), sql_params)
-            self.registros_brutos_para_analise = [dict(row._mapping) for row in result.fetchall()]
+            self.registros_brutos_para_analise = self._consultar_registros(params)
             self._log_message_gui(f"{len(self.registros_brutos_para_analise)} registros brutos encontrados.")
 
             if not self.registros_brutos_para_analise:
@@ -160,8 +202,11 @@ class CIHAExporter:
 
             self._log_message_gui("Mapeando códigos de procedimento e traduzindo CID...")
             tabela_proc_cid = carregar_tabela_procedimentos_cid()
-            cod_procs_unicos = {reg.get('cod_proc') for reg in self.registros_brutos_para_analise if reg.get('cod_proc')}
-            mapeamento_curto = self.carregar_mapeamento_procedimentos(cod_procs_unicos)
+            if 'codigo_procedimento' in self.registros_brutos_para_analise[0]:
+                mapeamento_curto = mapeamento_procedimentos_da_consulta(self.registros_brutos_para_analise)
+            else:
+                cod_procs_unicos = {reg.get('cod_proc') for reg in self.registros_brutos_para_analise if reg.get('cod_proc')}
+                mapeamento_curto = self.carregar_mapeamento_procedimentos(cod_procs_unicos)
 
             registros_processados = []
             for reg in self.registros_brutos_para_analise:
@@ -195,15 +240,7 @@ class CIHAExporter:
             return False, str(e)
 
     def gerar_arquivo_ciha_formatado(self, registros, params):
-        def formatar_numero(valor, tamanho):
-            if valor is None: valor = 0
-            try: valor_inteiro = int(float(valor))
-            except (ValueError, TypeError): valor_inteiro = 0
-            return str(valor_inteiro).zfill(tamanho)
-
-        def formatar_texto(valor, tamanho, default=''):
-            return str(valor or default).strip().ljust(tamanho)
-        
+        """Gera o arquivo CIHA (layout em shared/layouts.py), uma linha de 450 posições por registro."""
         caminho_arquivo = params.get('caminho_arquivo')
         if not caminho_arquivo:
             return False, "Caminho do arquivo não foi fornecido para a geração."
@@ -212,48 +249,28 @@ class CIHAExporter:
             with open(caminho_arquivo, 'w', encoding='latin-1', newline='\n') as f:
                 sequencial_linha = 1
                 for reg in registros:
-                    linha = [
-                        formatar_numero(params['competencia'], 6),
-                        formatar_numero(params['cnes'], 7),
-                        formatar_texto('I', 1),
-                        formatar_numero(reg.get('co_procedimento_sigtap') or reg.get('cod_proc'), 10),
-                        formatar_numero(reg.get('quantidade'), 6),
-                        formatar_numero('11', 2),
-                        formatar_numero('', 8),
-                        formatar_numero(reg.get('dt_admissao').strftime('%d%m%Y') if reg.get('dt_admissao') else '', 8),
-                        formatar_numero(reg.get('dt_saida').strftime('%d%m%Y') if reg.get('dt_saida') else '', 8),
-                        formatar_numero('01', 2),
-                        formatar_numero('12', 2),
-                        formatar_numero('', 2),
-                        formatar_texto(reg.get('cid_final_tratado'), 4),
-                        formatar_texto('', 4),
-                        formatar_numero('', 11),
-                        formatar_numero('', 11),
-                        formatar_texto('', 30),
-                        formatar_numero('', 13),
-                        formatar_texto('', 15),
-                        formatar_texto(reg.get('nu_prontuario'), 17),
-                        formatar_numero(reg.get('nu_cns'), 15),
-                        formatar_texto(reg.get('no_paciente'), 70),
-                        formatar_numero(reg.get('dt_nascimento').strftime('%d%m%Y') if reg.get('dt_nascimento') else '', 8),
-                        formatar_texto('M' if str(reg.get('tp_sexo')) == '1' else 'F', 1),
-                        formatar_texto(reg.get('ds_logradouro'), 25),
-                        formatar_texto(reg.get('nu_logradouro'), 5, default='S/N'),
-                        formatar_texto(reg.get('ds_complemento'), 15),
-                        formatar_numero(reg.get('co_cep'), 8),
-                        formatar_numero(reg.get('co_municipio'), 7),
-                        formatar_texto(reg.get('sg_uf'), 2),
-                        formatar_numero(str(sequencial_linha % 10), 1),
-                    ]
-                    
-                    linha_str = "".join(linha)
-                    
-                    tamanho_atual = len(linha_str)
-                    tamanho_filler = 450 - tamanho_atual
-                    if tamanho_filler > 0:
-                        linha_str += formatar_texto('', tamanho_filler)
-
-                    f.write(linha_str[:450] + '\n')
+                    linha_str = LAYOUT_CIHA.formatar_registro({
+                        'cih_cmp': params['competencia'],
+                        'cih_cnes': params['cnes'],
+                        'cih_proc': reg.get('co_procedimento_sigtap') or reg.get('cod_proc'),
+                        'cih_qt': reg.get('quantidade'),
+                        'cih_dt_admissao': reg.get('dt_admissao').strftime('%d%m%Y') if reg.get('dt_admissao') else '',
+                        'cih_dt_saida': reg.get('dt_saida').strftime('%d%m%Y') if reg.get('dt_saida') else '',
+                        'cih_cid_principal': reg.get('cid_final_tratado'),
+                        'cih_prontuario': reg.get('nu_prontuario'),
+                        'cih_cns': reg.get('nu_cns'),
+                        'cih_nm_paciente': reg.get('no_paciente'),
+                        'cih_dt_nascimento': reg.get('dt_nascimento').strftime('%d%m%Y') if reg.get('dt_nascimento') else '',
+                        'cih_sexo': 'M' if str(reg.get('tp_sexo')) == '1' else 'F',
+                        'cih_logradouro': reg.get('ds_logradouro'),
+                        'cih_numero': reg.get('nu_logradouro') or 'S/N',
+                        'cih_complemento': reg.get('ds_complemento'),
+                        'cih_cep': reg.get('co_cep'),
+                        'cih_municipio': reg.get('co_municipio'),
+                        'cih_uf': reg.get('sg_uf'),
+                        'cih_sequencial': sequencial_linha % 10,
+                    })
+                    f.write(linha_str + '\n')
                     sequencial_linha += 1
             
             return True, caminho_arquivo
@@ -321,6 +338,9 @@ class CIHAExporterGUI:
         self.data_inicio_entry.grid(row=1, column=1, padx=5, pady=5)
         self.data_fim_entry = DateEntry(self.frame_filtros, width=12, date_pattern='dd/mm/yyyy')
         self.data_fim_entry.grid(row=1, column=2, padx=5, pady=5)
+        self.particao_combo = ttk.Combobox(self.frame_filtros, values=list(OPCOES_PARTICAO), width=12, state="readonly")
+        self.particao_combo.current(0)
+        self.particao_combo.grid(row=1, column=3, padx=5, pady=5)
 
         ttk.Label(self.frame_filtros, text="Unidade Organizacional:").grid(row=2, column=0, padx=5, pady=5, sticky="w")
         self.unidade_combo = ttk.Combobox(self.frame_filtros, width=50, state="readonly")
@@ -413,7 +433,8 @@ class CIHAExporterGUI:
             params = {
                 'competencia': competencia_val, 'cnes': cnes_val, 'unidade': unidade_val,
                 'debug_mode': debug_val, 'data_inicio': data_inicio_val, 'data_fim': data_fim_val,
-                'filtro_procedimentos': filtro_proc_val
+                'filtro_procedimentos': filtro_proc_val,
+                'particao': OPCOES_PARTICAO.get(self.particao_combo.get()),
             }
 
             self._log_message(f"Iniciando processo de consulta e geração...")
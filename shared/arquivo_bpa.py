@@ -0,0 +1,128 @@
+"""
+Escrita do arquivo BPA em fluxo.
+
+As linhas BPA-I chegam já codificadas (latin-1, com CRLF) de um iterador e vão direto
+para um arquivo binário com buffer grande. O cabeçalho depende dos totais (linhas e
+folhas), então a primeira linha é reservada em branco e preenchida ao final com um
+``seek(0)``: a largura do cabeçalho é fixa pelo layout, de modo que a reescrita não
+desloca o restante do arquivo. O pico de memória não depende do número de registros.
+
+O campo de controle do cabeçalho (``cbc_smt_vrf``) é acumulado durante a escrita, linha a
+linha, com a mesma ``valor_controle`` que o validador usa para conferi-lo. A leitura em
+fluxo usada pelo validador (``ler_linhas_bpa``, inteira ou em trechos de linhas inteiras
+com ``dividir_em_trechos``) também fica aqui.
+"""
+import os
+from itertools import islice
+
+from shared.layouts import LAYOUT_BPA_HEADER, LAYOUT_BPA_I
+
+ENCODING = 'latin-1'
+FIM_LINHA = '\r\n'
+TAMANHO_BUFFER = 1 << 20
+LINHAS_POR_ESCRITA = 4096
+
+_INICIO_PA, _FIM_PA = LAYOUT_BPA_I.posicoes['prd_pa']
+_INICIO_QT, _FIM_QT = LAYOUT_BPA_I.posicoes['prd_qt']
+
+
+def valor_controle(linha):
+    """Parcela de uma linha BPA-I (str ou bytes) na soma de controle: código do procedimento + quantidade."""
+    try: return int(linha[_INICIO_PA:_FIM_PA]) + int(linha[_INICIO_QT:_FIM_QT])
+    except ValueError: return 0
+
+
+def campo_controle(soma):
+    """Campo de controle do cabeçalho: resto da soma por 1111, somado a 1111."""
+    return soma % 1111 + 1111
+
+
+def ler_linhas_bpa(caminho, tamanho_bloco=TAMANHO_BUFFER, inicio=0, fim=None):
+    """
+    Linhas de um arquivo BPA (str, sem o fim de linha), lidas em blocos binários de
+    ``tamanho_bloco``: a memória não depende do tamanho do arquivo. Como latin-1 tem um
+    byte por caractere, cada bloco é decodificado inteiro e só o pedaço de linha no fim
+    do bloco é guardado para o próximo. ``inicio`` e ``fim`` (bytes, em limites de linha,
+    ver ``dividir_em_trechos``) restringem a leitura a um trecho do arquivo.
+    """
+    resto = ''
+    with open(caminho, 'rb', buffering=0) as f:
+        f.seek(inicio)
+        restante = float('inf') if fim is None else fim - inicio
+        while restante > 0:
+            bloco = f.read(min(tamanho_bloco, restante))
+            if not bloco: break
+            restante -= len(bloco)
+            linhas = (resto + bloco.decode(ENCODING)).split('\n')
+            resto = linhas.pop()
+            for linha in linhas:
+                yield linha.rstrip('\r')
+    if resto: yield resto.rstrip('\r')
+
+
+def ler_cabecalho_bpa(caminho):
+    """
+    Primeira linha do arquivo (sem o fim de linha) e o byte em que a seguinte começa;
+    ``(None, 0)`` para um arquivo vazio.
+    """
+    with open(caminho, 'rb') as f:
+        linha = f.readline()
+    if not linha: return None, 0
+    return linha.decode(ENCODING).removesuffix('\n').rstrip('\r'), len(linha)
+
+
+def dividir_em_trechos(caminho, partes, inicio=0, tamanho_minimo=1):
+    """
+    Divide o arquivo, a partir do byte ``inicio``, em até ``partes`` intervalos ``(inicio,
+    fim)`` consecutivos de tamanhos parecidos, cada um terminando logo após um fim de linha
+    (o último, no fim do arquivo) e com pelo menos ``tamanho_minimo`` bytes.
+    """
+    tamanho = os.path.getsize(caminho)
+    partes = max(1, min(partes, (tamanho - inicio) // max(1, tamanho_minimo)))
+    passo = (tamanho - inicio) / partes
+    limites = [inicio]
+    with open(caminho, 'rb') as f:
+        for parte in range(1, partes):
+            alvo = max(inicio + round(parte * passo), limites[-1] + 1)
+            if alvo >= tamanho: break
+            # A partir do byte anterior ao alvo: se ele já é o fim de uma linha, o limite é o alvo
+            f.seek(alvo - 1)
+            f.readline()
+            if f.tell() >= tamanho: break
+            limites.append(f.tell())
+    limites.append(max(tamanho, inicio))
+    return list(zip(limites, limites[1:]))
+
+
+def codificar_registros(registros):
+    """Gera as linhas BPA-I de ``registros`` (dicts ``prd_*``) já codificadas para o arquivo."""
+    formatar = LAYOUT_BPA_I.formatar_registro
+    for registro in registros:
+        yield (formatar(registro) + FIM_LINHA).encode(ENCODING)
+
+
+def escrever_arquivo_bpa(caminho, cabecalho, linhas, tamanho_buffer=TAMANHO_BUFFER):
+    """
+    Grava ``linhas`` (bytes, ver ``codificar_registros``) em ``caminho`` e, ao final, o
+    cabeçalho: ``cabecalho(num_linhas, num_folhas, campo_controle)`` devolve o dict dos
+    campos ``cbc_*``. A folha é lida da última linha, que é a de maior folha na numeração.
+    Devolve ``(num_linhas, num_folhas, campo_controle)``.
+    """
+    inicio_flh, fim_flh = LAYOUT_BPA_I.posicoes['prd_flh']
+    linhas = iter(linhas)
+    num_linhas, soma_controle, ultima_linha = 0, 0, None
+    with open(caminho, 'wb', buffering=tamanho_buffer) as f:
+        f.write((' ' * LAYOUT_BPA_HEADER.tamanho + FIM_LINHA).encode(ENCODING))
+        while True:
+            bloco = list(islice(linhas, LINHAS_POR_ESCRITA))
+            if not bloco: break
+            f.writelines(bloco)
+            num_linhas += len(bloco)
+            soma_controle += sum(map(valor_controle, bloco))
+            ultima_linha = bloco[-1]
+
+        num_folhas = int(ultima_linha[inicio_flh:fim_flh]) if ultima_linha else 0
+        controle = campo_controle(soma_controle)
+        f.seek(0)
+        f.write(LAYOUT_BPA_HEADER.formatar_registro(cabecalho(num_linhas, num_folhas, controle)).encode(ENCODING))
+    return num_linhas, num_folhas, controle
@@ -0,0 +1,209 @@
+"""
+Montagem vetorizada dos registros BPA-I.
+
+Alternativa ao laço de ``BPAExporter.processar_registros_bpa_i_completo``: as linhas da
+consulta são carregadas num DataFrame e cada campo ``prd_*`` é calculado por coluna. As
+colunas de entrada têm poucos valores distintos (prestadores, procedimentos, datas,
+municípios), então cada regra é aplicada uma vez por valor distinto (ou por combinação
+distinta de colunas) e o resultado é espalhado para as linhas com ``pd.factorize``.
+Como as regras são as mesmas expressões do laço, a saída é idêntica byte a byte.
+
+None e valores ausentes (NaN de colunas que não vieram na consulta) são tratados da
+mesma forma, como o ``reg.get(...)`` do laço.
+"""
+from itertools import repeat, starmap
+
+import numpy as np
+import pandas as pd
+
+from shared.registro_bpa import CAMPOS_REGISTRO, RegistroBPAI, coleta_pausada
+from shared.regras_prestador import contar_mensagens
+
+# Colunas da consulta principal usadas na montagem.
+COLUNAS_ENTRADA = [
+    'id_lancamento', 'id_prestador_lancamento', 'cns_profissional_lancamento', 'cbo_profissional_view',
+    'data_atendimento_lancamento', 'nm_paciente', 'data_nasc', 'cnspac_paciente_original', 'sexo_paciente',
+    'ibge_por_cep', 'codigo_raca_etnia_view', 'cod_etnia_indigena', 'cod_proc', 'cid_da_fia', 'lanc_cid',
+    'diagnostico_ficha', 'vcp_numero', 'nm_prestador_ficha', 'vcp_tp_logradouro', 'vcp_cep',
+    'vcp_logradouro', 'vcp_bairro_inicial',
+]
+
+
+def _texto(valor):
+    return str(valor or '').strip()
+
+
+def _codificar(coluna):
+    """Códigos de ``pd.factorize`` com os ausentes no código ``len(unicos)`` e os valores distintos (ausente = None)."""
+    codigos, unicos = pd.factorize(np.asarray(coluna, dtype=object))
+    codigos = np.where(codigos < 0, len(unicos), codigos)
+    return codigos, list(unicos) + [None]
+
+
+def _espalhar(resultados, codigos, saidas):
+    """Monta a tabela de resultados por valor distinto e indexa pelos códigos das linhas."""
+    if saidas == 1:
+        resultados = [resultados]
+    else:
+        resultados = list(zip(*resultados)) or [()] * saidas
+    colunas = []
+    for resultados_saida in resultados:
+        tabela = np.empty(len(resultados_saida), dtype=object)
+        tabela[:] = list(resultados_saida)
+        colunas.append(tabela[codigos])
+    return colunas[0] if saidas == 1 else colunas
+
+
+def por_valor(coluna, funcao, saidas=1):
+    """
+    Aplica ``funcao`` uma vez por valor distinto de ``coluna`` e devolve o resultado por linha.
+    Com ``saidas`` > 1, ``funcao`` devolve uma tupla e o retorno é uma coluna por posição.
+    """
+    codigos, unicos = _codificar(coluna)
+    return _espalhar([funcao(valor) for valor in unicos], codigos, saidas)
+
+
+def por_combinacao(colunas, funcao, saidas=1):
+    """Como ``por_valor``, chamando ``funcao(*valores)`` uma vez por combinação distinta das colunas."""
+    chave = np.zeros(len(colunas[0]), dtype=np.int64)
+    codigos_colunas, unicos_colunas = [], []
+    for coluna in colunas:
+        codigos, unicos = _codificar(coluna)
+        codigos_colunas.append(codigos)
+        unicos_colunas.append(unicos)
+        # Recompacta a chave a cada coluna para não estourar o int64
+        chave, _ = pd.factorize(chave * len(unicos) + codigos)
+    # Qualquer linha serve de representante: todas as linhas de uma chave têm os mesmos valores
+    representantes = np.empty(chave.max() + 1 if len(chave) else 0, dtype=np.intp)
+    representantes[chave] = np.arange(len(chave))
+    resultados = [
+        funcao(*(unicos[codigos[linha]] for codigos, unicos in zip(codigos_colunas, unicos_colunas)))
+        for linha in representantes
+    ]
+    return _espalhar(resultados, chave, saidas)
+
+
+def carregar_frame(registros_bd):
+    """DataFrame só com as colunas usadas, sem inferência de tipos (ints continuam ints, None continua None)."""
+    return pd.DataFrame(registros_bd, columns=COLUNAS_ENTRADA, dtype=object)
+
+
+def montar_colunas_bpa_i(df, competencia, contexto, config, regras_prestador, calcular_idade):
+    """
+    Calcula os campos BPA-I de ``df`` (ver ``carregar_frame``) com as ``RegrasPrestador`` da
+    execução. Devolve ``(colunas, regras)``: um dict campo -> array por linha (ou str, para
+    campos constantes) e, por mensagem de REGRA, quantos registros ela afetou.
+    """
+    mapeamento_logradouros = contexto.mapeamento_logradouros
+    c = {nome: df[nome].to_numpy(dtype=object) for nome in COLUNAS_ENTRADA}
+
+    id_prestador = por_valor(c['id_prestador_lancamento'], str)
+    codigo_curto = por_valor(c['cod_proc'], contexto.codigo_curto)
+
+    # CBO, procedimento, serviço/classificação e CID padrão vêm da regra do par (prestador, procedimento)
+    regra = por_combinacao([id_prestador, codigo_curto], regras_prestador.regra)
+    cbo_override, prd_pa, prd_qt, prd_srv, prd_clf, cid_padrao = por_valor(
+        regra, lambda r: (r.cbo, r.prd_pa, r.prd_qt, r.prd_srv, r.prd_clf, r.cid_padrao) if r else (None,) * 6, saidas=6
+    )
+    regras = contar_mensagens(pd.Series(regra, dtype=object).value_counts(sort=False).to_dict())
+
+    def cbo(cbo_override, cbo_view):
+        cbo_val = cbo_override or _texto(cbo_view)
+        return cbo_val.ljust(6)[:6] if cbo_val else ' ' * 6
+
+    prd_cbo = por_combinacao([cbo_override, c['cbo_profissional_view']], cbo)
+
+    # Primeiro CID verdadeiro da cadeia fia -> lançamento -> ficha -> sugestão/obrigatório
+    cid = cid_padrao
+    for nome in ('diagnostico_ficha', 'lanc_cid', 'cid_da_fia'):
+        preenchido = por_valor(c[nome], bool).astype(bool)
+        cid = np.where(preenchido, c[nome], cid)
+
+    def formatar_cid(cid_val):
+        cid_formatado = str(cid_val).strip().upper().replace('.', '')
+        return cid_formatado.ljust(4)[:4] if cid_formatado else '    '
+
+    prd_cid = por_valor(cid, formatar_cid)
+
+    prd_dtaten, atendimento_preenchido = por_valor(
+        c['data_atendimento_lancamento'], lambda d: (d.strftime('%Y%m%d') if d else competencia + "01", bool(d)), saidas=2
+    )
+
+    def nascimento(data_nasc, tem_atendimento):
+        data_nasc_str = data_nasc.strftime('%Y%m%d') if data_nasc else ''
+        idade = calcular_idade(data_nasc) if data_nasc else None
+        idade_str = str(min(max(idade, 0), 130)).zfill(3) if idade is not None and tem_atendimento else '000'
+        return data_nasc_str, idade_str, idade
+
+    prd_dtnasc, prd_ldade, idade = por_combinacao([c['data_nasc'], atendimento_preenchido], nascimento, saidas=3)
+
+    def raca_etnia(raca_view, etnia_indigena):
+        raca = str(raca_view or '99').strip().zfill(2)
+        etnia_val = _texto(etnia_indigena) if raca == '05' else ''
+        return raca, etnia_val.zfill(4) if etnia_val else '    '
+
+    prd_raca, prd_etnia = por_combinacao([c['codigo_raca_etnia_view'], c['cod_etnia_indigena']], raca_etnia, saidas=2)
+
+    def codigo_logradouro(tipo):
+        return mapeamento_logradouros.get(_texto(tipo).upper(), '000').zfill(3)
+
+    def numero(valor):
+        numero_val = _texto(valor)
+        return '00000' if not numero_val else numero_val.ljust(5)[:5]
+
+    colunas = {
+        'prd_ident': '03',
+        'prd_cnes': config.get('cnes').ljust(7),
+        'prd_cmp': competencia,
+        'prd_cnsmed': por_valor(c['cns_profissional_lancamento'], lambda v: _texto(v).ljust(15) if _texto(v) else ' ' * 15),
+        'prd_cbo': prd_cbo,
+        'prd_dtaten': prd_dtaten,
+        'prd_flh': '   ',
+        'prd_seq': '  ',
+        'prd_pa': prd_pa,
+        'prd_cnspac': por_valor(c['cnspac_paciente_original'], lambda v: _texto(v).ljust(15) if _texto(v) else ' ' * 15),
+        'prd_sexo': por_valor(c['sexo_paciente'], lambda v: 'M' if _texto(v) == '1' else 'F'),
+        'prd_ibge': por_valor(c['ibge_por_cep'], lambda v: _texto(v).ljust(6)[:6] if _texto(v) else ' ' * 6),
+        'prd_cid': prd_cid,
+        'prd_ldade': prd_ldade,
+        'prd_qt': prd_qt,
+        'prd_caten': '01',
+        'prd_naut': ' ' * 13,
+        'prd_org': 'BPA',
+        'prd_nmpac': por_valor(c['nm_paciente'], lambda v: _texto(v).ljust(30)[:30]),
+        'prd_dtnasc': prd_dtnasc,
+        'prd_raca': prd_raca,
+        'prd_etnia': prd_etnia,
+        'prd_nac': '010',
+        'prd_srv': prd_srv,
+        'prd_clf': prd_clf,
+        'prd_equipe_Seq': ' ' * 8,
+        'prd_equipe_Area': ' ' * 4,
+        'prd_cnpj': ' ' * 14,
+        'prd_cep_pcnte': por_valor(c['vcp_cep'], lambda v: str(v or '').ljust(8)),
+        'prd_lograd_pcnte': por_valor(c['vcp_tp_logradouro'], codigo_logradouro),
+        'prd_end_pcnte': por_valor(c['vcp_logradouro'], lambda v: str(v or '').ljust(30)),
+        'prd_compl_pcnte': ' ' * 10,
+        'prd_num_pcnte': por_valor(c['vcp_numero'], numero),
+        'prd_bairro_pcnte': por_valor(c['vcp_bairro_inicial'], lambda v: str(v or '').ljust(30)),
+        'prd_ddtel_pcnte': ' ' * 11,
+        'prd_email_pcnte': ' ' * 40,
+        'prd_ine': config.get('default_ine').ljust(10),
+        'prd_cpf_pcnte': ' ' * 11,
+        'prd_situacao_rua': ' ',
+        '_id_lancamento_original': c['id_lancamento'],
+        '_nm_profissional': por_valor(c['nm_prestador_ficha'], _texto),
+        '_idade': idade,
+    }
+    return colunas, regras
+
+
+def colunas_para_registros(colunas):
+    """Converte as colunas de ``montar_colunas_bpa_i`` nos ``RegistroBPAI`` usados pelo restante do pipeline."""
+    # Campos constantes se repetem; os variáveis vêm das colunas, na ordem de CAMPOS_REGISTRO
+    valores = [
+        repeat(colunas[campo]) if isinstance(colunas[campo], str) else colunas[campo].tolist()
+        for campo in CAMPOS_REGISTRO
+    ]
+    with coleta_pausada():
+        return list(starmap(RegistroBPAI, zip(*valores)))
@@ -5,6 +5,33 @@ from sqlalchemy.orm import sessionmaker
 logger = logging.getLogger(__name__)
 
 
+def criar_engine(
+    db_name,
+    user,
+    password,
+    host,
+    port,
+    pool_size: int = 5,
+    max_overflow: int = 5,
+    pool_timeout: int = 30,
+    pool_recycle: int = 1800,
+):
+    """
+    Cria o engine SQLAlchemy (com pool de conexoes) para o PostgreSQL.
+    Usado tanto pelos exportadores (via Database) quanto pelo engine unico da API.
+    """
+    connection_string = f"postgresql://{user}:{password}@{host}:{port}/{db_name}"
+    return create_engine(
+        connection_string,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=pool_timeout,
+        pool_recycle=pool_recycle,
+        pool_pre_ping=True,
+        future=True,
+    )
+
+
 class Database:
     """
     Helper class to manage database connections with basic pooling.
@@ -30,15 +57,16 @@ class Database:
         Estabelece conexao com o banco de dados usando SQLAlchemy engine pooling.
         """
         try:
-            connection_string = f"postgresql://{user}:{password}@{host}:{port}/{db_name}"
-            self.engine = create_engine(
-                connection_string,
+            self.engine = criar_engine(
+                db_name,
+                user,
+                password,
+                host,
+                port,
                 pool_size=pool_size,
                 max_overflow=max_overflow,
                 pool_timeout=pool_timeout,
                 pool_recycle=pool_recycle,
-                pool_pre_ping=True,
-                future=True,
             )
             self.conn = self.engine.connect()
 
@@ -0,0 +1,79 @@
+"""
+Etapas de pós-processamento dos registros BPA-I (deduplicação, regra de idade, numeração).
+
+Cada etapa é um chamável que recebe um iterável de registros e devolve um iterador (em
+geral, um gerador que altera o registro no lugar e o repassa, ou o descarta).
+``aplicar_etapas`` encadeia as etapas e consome o resultado uma vez: cada registro
+atravessa todas elas antes do próximo ser lido, então a sequência inteira custa uma única
+passada, sem listas intermediárias nem cópias. ``numerar_registros`` já segue esse
+formato e entra como etapa final.
+
+As etapas não dependem da GUI nem do banco: guardam os próprios contadores, que o chamador
+usa para as mensagens de log (ver ``BPAExporter.pos_processar_registros``).
+"""
+from shared.numeracao_bpa import chave_numeracao
+
+PROCEDIMENTO_IDADE_MINIMA = '0301070300'
+PROCEDIMENTO_MENOR_IDADE = '0301010048'
+IDADE_MINIMA = 18
+
+
+def aplicar_etapas(registros, etapas):
+    """Encadeia ``etapas`` sobre ``registros`` e devolve a lista final, em uma única passada."""
+    fluxo = iter(registros)
+    for etapa in etapas:
+        fluxo = etapa(fluxo)
+    return list(fluxo)
+
+
+class DeduplicacaoPorLancamento:
+    """
+    Mantém só o primeiro registro de cada ``_id_lancamento_original`` (registros sem o id
+    são descartados). ``ids_vistos`` pode ser compartilhado entre lotes de uma mesma consulta.
+    """
+    def __init__(self, ids_vistos=None):
+        self.ids_vistos = set() if ids_vistos is None else ids_vistos
+        self.descartados = 0
+
+    def __call__(self, registros):
+        ids_vistos = self.ids_vistos
+        for registro in registros:
+            id_original = registro.get('_id_lancamento_original')
+            if id_original is None or id_original in ids_vistos:
+                self.descartados += 1
+                continue
+            ids_vistos.add(id_original)
+            yield registro
+
+
+class RegraIdadeProcedimento:
+    """
+    Troca ``0301070300`` por ``0301010048`` para pacientes com menos de 18 anos. Usa a idade
+    calculada na montagem do registro (``_idade``), sem recalcular a partir da data de nascimento.
+    """
+    def __init__(self):
+        self.alterados = 0
+
+    def __call__(self, registros):
+        for registro in registros:
+            if registro.get('prd_pa', '').strip() == PROCEDIMENTO_IDADE_MINIMA:
+                idade = registro.get('_idade')
+                if idade is not None and idade < IDADE_MINIMA:
+                    registro['prd_pa'] = PROCEDIMENTO_MENOR_IDADE.ljust(10)
+                    self.alterados += 1
+            yield registro
+
+
+class ConferenciaOrdem:
+    """Repassa os registros conferindo a ordem de ``chave``; ``ordenado`` fica falso na primeira inversão."""
+    def __init__(self, chave=chave_numeracao):
+        self.chave = chave
+        self.ordenado = True
+
+    def __call__(self, registros):
+        chave, anterior = self.chave, None
+        for registro in registros:
+            atual = chave(registro)
+            if anterior is not None and atual < anterior: self.ordenado = False
+            anterior = atual
+            yield registro
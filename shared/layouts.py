@@ -0,0 +1,310 @@
+"""
+Layouts de registro de largura fixa (BPA, APAC e CIHA).
+
+Cada formato é declarado uma única vez como uma lista de ``Campo`` e compilado num
+``Layout``, que serve tanto para escrever quanto para ler as linhas:
+
+- o formatador é uma única string de formatação no estilo ``%`` (``'%2.2s%-7.7s...'``),
+  que completa e corta todos os campos numa só operação;
+- o leitor é uma expressão regular com um grupo por campo.
+
+Campos ALFA são alinhados à esquerda e campos NUM à direita, completados com espaços.
+Valores maiores que o campo são cortados, de modo que uma linha sempre tem exatamente
+``Layout.tamanho`` caracteres. Os zeros à esquerda dos campos NUM fazem parte da regra
+de cada formato (ver ``normalizadores``).
+"""
+import operator
+import re
+
+ALFA = 'ALFA'
+NUM = 'NUM'
+
+
+class Campo:
+    """
+    Campo de um layout. ``valor`` é o conteúdo fixo do campo (usado na escrita quando o
+    registro não traz o campo e conferido pelo validador); ``valores`` lista os conteúdos
+    permitidos. ``obrigatorio`` só é usado pelo validador.
+    """
+    def __init__(self, nome, tamanho, tipo=ALFA, obrigatorio=False, valor=None, valores=None):
+        self.nome = nome
+        self.tamanho = tamanho
+        self.tipo = tipo
+        self.obrigatorio = obrigatorio
+        self.valor = valor
+        self.valores = valores
+
+    def especificacao(self):
+        """Especificação ``%`` que completa e corta o valor na largura do campo."""
+        alinhamento = '' if self.tipo == NUM else '-'
+        return f"%{alinhamento}{self.tamanho}.{self.tamanho}s"
+
+
+class Layout:
+    """
+    Layout compilado. ``normalizadores`` (opcional) mapeia o tipo do campo para uma função
+    ``(valor, tamanho) -> str`` aplicada antes da formatação, com as regras próprias de cada
+    formato (ex.: só dígitos, completados com zeros, nos campos NUM da APAC).
+    """
+    def __init__(self, nome, campos, normalizadores=None):
+        self.nome = nome
+        self.campos = list(campos)
+        self.nomes = [campo.nome for campo in self.campos]
+        if len(set(self.nomes)) != len(self.nomes):
+            raise ValueError(f"Layout {nome}: nomes de campo repetidos")
+        self.tamanho = sum(campo.tamanho for campo in self.campos)
+
+        self.posicoes = {}
+        inicio = 0
+        for campo in self.campos:
+            self.posicoes[campo.nome] = (inicio, inicio + campo.tamanho)
+            inicio += campo.tamanho
+
+        self._padroes = [campo.valor if campo.valor is not None else '' for campo in self.campos]
+        self._valores = operator.itemgetter(*self.nomes)
+        self._atributos = operator.attrgetter(*self.nomes)
+        normalizadores = normalizadores or {}
+        self._normalizadores = [(normalizadores.get(campo.tipo), campo.tamanho) for campo in self.campos]
+        if not any(normalizar for normalizar, _ in self._normalizadores):
+            self._normalizadores = None
+        self._formato = ''.join(campo.especificacao() for campo in self.campos)
+        self._leitor = re.compile(''.join(f"(.{{{campo.tamanho}}})" for campo in self.campos), re.DOTALL)
+
+    def formatar(self, valores):
+        """Monta a linha a partir dos valores na ordem dos campos (``None`` fica em branco)."""
+        if self._normalizadores:
+            valores = [
+                normalizar(valor, tamanho) if normalizar else valor
+                for (normalizar, tamanho), valor in zip(self._normalizadores, valores)
+            ]
+        valores = tuple(valores)
+        if None in valores:
+            valores = tuple('' if valor is None else valor for valor in valores)
+        return self._formato % valores
+
+    def formatar_registro(self, registro):
+        """
+        Monta a linha a partir de um dict campo -> valor (campos ausentes usam o ``valor`` fixo
+        ou ficam vazios) ou de um objeto com um atributo por campo, como ``RegistroBPAI``.
+        """
+        if not isinstance(registro, dict):
+            return self.formatar(self._atributos(registro))
+        try:
+            valores = self._valores(registro)
+        except KeyError:
+            valores = map(registro.get, self.nomes, self._padroes)
+        return self.formatar(valores)
+
+    def fatiar(self, linha):
+        """
+        Lê uma linha (sem o fim de linha) e devolve um dict campo -> conteúdo. Linhas menores
+        que o layout trazem os campos finais cortados ou vazios.
+        """
+        resultado = self._leitor.match(linha)
+        if resultado:
+            return dict(zip(self.nomes, resultado.groups()))
+        return {nome: linha[inicio:fim] for nome, (inicio, fim) in self.posicoes.items()}
+
+
+def _texto(valor, tamanho=None):
+    return str(valor or '').strip()
+
+
+def _digitos(valor, tamanho):
+    return ''.join(filter(str.isdigit, _texto(valor))).zfill(tamanho)
+
+
+def _inteiro(valor, tamanho):
+    if valor is None: valor = 0
+    try: valor_inteiro = int(float(valor))
+    except (ValueError, TypeError): valor_inteiro = 0
+    return str(valor_inteiro).zfill(tamanho)
+
+
+# ---------------------------------------------------------------------------
+# BPA (cabeçalho e BPA-I). Os valores chegam já formatados pelo exportador (zeros à
+# esquerda, brancos nos opcionais); o layout garante posição e largura de cada campo.
+# ---------------------------------------------------------------------------
+LAYOUT_BPA_HEADER = Layout('BPA cabeçalho', [
+    Campo('cbc_hdr_1', 2, NUM, True, valor='01'),
+    Campo('cbc_hdr_2', 5, ALFA, True, valor='#BPA#'),
+    Campo('cbc_mvm', 6, NUM, True),
+    Campo('cbc_lin', 6, NUM, True),
+    Campo('cbc_flh', 6, NUM, True),
+    Campo('cbc_smt_vrf', 4, NUM, True),
+    Campo('cbc_rsp', 30, ALFA, True),
+    Campo('cbc_sgl', 6, ALFA, True),
+    Campo('cbc_cgccpf', 14, NUM, True),
+    Campo('cbc_dst', 40, ALFA, True),
+    Campo('cbc_dst_in', 1, ALFA, True, valores=['M', 'E']),
+    Campo('cbc_versao', 10, ALFA, True),
+])
+
+LAYOUT_BPA_I = Layout('BPA-I', [
+    Campo('prd_ident', 2, NUM, True, valor='03'),
+    Campo('prd_cnes', 7, NUM, True),
+    Campo('prd_cmp', 6, NUM, True),
+    Campo('prd_cnsmed', 15, NUM, True),
+    Campo('prd_cbo', 6, ALFA, True),
+    Campo('prd_dtaten', 8, NUM, True),
+    Campo('prd_flh', 3, NUM, True),
+    Campo('prd_seq', 2, NUM, True),
+    Campo('prd_pa', 10, NUM, True),
+    Campo('prd_cnspac', 15, NUM),
+    Campo('prd_sexo', 1, ALFA, True, valores=['M', 'F']),
+    Campo('prd_ibge', 6, NUM),
+    Campo('prd_cid', 4, ALFA, True),
+    Campo('prd_ldade', 3, NUM, True),
+    Campo('prd_qt', 6, NUM, True),
+    Campo('prd_caten', 2, NUM),
+    Campo('prd_naut', 13, NUM),
+    Campo('prd_org', 3, ALFA, True, valor='BPA'),
+    Campo('prd_nmpac', 30, ALFA, True),
+    Campo('prd_dtnasc', 8, NUM, True),
+    Campo('prd_raca', 2, NUM, True),
+    Campo('prd_etnia', 4, NUM),
+    Campo('prd_nac', 3, NUM),
+    Campo('prd_srv', 3, NUM),
+    Campo('prd_clf', 3, NUM),
+    Campo('prd_equipe_Seq', 8, NUM),
+    Campo('prd_equipe_Area', 4, NUM),
+    Campo('prd_cnpj', 14, NUM),
+    Campo('prd_cep_pcnte', 8, NUM),
+    Campo('prd_lograd_pcnte', 3, NUM),
+    Campo('prd_end_pcnte', 30, ALFA),
+    Campo('prd_compl_pcnte', 10, ALFA),
+    Campo('prd_num_pcnte', 5, ALFA),
+    Campo('prd_bairro_pcnte', 30, ALFA),
+    Campo('prd_ddtel_pcnte', 11, NUM),
+    Campo('prd_email_pcnte', 40, ALFA),
+    Campo('prd_ine', 10, NUM, True),
+    Campo('prd_cpf_pcnte', 11, NUM),
+    Campo('prd_situacao_rua', 1, ALFA, valores=['N', 'S']),
+])
+
+# ---------------------------------------------------------------------------
+# APAC: cabeçalho (01), corpo (14) e procedimentos (13). NUM guarda só os dígitos.
+# ---------------------------------------------------------------------------
+NORMALIZADORES_APAC = {NUM: _digitos, ALFA: _texto}
+
+LAYOUT_APAC_HEADER = Layout('APAC cabeçalho', [
+    Campo('cbc_hdr_1', 2, NUM, valor='01'),
+    Campo('cbc_hdr_2', 5, ALFA, valor='#APAC'),
+    Campo('cbc_mvm', 6, NUM),
+    Campo('cbc_lin', 6, NUM),
+    Campo('cbc_smt_vrf', 4, NUM, valor='1111'),
+    Campo('cbc_rsp', 30, ALFA),
+    Campo('cbc_sgl', 6, ALFA),
+    Campo('cbc_cgccpf', 14, NUM),
+    Campo('cbc_dst', 40, ALFA),
+    Campo('cbc_dst_in', 1, ALFA),
+    Campo('cbc_dt_geracao', 8, NUM),
+    Campo('cbc_versao', 15, ALFA),
+], NORMALIZADORES_APAC)
+
+LAYOUT_APAC_CORPO = Layout('APAC corpo (14)', [
+    Campo('apa_ident', 2, NUM, valor='14'),
+    Campo('apa_cmp', 6, NUM),
+    Campo('apa_num', 13, NUM),
+    Campo('apa_uf', 2, NUM, valor='27'),
+    Campo('apa_cnes', 7, NUM),
+    Campo('apa_dt_processamento', 8, NUM),
+    Campo('apa_dt_inicio_validade', 8, NUM),
+    Campo('apa_dt_fim_validade', 8, NUM),
+    Campo('apa_tipo_atendimento', 2, NUM, valor='01'),
+    Campo('apa_tipo_apac', 1, NUM, valor='1'),
+    Campo('apa_nm_paciente', 30, ALFA),
+    Campo('apa_nm_mae', 30, ALFA),
+    Campo('apa_logradouro', 30, ALFA),
+    Campo('apa_numero', 5, ALFA),
+    Campo('apa_complemento', 10, ALFA),
+    Campo('apa_cep', 8, NUM),
+    Campo('apa_municipio', 7, NUM),
+    Campo('apa_dt_nascimento', 8, NUM),
+    Campo('apa_sexo', 1, ALFA),
+    Campo('apa_nm_responsavel', 30, ALFA),
+    Campo('apa_proc_principal', 10, NUM),
+    Campo('apa_motivo_saida', 2, NUM, valor='01'),
+    Campo('apa_dt_alta_obito', 8, ALFA),
+    Campo('apa_nm_autorizador', 30, ALFA),
+    Campo('apa_cns_paciente', 15, NUM),
+    Campo('apa_cns_responsavel', 15, NUM),
+    Campo('apa_cns_autorizador', 15, NUM),
+    Campo('apa_cid_associado', 4, ALFA),
+    Campo('apa_prontuario', 10, ALFA),
+    Campo('apa_cnes_solicitante', 7, ALFA),
+    Campo('apa_dt_solicitacao', 8, NUM),
+    Campo('apa_dt_autorizacao', 8, NUM),
+    Campo('apa_cod_emissor', 10, ALFA, valor='010101'),
+    Campo('apa_carater_atendimento', 2, NUM, valor='01'),
+    Campo('apa_num_anterior', 13, ALFA),
+    Campo('apa_raca', 2, NUM),
+    Campo('apa_nm_resp_paciente', 30, ALFA),
+    Campo('apa_nacionalidade', 3, NUM),
+    Campo('apa_etnia', 4, NUM),
+    Campo('apa_cod_logradouro', 3, ALFA),
+    Campo('apa_bairro', 30, ALFA),
+    Campo('apa_ddd', 2, ALFA),
+    Campo('apa_telefone', 9, ALFA),
+    Campo('apa_email', 40, ALFA),
+    Campo('apa_cns_executante', 15, NUM),
+    Campo('apa_cpf_paciente', 11, ALFA),
+    Campo('apa_ine', 10, ALFA),
+    Campo('apa_situacao_rua', 1, ALFA, valor='N'),
+], NORMALIZADORES_APAC)
+
+LAYOUT_APAC_PROCEDIMENTO = Layout('APAC procedimento (13)', [
+    Campo('prc_ident', 2, NUM, valor='13'),
+    Campo('prc_cmp', 6, NUM),
+    Campo('prc_num_apac', 13, NUM),
+    Campo('prc_pa', 10, NUM),
+    Campo('prc_cbo', 6, NUM),
+    Campo('prc_qt', 7, NUM),
+    Campo('prc_cnpj', 14, ALFA),
+    Campo('prc_nota_fiscal', 6, ALFA),
+    Campo('prc_cid_principal', 4, ALFA),
+    Campo('prc_cid_secundario', 4, ALFA),
+    Campo('prc_srv', 3, NUM),
+    Campo('prc_clf', 3, NUM),
+    Campo('prc_equipe_seq', 8, ALFA),
+    Campo('prc_equipe_area', 4, ALFA),
+    Campo('prc_cnes_terceiro', 7, ALFA),
+], NORMALIZADORES_APAC)
+
+# ---------------------------------------------------------------------------
+# CIHA: um tipo de registro, 450 posições. NUM é o valor inteiro (não numérico vira 0).
+# ---------------------------------------------------------------------------
+LAYOUT_CIHA = Layout('CIHA', [
+    Campo('cih_cmp', 6, NUM),
+    Campo('cih_cnes', 7, NUM),
+    Campo('cih_modalidade', 1, ALFA, valor='I'),
+    Campo('cih_proc', 10, NUM),
+    Campo('cih_qt', 6, NUM),
+    Campo('cih_carater', 2, NUM, valor='11'),
+    Campo('cih_reservado_1', 8, NUM),
+    Campo('cih_dt_admissao', 8, NUM),
+    Campo('cih_dt_saida', 8, NUM),
+    Campo('cih_motivo_saida', 2, NUM, valor='01'),
+    Campo('cih_especialidade', 2, NUM, valor='12'),
+    Campo('cih_reservado_2', 2, NUM),
+    Campo('cih_cid_principal', 4, ALFA),
+    Campo('cih_cid_secundario', 4, ALFA),
+    Campo('cih_reservado_3', 11, NUM),
+    Campo('cih_reservado_4', 11, NUM),
+    Campo('cih_reservado_5', 30, ALFA),
+    Campo('cih_reservado_6', 13, NUM),
+    Campo('cih_reservado_7', 15, ALFA),
+    Campo('cih_prontuario', 17, ALFA),
+    Campo('cih_cns', 15, NUM),
+    Campo('cih_nm_paciente', 70, ALFA),
+    Campo('cih_dt_nascimento', 8, NUM),
+    Campo('cih_sexo', 1, ALFA),
+    Campo('cih_logradouro', 25, ALFA),
+    Campo('cih_numero', 5, ALFA),
+    Campo('cih_complemento', 15, ALFA),
+    Campo('cih_cep', 8, NUM),
+    Campo('cih_municipio', 7, NUM),
+    Campo('cih_uf', 2, ALFA),
+    Campo('cih_sequencial', 1, NUM),
+    Campo('cih_filler', 126, ALFA),
+], {NUM: _inteiro, ALFA: _texto})
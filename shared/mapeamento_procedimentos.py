@@ -148,4 +148,19 @@ def carregar_tabela_procedimentos_cid():
     adicionar_procedimento('319', {'codigo_sigtap': '0211070319', 'servico': '135', 'classificacao': '005', 'cid_sugestao': 'H919', 'cid_obrigatorio': True}, modalidade_apac)
     adicionar_procedimento('1151', {'codigo_sigtap': '0701030151', 'servico': '164', 'classificacao': '005', 'cid_sugestao': '', 'cid_obrigatorio': True}, modalidade_apac)
 
-    return tabela
\ No newline at end of file
+    return tabela
+
+
+def mapeamento_procedimentos_da_consulta(registros):
+    """
+    Monta o mapeamento 'cod_proc' (ID) -> 'codigo_procedimento' (código curto) a partir
+    das linhas de uma consulta que já fez JOIN com sigh.procedimentos, dispensando a
+    consulta separada com a lista de IDs.
+    """
+    mapeamento = {}
+    for reg in registros:
+        cod_proc = reg.get('cod_proc')
+        codigo = reg.get('codigo_procedimento')
+        if cod_proc and codigo is not None:
+            mapeamento[str(cod_proc)] = str(codigo)
+    return mapeamento
@@ -0,0 +1,140 @@
+"""
+Numeração de folha/sequência dos registros BPA-I.
+
+Os registros são numerados na ordem de ``chave_numeracao`` (CNS do profissional, data do
+atendimento): uma folha nova a cada profissional e a cada 99 registros. A numeração é
+feita no próprio registro, sem cópias.
+
+A consulta principal já traz as linhas nessa ordem (ver ``ORDEM_CONSULTA``), então a
+ordenação normalmente se resume a uma conferência linear:
+
+- lista: conferida e, só se estiver fora de ordem, ordenada no lugar;
+- iterador que o chamador garante ordenado (``ja_ordenado=True``, ex.: direto da consulta
+  com ``ORDEM_CONSULTA``): repassado em fluxo, conferindo a ordem a cada registro, sem
+  cópia nem disco; uma inversão levanta ``ValueError``;
+- outro iterador: lido em blocos de ``tamanho_bloco``. Uma entrada de um bloco só é tratada
+  em memória; as maiores vão para arquivos temporários em blocos ordenados, intercalados
+  com ``heapq.merge`` (merge externo). O pico de memória fica em um bloco.
+"""
+import heapq
+import pickle
+import tempfile
+from itertools import chain, islice
+
+REGISTROS_POR_FOLHA = 99
+TAMANHO_BLOCO_ORDENACAO = 100_000
+
+# ORDER BY da consulta principal equivalente a chave_numeracao: prd_cnsmed é o CNS sem
+# espaços (vazio vira brancos, que vêm antes de qualquer dígito) comparado byte a byte.
+ORDEM_CONSULTA = "ORDER BY COALESCE(TRIM(pr_lanc.cns), '') COLLATE \"C\", l.data, l.id_lancamento"
+# A mesma ordem sobre as colunas do resultado, para consultas que envolvem a principal numa subconsulta.
+ORDEM_RESULTADO = (
+    "ORDER BY COALESCE(TRIM(cns_profissional_lancamento), '') COLLATE \"C\", data_atendimento_lancamento, id_lancamento"
+)
+
+
+def chave_ordem_consulta(linha):
+    """``ORDEM_CONSULTA`` aplicada a uma linha da consulta principal (para intercalar partições)."""
+    cns = linha.get('cns_profissional_lancamento') or ''
+    return (cns.strip(' '), linha.get('data_atendimento_lancamento'), linha.get('id_lancamento'))
+
+
+def chave_numeracao(registro):
+    return (registro.get('prd_cnsmed', ''), registro.get('prd_dtaten', ''))
+
+
+def esta_ordenado(registros, chave=chave_numeracao):
+    anterior = None
+    for registro in registros:
+        atual = chave(registro)
+        if anterior is not None and atual < anterior: return False
+        anterior = atual
+    return True
+
+
+def ordenar_para_numeracao(registros, chave=chave_numeracao, tamanho_bloco=TAMANHO_BLOCO_ORDENACAO, ja_ordenado=False):
+    """
+    Devolve os registros na ordem de ``chave`` (lista: a própria lista, ordenada no lugar;
+    iterador: um iterador). Com ``ja_ordenado`` um iterador é só conferido, em fluxo.
+    """
+    if isinstance(registros, list):
+        if not esta_ordenado(registros, chave):
+            registros.sort(key=chave)
+        return registros
+
+    if ja_ordenado:
+        return _repassar_conferindo(registros, chave)
+
+    registros = iter(registros)
+    bloco = list(islice(registros, tamanho_bloco))
+    proximo = list(islice(registros, tamanho_bloco))
+    if not proximo:
+        bloco.sort(key=chave)
+        return iter(bloco)
+    return _ordenar_externo(chain(bloco, proximo, registros), chave, tamanho_bloco)
+
+
+def _repassar_conferindo(registros, chave):
+    anterior = None
+    for posicao, registro in enumerate(registros, 1):
+        atual = chave(registro)
+        if anterior is not None and atual < anterior:
+            raise ValueError(f"Registro {posicao} fora da ordem de numeração: {atual!r} depois de {anterior!r}")
+        anterior = atual
+        yield registro
+
+
+def _ordenar_externo(registros, chave, tamanho_bloco):
+    blocos, ordenado, ultima_chave = [], True, None
+    try:
+        while True:
+            bloco = list(islice(registros, tamanho_bloco))
+            if not bloco: break
+            if not esta_ordenado(bloco, chave):
+                bloco.sort(key=chave)
+                ordenado = False
+            elif ultima_chave is not None and chave(bloco[0]) < ultima_chave:
+                ordenado = False
+            ultima_chave = chave(bloco[-1])
+            blocos.append(_gravar_bloco(bloco))
+            del bloco
+
+        leitores = [_ler_bloco(arquivo) for arquivo in blocos]
+        yield from chain.from_iterable(leitores) if ordenado else heapq.merge(*leitores, key=chave)
+    finally:
+        for arquivo in blocos:
+            arquivo.close()
+
+
+def _gravar_bloco(bloco):
+    arquivo = tempfile.TemporaryFile()
+    for registro in bloco:
+        pickle.dump(registro, arquivo, pickle.HIGHEST_PROTOCOL)
+    arquivo.seek(0)
+    return arquivo
+
+
+def _ler_bloco(arquivo):
+    while True:
+        try:
+            yield pickle.load(arquivo)
+        except EOFError:
+            return
+
+
+def numerar_registros(registros):
+    """Preenche ``prd_flh``/``prd_seq`` dos registros (já ordenados) no próprio dict e os devolve em sequência."""
+    cns_atual, folha_atual, seq_atual = None, 0, 0
+    for registro in registros:
+        if registro.get('prd_cnsmed') != cns_atual:
+            cns_atual = registro.get('prd_cnsmed')
+            folha_atual += 1
+            seq_atual = 1
+        else:
+            seq_atual += 1
+            if seq_atual > REGISTROS_POR_FOLHA:
+                folha_atual += 1
+                seq_atual = 1
+        registro['prd_flh'] = str(folha_atual).zfill(3)
+        registro['prd_seq'] = str(seq_atual).zfill(2)
+        yield registro
@@ -0,0 +1,138 @@
+"""
+Registro BPA-I compacto usado no pipeline de exportação.
+
+Um registro guarda os 39 campos ``prd_*`` do layout (já formatados) e três auxiliares
+(``_id_lancamento_original``, ``_nm_profissional`` e ``_idade``, a idade do paciente em
+anos, calculada uma vez na montagem, ou None sem data de nascimento) em ``__slots__``:
+sem o dict por instância, ocupa cerca de um terço a menos que um dict com as mesmas
+chaves (ver benchmarks/bench_registro_bpa.py).
+
+Para as etapas que tratam o registro como dict (deduplicação, numeração, relatório),
+``RegistroBPAI`` tem a mesma interface de leitura e escrita por chave: ``get``,
+``registro[campo]``, ``in``, ``keys``/``items``, ``copy`` e ``dict(registro)``. O
+formatador do layout lê os campos direto dos atributos.
+
+Os montadores criam os registros por posição (na ordem de ``CAMPOS_REGISTRO``): com 42
+argumentos, a chamada por palavra-chave custa mais que o próprio dict. Diferente de um
+dict só com strings, cada instância é rastreada pelo coletor cíclico, então a criação em
+massa é feita dentro de ``coleta_pausada``.
+"""
+import gc
+from contextlib import contextmanager
+from operator import attrgetter
+
+from shared.layouts import LAYOUT_BPA_I
+
+CAMPOS_AUXILIARES = ('_id_lancamento_original', '_nm_profissional', '_idade')
+CAMPOS_REGISTRO = tuple(LAYOUT_BPA_I.nomes) + CAMPOS_AUXILIARES
+
+
+class RegistroBPAI:
+    """Registro BPA-I com um slot por campo, na ordem de ``CAMPOS_REGISTRO``."""
+    __slots__ = CAMPOS_REGISTRO
+
+    def __init__(self, prd_ident, prd_cnes, prd_cmp, prd_cnsmed, prd_cbo, prd_dtaten, prd_flh, prd_seq, prd_pa,
+                 prd_cnspac, prd_sexo, prd_ibge, prd_cid, prd_ldade, prd_qt, prd_caten, prd_naut, prd_org,
+                 prd_nmpac, prd_dtnasc, prd_raca, prd_etnia, prd_nac, prd_srv, prd_clf, prd_equipe_Seq,
+                 prd_equipe_Area, prd_cnpj, prd_cep_pcnte, prd_lograd_pcnte, prd_end_pcnte, prd_compl_pcnte,
+                 prd_num_pcnte, prd_bairro_pcnte, prd_ddtel_pcnte, prd_email_pcnte, prd_ine, prd_cpf_pcnte,
+                 prd_situacao_rua, _id_lancamento_original, _nm_profissional, _idade):
+        self.prd_ident = prd_ident
+        self.prd_cnes = prd_cnes
+        self.prd_cmp = prd_cmp
+        self.prd_cnsmed = prd_cnsmed
+        self.prd_cbo = prd_cbo
+        self.prd_dtaten = prd_dtaten
+        self.prd_flh = prd_flh
+        self.prd_seq = prd_seq
+        self.prd_pa = prd_pa
+        self.prd_cnspac = prd_cnspac
+        self.prd_sexo = prd_sexo
+        self.prd_ibge = prd_ibge
+        self.prd_cid = prd_cid
+        self.prd_ldade = prd_ldade
+        self.prd_qt = prd_qt
+        self.prd_caten = prd_caten
+        self.prd_naut = prd_naut
+        self.prd_org = prd_org
+        self.prd_nmpac = prd_nmpac
+        self.prd_dtnasc = prd_dtnasc
+        self.prd_raca = prd_raca
+        self.prd_etnia = prd_etnia
+        self.prd_nac = prd_nac
+        self.prd_srv = prd_srv
+        self.prd_clf = prd_clf
+        self.prd_equipe_Seq = prd_equipe_Seq
+        self.prd_equipe_Area = prd_equipe_Area
+        self.prd_cnpj = prd_cnpj
+        self.prd_cep_pcnte = prd_cep_pcnte
+        self.prd_lograd_pcnte = prd_lograd_pcnte
+        self.prd_end_pcnte = prd_end_pcnte
+        self.prd_compl_pcnte = prd_compl_pcnte
+        self.prd_num_pcnte = prd_num_pcnte
+        self.prd_bairro_pcnte = prd_bairro_pcnte
+        self.prd_ddtel_pcnte = prd_ddtel_pcnte
+        self.prd_email_pcnte = prd_email_pcnte
+        self.prd_ine = prd_ine
+        self.prd_cpf_pcnte = prd_cpf_pcnte
+        self.prd_situacao_rua = prd_situacao_rua
+        self._id_lancamento_original = _id_lancamento_original
+        self._nm_profissional = _nm_profissional
+        self._idade = _idade
+
+    def valores(self):
+        return _valores(self)
+
+    def get(self, campo, padrao=None):
+        if campo not in _CAMPOS: return padrao
+        return getattr(self, campo)
+
+    def __getitem__(self, campo):
+        if campo not in _CAMPOS: raise KeyError(campo)
+        return getattr(self, campo)
+
+    def __setitem__(self, campo, valor):
+        if campo not in _CAMPOS: raise KeyError(campo)
+        setattr(self, campo, valor)
+
+    def __contains__(self, campo):
+        return campo in _CAMPOS
+
+    def __iter__(self):
+        return iter(CAMPOS_REGISTRO)
+
+    def __len__(self):
+        return len(CAMPOS_REGISTRO)
+
+    def keys(self):
+        return CAMPOS_REGISTRO
+
+    def items(self):
+        return zip(CAMPOS_REGISTRO, _valores(self))
+
+    def copy(self):
+        return RegistroBPAI(*_valores(self))
+
+    def __eq__(self, outro):
+        if not isinstance(outro, RegistroBPAI): return NotImplemented
+        return _valores(self) == _valores(outro)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"RegistroBPAI({dict(self.items())!r})"
+
+
+_CAMPOS = frozenset(CAMPOS_REGISTRO)
+_valores = attrgetter(*CAMPOS_REGISTRO)
+
+
+@contextmanager
+def coleta_pausada():
+    """Pausa o coletor cíclico durante a criação em massa de registros (que não formam ciclos)."""
+    ativo = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if ativo: gc.enable()
@@ -0,0 +1,96 @@
+"""
+Regras por prestador da montagem dos registros BPA-I.
+
+Para cada par ``(id_prestador, codigo_curto)`` as regras são resolvidas uma única vez
+por execução: CBO fixo do prestador, substituição de procedimento SIGTAP, serviço/
+classificação (do procedimento ou, na falta, do profissional), quantidade e CID padrão.
+O resultado fica num dict pela chave do par, de modo que a montagem faz uma consulta
+por registro em vez de reavaliar as regras linha a linha.
+
+As mensagens de REGRA não são mais emitidas por linha: quem aplica as regras conta os
+registros por regra e usa ``contar_mensagens`` para relatar o total de cada uma.
+"""
+
+PROCEDIMENTO_PADRAO = '0301010048'
+
+# (id_prestador, SIGTAP original) -> (SIGTAP substituto, código curto do substituto na
+# tabela_proc_cid, complemento do prestador na mensagem)
+SUBSTITUICOES_PROCEDIMENTO = {
+    ('35', '0301070075'): ('0301010072', '72', ''),
+    ('75', '0301010048'): ('0301040044', '44', ' (Andre Luiz)'),
+}
+
+
+class RegraPrestador:
+    """Campos BPA-I já resolvidos para um par (prestador, código curto) e as mensagens de REGRA aplicadas."""
+    def __init__(self, cbo, sigtap, servico, classificacao, cid_padrao, mensagens):
+        self.cbo = cbo
+        self.prd_pa = sigtap.ljust(10)
+        self.prd_qt = '000030' if sigtap == '0701050020' else '000001'
+        self.prd_srv = str(servico).zfill(3) if servico else '   '
+        self.prd_clf = str(classificacao).zfill(3) if classificacao else '   '
+        self.cid_padrao = cid_padrao
+        self.mensagens = mensagens
+
+
+class RegrasPrestador:
+    """
+    Dict ``(id_prestador, codigo_curto) -> RegraPrestador`` de uma execução. Cada par é
+    compilado na primeira vez em que aparece e reaproveitado daí em diante (inclusive
+    entre os lotes do modo streaming).
+    """
+    def __init__(self, tabela_proc_cid, cbo_override_map, mapeamento_profissionais, substituicoes=None):
+        self.tabela_proc_cid = tabela_proc_cid
+        self.cbo_override_map = cbo_override_map
+        self.mapeamento_profissionais = mapeamento_profissionais
+        self.substituicoes = SUBSTITUICOES_PROCEDIMENTO if substituicoes is None else substituicoes
+        self._regras = {}
+
+    def regra(self, id_prestador, codigo_curto):
+        chave = (id_prestador, codigo_curto)
+        regra = self._regras.get(chave)
+        if regra is None:
+            regra = self._regras[chave] = self._compilar(id_prestador, codigo_curto)
+        return regra
+
+    def _compilar(self, id_prestador, codigo_curto):
+        mensagens = []
+
+        cbo = self.cbo_override_map.get(id_prestador)
+        if cbo:
+            mensagens.append(f"REGRA: CBO para o prestador ID {id_prestador} alterado para '{cbo}'")
+
+        proc_info = self.tabela_proc_cid.get(codigo_curto, {}) if codigo_curto else {}
+        sigtap = proc_info.get('codigo_sigtap', PROCEDIMENTO_PADRAO)
+        substituicao = self.substituicoes.get((id_prestador, sigtap))
+        if substituicao:
+            sigtap_substituto, codigo_substituto, complemento = substituicao
+            proc_info = self.tabela_proc_cid.get(codigo_substituto, {})
+            mensagens.append(
+                f"REGRA: Procedimento '{sigtap}' do prestador ID {id_prestador}{complemento} alterado para '{sigtap_substituto}'"
+            )
+            sigtap = sigtap_substituto
+
+        servico = proc_info.get('servico', '')
+        classificacao = proc_info.get('classificacao', '')
+        if not servico and not classificacao:
+            info_profissional = self.mapeamento_profissionais.get(id_prestador, {})
+            servico = info_profissional.get('servico', '')
+            classificacao = info_profissional.get('classificacao', '')
+            if servico:
+                mensagens.append(
+                    f"REGRA: Usando Serv/Class ({servico}/{classificacao}) do profissional ID {id_prestador} "
+                    "pois o procedimento não possui"
+                )
+
+        cid_padrao = proc_info.get('cid_sugestao') or ('Z000' if proc_info.get('cid_obrigatorio', False) else '')
+        return RegraPrestador(cbo, sigtap, servico, classificacao, cid_padrao, tuple(mensagens))
+
+
+def contar_mensagens(aplicacoes):
+    """Converte ``{RegraPrestador: registros}`` no total de registros por mensagem de REGRA."""
+    contagem = {}
+    for regra, total in aplicacoes.items():
+        for mensagem in regra.mensagens:
+            contagem[mensagem] = contagem.get(mensagem, 0) + int(total)
+    return contagem
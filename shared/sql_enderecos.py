@@ -0,0 +1,62 @@
+# shared/sql_enderecos.py
+
+ESTRATEGIA_LATERAL = "lateral"
+ESTRATEGIA_JANELA = "janela"
+ESTRATEGIAS_ENDERECO = (ESTRATEGIA_LATERAL, ESTRATEGIA_JANELA)
+
+
+def montar_endereco_paciente(
+    colunas=("cod_logradouro", "numero"),
+    estrategia=ESTRATEGIA_LATERAL,
+    somente_com_logradouro=True,
+    desempatar_por_id=True,
+    coluna_paciente="p.id_paciente",
+    alias="enderecos_pac",
+    tabela="sigh.enderecos",
+):
+    """
+    Monta o trecho SQL que resolve o endereço ativo mais recente de cada paciente.
+
+    Retorna ``(cte, join)``: ``cte`` é a definição ``RankedEnderecos AS (...)`` (ou None,
+    quando a estratégia não precisa de CTE) e ``join`` é o ``LEFT JOIN`` que expõe as
+    ``colunas`` sob ``alias``.
+
+    - ``lateral``: ``LEFT JOIN LATERAL ... LIMIT 1`` por paciente da exportação; só lê os
+      endereços dos pacientes que aparecem no período (usa o índice em ``cod_paciente``).
+    - ``janela``: plano antigo, ``ROW_NUMBER()`` sobre todos os endereços ativos do banco.
+    """
+    if estrategia not in ESTRATEGIAS_ENDERECO:
+        raise ValueError(f"Estratégia de endereço desconhecida: {estrategia!r}")
+
+    filtro = "ep.ativo = 't'"
+    if somente_com_logradouro: filtro += " AND ep.cod_logradouro IS NOT NULL"
+    ordem = "ep.data_hora_atualizacao DESC, ep.data_hora_criacao DESC"
+    if desempatar_por_id: ordem += ", ep.id_endereco DESC"
+    colunas_sql = ", ".join(f"ep.{coluna}" for coluna in colunas)
+
+    if estrategia == ESTRATEGIA_LATERAL:
+        join = f"""LEFT JOIN LATERAL (
+            SELECT {colunas_sql}
+            FROM {tabela} ep
+            WHERE ep.cod_paciente = {coluna_paciente} AND {filtro}
+            ORDER BY {ordem}
+            LIMIT 1
+        ) AS {alias} ON TRUE"""
+        return None, join
+
+    cte = f"""RankedEnderecos AS (
+            SELECT
+                ep.cod_paciente, {colunas_sql},
+                ROW_NUMBER() OVER(PARTITION BY ep.cod_paciente ORDER BY {ordem}) as rn
+            FROM {tabela} ep
+            WHERE {filtro}
+        )"""
+    join = f"LEFT JOIN RankedEnderecos AS {alias} ON {coluna_paciente} = {alias}.cod_paciente AND {alias}.rn = 1"
+    return cte, join
+
+
+def clausula_with(*ctes):
+    """Junta as CTEs informadas (ignorando None) numa cláusula ``WITH``; vazia se não houver nenhuma."""
+    ctes = [cte for cte in ctes if cte]
+    if not ctes: return ""
+    return "WITH " + ",\n        ".join(ctes)